@@ -1,7 +1,8 @@
-const { spawn } = require("child_process");
-const path = require("path");
+const { callAnalysisService, BATCH_TIMEOUT_MS } = require("../services/analysis_service.js");
 
-exports.runAnalysis = (req, res) => {
+const ANALYSIS_FLAGS = ["fresh", "diagnostics"];
+
+exports.runAnalysis = async (req, res) => {
   const lat = parseFloat(req.query.lat) || 40.7128;
   const lon = parseFloat(req.query.lon) || -74.0060;
   const businessType = req.query.businessType || "supermarket";
@@ -14,64 +15,159 @@ exports.runAnalysis = (req, res) => {
     });
   }
 
-  const scriptPath = path.join(
-    __dirname,
-    "../../Model_gendration/Retail Market Intelligence Model/runner.py"
-  );
-
-  const pythonProcess = spawn("python", [
-    scriptPath,
-    lat.toString(),
-    lon.toString(),
+  const query = {
+    lat: lat.toString(),
+    lon: lon.toString(),
     businessType,
-    radiusKm.toString(),
-  ]);
-
-  let data = "";
-  let errorData = "";
-
-  pythonProcess.stdout.on("data", (chunk) => {
-    data += chunk.toString();
-  });
-
-  pythonProcess.stderr.on("data", (err) => {
-    errorData += err.toString();
-    console.error("Python error:", err.toString());
-  });
-
-  pythonProcess.on("close", (code) => {
-    try {
-      if (code !== 0) {
-        throw new Error(`Python process exited with code ${code}`);
-      }
-
-      const result = JSON.parse(data);
-
-      if (result.error) {
-        return res.status(500).json({
-          error: "Analysis failed",
-          details: result.error,
-          raw: data,
-        });
-      }
-
-      res.json(result);
-    } catch (e) {
-      console.error("Error parsing Python output:", e.message);
-      res.status(500).json({
-        error: "Invalid JSON from Python",
-        details: e.message,
+    radiusKm: radiusKm.toString(),
+  };
+  // Opt-in flags: fresh=1 bypasses the result cache, diagnostics=1 adds stage / upstream timings
+  for (const flag of ANALYSIS_FLAGS) {
+    const value = req.query[flag] !== undefined ? req.query[flag] : req.body && req.body[flag];
+    if (value !== undefined) query[flag] = String(value);
+  }
+
+  let data;
+  try {
+    const response = await callAnalysisService("GET", "/analyze", { query });
+    data = response.body;
+  } catch (err) {
+    console.error("Failed to reach analysis service:", err);
+    return res.status(500).json({
+      error: "Failed to reach analysis service",
+      details: err.message,
+    });
+  }
+
+  try {
+    const result = JSON.parse(data);
+
+    if (result.error) {
+      return res.status(500).json({
+        error: "Analysis failed",
+        details: result.error,
         raw: data,
-        stderr: errorData,
       });
     }
-  });
 
-  pythonProcess.on("error", (err) => {
-    console.error("Failed to start Python process:", err);
+    res.json(result);
+  } catch (e) {
+    console.error("Error parsing Python output:", e.message);
     res.status(500).json({
-      error: "Failed to start analysis process",
+      error: "Invalid JSON from Python",
+      details: e.message,
+      raw: data,
+    });
+  }
+};
+
+exports.runBatchAnalysis = async (req, res) => {
+  const sites = req.body && req.body.sites;
+
+  if (!Array.isArray(sites) || sites.length === 0) {
+    return res.status(400).json({
+      error: "Invalid parameters",
+      message: "Body must contain a non-empty 'sites' array",
+    });
+  }
+
+  const invalid = sites.findIndex(
+    (site) => !site || isNaN(parseFloat(site.lat)) || isNaN(parseFloat(site.lon))
+  );
+  if (invalid !== -1) {
+    return res.status(400).json({
+      error: "Invalid parameters",
+      message: `Site ${invalid} needs numeric lat and lon`,
+    });
+  }
+
+  let response;
+  try {
+    response = await callAnalysisService("POST", "/batch", {
+      body: {
+        sites: sites.map((site) => ({
+          lat: parseFloat(site.lat),
+          lon: parseFloat(site.lon),
+          businessType: site.businessType || "supermarket",
+          radiusKm: parseFloat(site.radiusKm) || 2,
+        })),
+      },
+      timeoutMs: BATCH_TIMEOUT_MS,
+    });
+  } catch (err) {
+    console.error("Failed to reach analysis service:", err);
+    return res.status(500).json({
+      error: "Failed to reach analysis service",
       details: err.message,
     });
-  });
+  }
+
+  try {
+    const result = JSON.parse(response.body);
+
+    if (result.error) {
+      return res.status(response.status >= 400 ? response.status : 500).json({
+        error: "Batch analysis failed",
+        details: result.error,
+      });
+    }
+
+    res.json(result);
+  } catch (e) {
+    console.error("Error parsing Python output:", e.message);
+    res.status(500).json({
+      error: "Invalid JSON from Python",
+      details: e.message,
+      raw: response.body,
+    });
+  }
+};
+
+const HEATMAP_PARAMS = ["businessType", "south", "west", "north", "east", "lat", "lon", "radiusKm", "cellM"];
+
+exports.runHeatmap = async (req, res) => {
+  const query = {};
+  for (const name of HEATMAP_PARAMS) {
+    if (req.query[name] !== undefined) query[name] = String(req.query[name]);
+  }
+
+  const hasBounds = ["south", "west", "north", "east"].every((name) => !isNaN(parseFloat(query[name])));
+  const hasCenter = !isNaN(parseFloat(query.lat)) && !isNaN(parseFloat(query.lon));
+  if (!hasBounds && !hasCenter) {
+    return res.status(400).json({
+      error: "Invalid parameters",
+      message: "Give south, west, north and east, or lat and lon (with optional radiusKm)",
+    });
+  }
+
+  let response;
+  try {
+    response = await callAnalysisService("GET", "/heatmap", { query, timeoutMs: BATCH_TIMEOUT_MS });
+  } catch (err) {
+    console.error("Failed to reach analysis service:", err);
+    return res.status(500).json({
+      error: "Failed to reach analysis service",
+      details: err.message,
+    });
+  }
+
+  try {
+    const result = JSON.parse(response.body);
+
+    if (result.error) {
+      return res.status(response.status >= 400 ? response.status : 500).json({
+        error: "Heatmap failed",
+        details: result.error,
+      });
+    }
+
+    res.json(result);
+  } catch (e) {
+    console.error("Error parsing Python output:", e.message);
+    res.status(500).json({
+      error: "Invalid JSON from Python",
+      details: e.message,
+      raw: response.body,
+    });
+  }
 };
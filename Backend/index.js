@@ -1,6 +1,7 @@
 const express = require("express");
 const retail_market_intelligence_model = require("./routes/retail_market_intelligence_model.route.js");
 const cors = require("cors");
+const { startAnalysisService } = require("./services/analysis_service.js");
 
 const app = express();
 const PORT = 5000;
@@ -16,6 +17,11 @@ app.use(express.json());
 
 app.use("/analyze", retail_market_intelligence_model);
 
+// Resident Python analysis service (skip when it is managed externally)
+if (process.env.ANALYSIS_SERVICE_EXTERNAL !== "1") {
+  startAnalysisService();
+}
+
 app.listen(PORT, () => {
   console.log(`🚀 Server running at http://localhost:${PORT}`);
   console.log(`📊 Analysis endpoint: http://localhost:${PORT}/analyze`);
@@ -1,7 +1,9 @@
 const express = require("express");
 const router = express.Router();
-const { runAnalysis } = require("../controllers/retail_market_intelligence_model.controller.js");
+const { runAnalysis, runBatchAnalysis, runHeatmap } = require("../controllers/retail_market_intelligence_model.controller.js");
 
 router.get("/retail_market_intelligence_model", runAnalysis);
+router.post("/retail_market_intelligence_model/batch", runBatchAnalysis);
+router.get("/retail_market_intelligence_model/heatmap", runHeatmap);
 
 module.exports = router;
@@ -0,0 +1,113 @@
+const { spawn } = require("child_process");
+const http = require("http");
+const path = require("path");
+
+const SERVICE_SCRIPT = path.join(
+  __dirname,
+  "../../Model_gendration/Retail Market Intelligence Model/analysis_service.py"
+);
+
+const PYTHON = process.env.PYTHON || "python";
+const SERVICE_SOCKET = process.env.ANALYSIS_SERVICE_SOCKET;
+const SERVICE_HOST = process.env.ANALYSIS_SERVICE_HOST || "127.0.0.1";
+const SERVICE_PORT = parseInt(process.env.ANALYSIS_SERVICE_PORT, 10) || 8765;
+const SERVICE_WORKERS = parseInt(process.env.ANALYSIS_SERVICE_WORKERS, 10) || 2;
+const REQUEST_TIMEOUT_MS = parseInt(process.env.ANALYSIS_SERVICE_TIMEOUT_MS, 10) || 300000;
+const BATCH_TIMEOUT_MS = parseInt(process.env.ANALYSIS_SERVICE_BATCH_TIMEOUT_MS, 10) || 3600000;
+const CONNECT_RETRIES = 10;
+const RETRY_DELAY_MS = 500;
+const RESTART_DELAY_MS = 2000;
+
+let serviceProcess = null;
+let stopping = false;
+
+// Registered once for the Node process; they stop whichever child is current
+const stopAnalysisService = () => {
+  stopping = true;
+  if (serviceProcess) serviceProcess.kill();
+};
+process.once("exit", stopAnalysisService);
+process.once("SIGINT", () => {
+  stopAnalysisService();
+  process.exit(0);
+});
+
+// Start the resident Python analysis service and restart it if it dies
+exports.startAnalysisService = () => {
+  if (serviceProcess) return serviceProcess;
+
+  const args = [SERVICE_SCRIPT, "--workers", SERVICE_WORKERS.toString()];
+  if (SERVICE_SOCKET) {
+    args.push("--socket", SERVICE_SOCKET);
+  } else {
+    args.push("--host", SERVICE_HOST, "--port", SERVICE_PORT.toString());
+  }
+
+  serviceProcess = spawn(PYTHON, args, { stdio: ["ignore", "inherit", "inherit"] });
+
+  serviceProcess.on("error", (err) => {
+    console.error("Failed to start analysis service:", err.message);
+  });
+
+  serviceProcess.on("exit", (code, signal) => {
+    serviceProcess = null;
+    if (stopping) return;
+    console.error(`Analysis service exited (code ${code}, signal ${signal}), restarting...`);
+    setTimeout(exports.startAnalysisService, RESTART_DELAY_MS);
+  });
+
+  return serviceProcess;
+};
+
+const sendRequest = (method, pathname, { query, body, timeoutMs = REQUEST_TIMEOUT_MS } = {}) =>
+  new Promise((resolve, reject) => {
+    const search = query ? `?${new URLSearchParams(query).toString()}` : "";
+    const payload = body !== undefined ? JSON.stringify(body) : null;
+
+    const options = {
+      method,
+      path: `${pathname}${search}`,
+      timeout: timeoutMs,
+      headers: payload
+        ? { "Content-Type": "application/json", "Content-Length": Buffer.byteLength(payload) }
+        : {},
+    };
+    if (SERVICE_SOCKET) {
+      options.socketPath = SERVICE_SOCKET;
+    } else {
+      options.host = SERVICE_HOST;
+      options.port = SERVICE_PORT;
+    }
+
+    const request = http.request(options, (response) => {
+      let data = "";
+      response.setEncoding("utf8");
+      response.on("data", (chunk) => {
+        data += chunk;
+      });
+      response.on("end", () => resolve({ status: response.statusCode, body: data }));
+    });
+
+    request.on("timeout", () => {
+      request.destroy(new Error(`Analysis service did not respond within ${timeoutMs}ms`));
+    });
+    request.on("error", reject);
+
+    if (payload) request.write(payload);
+    request.end();
+  });
+
+exports.BATCH_TIMEOUT_MS = BATCH_TIMEOUT_MS;
+
+// Call the analysis service, retrying while it is still starting up
+exports.callAnalysisService = async (method, pathname, options) => {
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await sendRequest(method, pathname, options);
+    } catch (err) {
+      const starting = err.code === "ECONNREFUSED" || err.code === "ENOENT";
+      if (!starting || attempt >= CONNECT_RETRIES) throw err;
+      await new Promise((resolve) => setTimeout(resolve, RETRY_DELAY_MS));
+    }
+  }
+};
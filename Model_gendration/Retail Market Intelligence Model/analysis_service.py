@@ -0,0 +1,374 @@
+"""
+Long-lived analysis service for the Retail Market Intelligence Model.
+
+Keeps a pool of resident worker processes that import runner.py once and then
+serve analyses over HTTP on localhost (or a Unix socket). Requests no longer pay
+for interpreter start-up, the heavy imports and cold HTTP sessions, and module
+level caches inside runner.py stay warm between jobs. Workers are recycled after
+a configurable number of jobs or once their resident memory grows too large.
+
+Usage:
+    python analysis_service.py --port 8765 --workers 2
+    python analysis_service.py --socket /tmp/radiu_analysis.sock
+
+Endpoints:
+    GET /analyze?lat=..&lon=..&businessType=..&radiusKm=..[&fresh=1][&diagnostics=1]
+    POST /batch  {"sites": [{"lat": .., "lon": .., "businessType": .., "radiusKm": ..}, ...]}
+    GET /heatmap?businessType=..&south=..&west=..&north=..&east=..[&cellM=100]
+    GET /heatmap?businessType=..&lat=..&lon=..&radiusKm=..[&cellM=100]
+    GET /health
+
+businessType=all ranks every business type for the site in one analysis.
+"""
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import queue
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("analysis_service")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_JOBS = 200       # recycle a worker after this many jobs
+DEFAULT_MAX_RSS_MB = 1024    # ... or once its resident memory exceeds this
+DEFAULT_JOB_TIMEOUT = 300    # seconds before a stuck worker is killed
+DEFAULT_BATCH_TIMEOUT = 3600 # ... or, for batch jobs, this many
+MAX_BATCH_SITES = 500
+MAX_BODY_BYTES = 1024 * 1024
+
+
+def _current_rss_mb():
+    """Resident set size of the current process in MB"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    try:
+        import resource
+        # ru_maxrss is KB on Linux and bytes on macOS
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+    except Exception:
+        return 0.0
+
+
+def _worker_main(conn, max_jobs, max_rss_mb):
+    """Worker loop: import runner once, then serve jobs until told to stop or recycled"""
+    import runner  # warm import shared by every job this worker handles
+    import heatmap
+    import culture_index, osm_snapshot, worldbank_store  # noqa: F401  (runner imports these lazily; warm them too)
+    from geocoding import get_reverse_geocoder
+    from http_client import get_http_client
+    from result_cache import get_result_cache
+
+    jobs = {
+        "analyze": runner.run_analysis,
+        "batch": runner.run_batch_analysis,
+        "heatmap": heatmap.build_heatmap,
+    }
+
+    done = 0
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+
+        if message is None:
+            break
+
+        kind, kwargs = message
+        try:
+            result = jobs[kind](**kwargs)
+        except Exception as e:
+            result = {"error": str(e)}
+
+        done += 1
+        rss_mb = _current_rss_mb()
+        result_cache = get_result_cache()
+        retire = done >= max_jobs or (max_rss_mb > 0 and rss_mb > max_rss_mb)
+        info = {
+            "jobs": done,
+            "rss_mb": round(rss_mb, 1),
+            "retire": retire,
+            "geocoder": get_reverse_geocoder().stats(),
+            "http": get_http_client().host_stats(),
+            "result_cache": result_cache.stats() if result_cache is not None else None,
+        }
+        conn.send((result, info))
+
+        if retire:
+            break
+
+    conn.close()
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+
+class WorkerPool:
+    """Fixed-size pool of resident analysis workers with job-count / RSS recycling"""
+
+    def __init__(self, size=DEFAULT_WORKERS, max_jobs=DEFAULT_MAX_JOBS,
+                 max_rss_mb=DEFAULT_MAX_RSS_MB, job_timeout=DEFAULT_JOB_TIMEOUT,
+                 batch_timeout=DEFAULT_BATCH_TIMEOUT):
+        # spawn (not fork): workers are replaced from HTTP handler threads
+        self.ctx = mp.get_context("spawn")
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.job_timeout = job_timeout
+        self.job_timeouts = {"batch": batch_timeout, "heatmap": batch_timeout}
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.stats = {"jobs": 0, "failed": 0, "recycled": 0, "killed": 0}
+        self.worker_info = {}  # pid -> last info reported by that worker
+
+        for _ in range(size):
+            self.idle.put(self._spawn())
+
+    def _spawn(self):
+        parent_conn, child_conn = self.ctx.Pipe()
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.max_jobs, self.max_rss_mb),
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+
+    def _replace(self, worker, kill=False):
+        """Retire a worker and put a fresh one in its place"""
+        if kill and worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(timeout=5)
+        worker.conn.close()
+        self.idle.put(self._spawn())
+
+    def run(self, kind, **kwargs):
+        """Run a job on the next idle worker and return its result"""
+        timeout = self.job_timeouts.get(kind, self.job_timeout)
+        worker = self.idle.get()
+        try:
+            worker.conn.send((kind, kwargs))
+            if not worker.conn.poll(timeout):
+                raise TimeoutError(f"Analysis worker did not answer within {timeout}s")
+            result, info = worker.conn.recv()
+        except Exception:
+            with self.lock:
+                self.stats["failed"] += 1
+                self.stats["killed"] += 1
+            self._replace(worker, kill=True)
+            raise
+
+        with self.lock:
+            self.stats["jobs"] += 1
+            if info["retire"]:
+                self.stats["recycled"] += 1
+                self.worker_info.pop(worker.process.pid, None)
+            else:
+                self.worker_info[worker.process.pid] = info
+
+        if info["retire"]:
+            logger.info(f"Recycling worker {worker.process.pid} after {info['jobs']} jobs ({info['rss_mb']} MB RSS)")
+            self._replace(worker)
+        else:
+            self.idle.put(worker)
+
+        return result
+
+    def health(self):
+        with self.lock:
+            stats = dict(self.stats)
+            workers = {str(pid): info for pid, info in self.worker_info.items()}
+        stats.update({"workers": self.size, "idle": self.idle.qsize(), "worker_info": workers})
+        return stats
+
+    def close(self):
+        while not self.idle.empty():
+            worker = self.idle.get_nowait()
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.process.join(timeout=5)
+
+
+def _parse_float(params, name, default):
+    try:
+        return float(params.get(name, [default])[0])
+    except (TypeError, ValueError):
+        raise ValueError(f"Parameter '{name}' must be a valid number")
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """Translate HTTP requests into worker pool jobs"""
+
+    pool = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+
+        if url.path == "/health":
+            return self._send_json(200, {"status": "ok", "pool": self.pool.health()})
+
+        if url.path == "/heatmap":
+            return self._heatmap(params)
+
+        if url.path != "/analyze":
+            return self._send_json(404, {"error": f"Unknown endpoint {url.path}"})
+
+        try:
+            kwargs = {
+                "lat": _parse_float(params, "lat", 40.7128),
+                "lon": _parse_float(params, "lon", -74.0060),
+                "business_type": params.get("businessType", ["supermarket"])[0],
+                "radius_km": _parse_float(params, "radiusKm", 2),
+                # fresh=1 bypasses the result cache, diagnostics=1 adds stage / upstream timings
+                "use_cache": params.get("fresh", ["0"])[0] not in ("1", "true"),
+                "diagnostics": params.get("diagnostics", ["0"])[0] in ("1", "true"),
+            }
+        except ValueError as e:
+            return self._send_json(400, {"error": str(e)})
+
+        try:
+            result = self.pool.run("analyze", **kwargs)
+        except Exception as e:
+            return self._send_json(500, {"error": f"Analysis worker failed: {e}"})
+
+        self._send_json(200, result)
+
+    def _heatmap(self, params):
+        try:
+            kwargs = {
+                "business_type": params.get("businessType", ["supermarket"])[0],
+                "cell_m": _parse_float(params, "cellM", 100),
+            }
+            if "south" in params:
+                kwargs["bounds"] = tuple(_parse_float(params, name, None) for name in ("south", "west", "north", "east"))
+            else:
+                kwargs["center"] = (_parse_float(params, "lat", None), _parse_float(params, "lon", None))
+                kwargs["radius_km"] = _parse_float(params, "radiusKm", 5)
+        except ValueError as e:
+            return self._send_json(400, {"error": str(e)})
+
+        if kwargs["cell_m"] < 10:
+            return self._send_json(400, {"error": "Parameter 'cellM' must be at least 10"})
+
+        try:
+            result = self.pool.run("heatmap", **kwargs)
+        except Exception as e:
+            return self._send_json(500, {"error": f"Analysis worker failed: {e}"})
+
+        self._send_json(400 if "error" in result else 200, result)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/batch":
+            return self._send_json(404, {"error": f"Unknown endpoint {url.path}"})
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length > MAX_BODY_BYTES:
+                return self._send_json(413, {"error": f"Request body larger than {MAX_BODY_BYTES} bytes"})
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json(400, {"error": "Request body must be valid JSON"})
+
+        sites = body.get("sites") if isinstance(body, dict) else None
+        if not isinstance(sites, list) or not sites:
+            return self._send_json(400, {"error": "'sites' must be a non-empty list"})
+        if len(sites) > MAX_BATCH_SITES:
+            return self._send_json(400, {"error": f"At most {MAX_BATCH_SITES} sites per batch"})
+
+        try:
+            result = self.pool.run("batch", sites=sites)
+        except Exception as e:
+            return self._send_json(500, {"error": f"Analysis worker failed: {e}"})
+
+        self._send_json(400 if "error" in result else 200, result)
+
+    def log_message(self, format, *args):
+        logger.info(format % args)
+
+
+class UnixHTTPServer(ThreadingMixIn, HTTPServer):
+    """HTTP server listening on a Unix domain socket"""
+
+    address_family = socket.AF_UNIX
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        self.socket.bind(self.server_address)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+    def get_request(self):
+        request, _ = self.socket.accept()
+        return request, ("unix", 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resident Retail Market Intelligence analysis service")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", help="Listen on this Unix socket path instead of host:port")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--max-jobs", type=int, default=DEFAULT_MAX_JOBS)
+    parser.add_argument("--max-rss-mb", type=float, default=DEFAULT_MAX_RSS_MB)
+    parser.add_argument("--job-timeout", type=float, default=DEFAULT_JOB_TIMEOUT)
+    parser.add_argument("--batch-timeout", type=float, default=DEFAULT_BATCH_TIMEOUT)
+    args = parser.parse_args(argv)
+
+    pool = WorkerPool(args.workers, args.max_jobs, args.max_rss_mb, args.job_timeout, args.batch_timeout)
+    AnalysisRequestHandler.pool = pool
+
+    if args.socket:
+        server = UnixHTTPServer(args.socket, AnalysisRequestHandler)
+        logger.info(f"Analysis service listening on unix:{args.socket} with {args.workers} workers")
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), AnalysisRequestHandler)
+        logger.info(f"Analysis service listening on http://{args.host}:{args.port} with {args.workers} workers")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Offline benchmark suite for the analysis pipeline.
+
+A corpus of Indian locations (benchmarks/corpus.json) is recorded once against
+the live upstreams into one fixture bundle per location (http_fixtures.py), and
+then replayed offline as often as needed. Every (location, repeat) runs in a
+fresh interpreter with empty caches and seeded random generators, so runs are
+comparable and include import time.
+
+Per run the suite reports import, wall and CPU time, per-stage wall and CPU
+time and upstream calls per host, and fails (exit status 1) when a budget in
+benchmarks/budgets.json is exceeded, a request was not in the fixtures, or a
+metric regressed against a baseline report.
+
+    python benchmark.py record
+    python benchmark.py run --repeat 3 --json report.json
+    python benchmark.py run --baseline report.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+CORPUS_PATH = os.path.join(BENCHMARK_DIR, "corpus.json")
+FIXTURES_DIR = os.path.join(BENCHMARK_DIR, "fixtures")
+BUDGETS_PATH = os.path.join(BENCHMARK_DIR, "budgets.json")
+SEED = 1234
+RUN_TIMEOUT = 600
+
+
+def load_corpus(path: str) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["locations"]
+
+
+def fixture_path(fixtures_dir: str, location: dict) -> str:
+    return os.path.join(fixtures_dir, f"{location['id']}.json")
+
+
+def measure(location: dict, mode: str, fixtures: str, simulate_latency: bool = False) -> dict:
+    """One analysis of location in this process; call in a fresh interpreter (see run_isolated)"""
+    import_started = time.perf_counter()
+    import random
+    import numpy as np
+    import runner
+    from http_fixtures import FixtureBundle, Recorder, Replayer, use_fixtures
+    import_ms = (time.perf_counter() - import_started) * 1000
+
+    random.seed(SEED)
+    np.random.seed(SEED)
+    if mode == "record":
+        fixtures_handler = Recorder()
+    elif mode == "update":
+        fixtures_handler = Recorder(FixtureBundle.load(fixtures), replay_recorded=True)
+    else:
+        fixtures_handler = Replayer(FixtureBundle.load(fixtures), simulate_latency=simulate_latency)
+
+    with use_fixtures(fixtures_handler):
+        wall_started, cpu_started = time.perf_counter(), time.process_time()
+        result = runner.run_analysis(location["lat"], location["lon"], location["business_type"],
+                                     location["radius_km"], use_cache=False, diagnostics=True)
+        wall_ms = (time.perf_counter() - wall_started) * 1000
+        cpu_ms = (time.process_time() - cpu_started) * 1000
+
+    diagnostics = result.pop("_diagnostics", {})
+    if mode == "record":
+        fixtures_handler.bundle.meta = {
+            "location": location, "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "seed": SEED, "result": result,
+        }
+    if mode in ("record", "update"):
+        fixtures_handler.bundle.save(fixtures)
+
+    # Cache hits never left the process
+    upstream = {host: totals["calls"] - totals["cache_hits"] for host, totals in diagnostics.get("upstream", {}).items()}
+    return {
+        "id": location["id"],
+        "import_ms": round(import_ms, 1),
+        "wall_ms": round(wall_ms, 1),
+        "cpu_ms": round(cpu_ms, 1),
+        "stages": diagnostics.get("stages", {}),
+        "upstream": upstream,
+        "upstream_calls": sum(upstream.values()),
+        "missing_fixtures": getattr(fixtures_handler, "missing", []),
+        "imported": sorted({name.split(".")[0] for name in sys.modules}),
+        "error": result.get("error"),
+        "result": result,
+    }
+
+
+def run_isolated(location: dict, mode: str, fixtures: str, simulate_latency: bool = False) -> dict:
+    """measure() in a child interpreter with its own empty caches"""
+    with tempfile.TemporaryDirectory(prefix="radiu-bench-") as cache_dir:
+        # A fixed hash seed keeps set iteration (and so result ordering) stable across runs
+        env = dict(os.environ, RADIU_CACHE_DIR=cache_dir, RADIU_RESULT_CACHE="0", PYTHONHASHSEED=str(SEED))
+        env.pop("RADIU_REPLAY_FIXTURES", None)
+        env.pop("RADIU_HTTP_CACHE", None)
+        command = [sys.executable, os.path.abspath(__file__), "measure", json.dumps(location),
+                   "--mode", mode, "--fixtures", fixtures]
+        if simulate_latency:
+            command.append("--simulate-latency")
+        completed = subprocess.run(command, env=env, capture_output=True, text=True, timeout=RUN_TIMEOUT)
+    if completed.returncode != 0:
+        return {"id": location["id"], "error": (completed.stderr.strip().splitlines() or ["failed"])[-1]}
+    # The analysis prints progress; the measurement is the last line
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(runs: List[dict]) -> dict:
+    """Median of each metric over the repeats of one location"""
+    def median(values):
+        values = [v for v in values if v is not None]
+        return round(statistics.median(values), 1) if values else None
+
+    stage_names = sorted({name for run in runs for name in run["stages"]})
+    hosts = sorted({host for run in runs for host in run["upstream"]})
+    return {
+        "runs": len(runs),
+        "import_ms": median(run["import_ms"] for run in runs),
+        "wall_ms": median(run["wall_ms"] for run in runs),
+        "cpu_ms": median(run["cpu_ms"] for run in runs),
+        "stages": {name: {
+            "wall_ms": median(run["stages"].get(name, {}).get("duration_ms") for run in runs),
+            "cpu_ms": median(run["stages"].get(name, {}).get("cpu_ms") for run in runs),
+        } for name in stage_names},
+        "upstream": {host: max(run["upstream"].get(host, 0) for run in runs) for host in hosts},
+        "upstream_calls": max(run["upstream_calls"] for run in runs),
+        "missing_fixtures": sorted({call for run in runs for call in run["missing_fixtures"]}),
+        "imported": sorted({name for run in runs for name in run["imported"]}),
+    }
+
+
+def budget_for(budgets: dict, location_id: str) -> dict:
+    budget = dict(budgets.get("default", {}))
+    for key, value in budgets.get("locations", {}).get(location_id, {}).items():
+        if isinstance(value, dict):
+            budget[key] = dict(budget.get(key, {}), **value)
+        else:
+            budget[key] = value
+    return budget
+
+
+def check_budget(summary: dict, budget: dict) -> List[str]:
+    violations = []
+
+    def over(label, value, limit):
+        if limit is not None and value is not None and value > limit:
+            violations.append(f"{label} {value} > budget {limit}")
+
+    over("wall_ms", summary["wall_ms"], budget.get("max_wall_ms"))
+    over("cpu_ms", summary["cpu_ms"], budget.get("max_cpu_ms"))
+    over("import_ms", summary["import_ms"], budget.get("max_import_ms"))
+    over("upstream calls", summary["upstream_calls"], budget.get("max_upstream_calls"))
+    for host, limit in budget.get("max_host_calls", {}).items():
+        over(f"calls to {host}", summary["upstream"].get(host, 0), limit)
+    for stage, limit in budget.get("max_stage_wall_ms", {}).items():
+        over(f"stage {stage} wall_ms", summary["stages"].get(stage, {}).get("wall_ms"), limit)
+    for module in budget.get("forbidden_imports", []):
+        if module in summary["imported"]:
+            violations.append(f"{module} was imported")
+    if summary["missing_fixtures"]:
+        violations.append(f"{len(summary['missing_fixtures'])} requests not in fixtures, "
+                          f"e.g. {summary['missing_fixtures'][0]}")
+    return violations
+
+
+def check_regressions(summary: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Timings more than tolerance (a fraction) slower than baseline, or any extra upstream call"""
+    regressions = []
+
+    def slower(label, value, previous):
+        if value is not None and previous and value > previous * (1 + tolerance):
+            regressions.append(f"{label} {value} vs baseline {previous}")
+
+    slower("wall_ms", summary["wall_ms"], baseline.get("wall_ms"))
+    slower("cpu_ms", summary["cpu_ms"], baseline.get("cpu_ms"))
+    slower("import_ms", summary["import_ms"], baseline.get("import_ms"))
+    for stage, timings in summary["stages"].items():
+        slower(f"stage {stage} wall_ms", timings["wall_ms"], baseline.get("stages", {}).get(stage, {}).get("wall_ms"))
+    for host, calls in summary["upstream"].items():
+        previous = baseline.get("upstream", {}).get(host, 0)
+        if calls > previous:
+            regressions.append(f"calls to {host} {calls} vs baseline {previous}")
+    return regressions
+
+
+def record(args) -> int:
+    """
+    Record every location, then top the bundle up in args.passes - 1 further
+    passes that replay what is known and record what is not: stages run
+    concurrently and share caches, so which requests go upstream depends on
+    thread timing, and replay runs much faster than the recording did.
+    """
+    failures = 0
+    for location in load_corpus(args.corpus):
+        path = fixture_path(args.fixtures, location)
+        for attempt in range(args.passes):
+            run = run_isolated(location, "record" if attempt == 0 else "update", path)
+            if run.get("error") or "upstream" not in run:
+                failures += 1
+                print(f"✗ {location['id']}: {run.get('error')}")
+                break
+        else:
+            print(f"✓ {location['id']}: {run['upstream_calls']} upstream calls recorded -> {path}")
+    return 1 if failures else 0
+
+
+def run(args) -> int:
+    with open(args.budgets, encoding="utf-8") as f:
+        budgets = json.load(f)
+    baseline: Optional[Dict[str, dict]] = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["locations"]
+
+    report = {"repeat": args.repeat, "simulate_latency": args.simulate_latency, "locations": {}}
+    failed = False
+    for location in load_corpus(args.corpus):
+        path = fixture_path(args.fixtures, location)
+        if not os.path.exists(path):
+            print(f"✗ {location['id']}: no fixtures at {path} (run `benchmark.py record` first)")
+            failed = True
+            continue
+
+        runs = [run_isolated(location, "replay", path, args.simulate_latency) for _ in range(args.repeat)]
+        errors = [run_["error"] for run_ in runs if "stages" not in run_ or run_.get("error")]
+        if errors:
+            print(f"✗ {location['id']}: {errors[0]}")
+            failed = True
+            continue
+
+        summary = summarize(runs)
+        problems = check_budget(summary, budget_for(budgets, location["id"]))
+        del summary["imported"]
+        if baseline is not None and location["id"] in baseline:
+            problems += check_regressions(summary, baseline[location["id"]], args.tolerance)
+        if args.check_results:
+            with open(path, encoding="utf-8") as f:
+                expected = json.load(f).get("meta", {}).get("result")
+            if any(run_["result"] != expected for run_ in runs):
+                problems.append("result differs from the recorded analysis")
+        summary["violations"] = problems
+        report["locations"][location["id"]] = summary
+        failed = failed or bool(problems)
+
+        print(f"{'✗' if problems else '✓'} {location['id']}: wall {summary['wall_ms']} ms, "
+              f"cpu {summary['cpu_ms']} ms, import {summary['import_ms']} ms, "
+              f"{summary['upstream_calls']} upstream calls")
+        for name, timings in summary["stages"].items():
+            print(f"    {name:<24} wall {timings['wall_ms']:>8} ms  cpu {timings['cpu_ms']:>8} ms")
+        for problem in problems:
+            print(f"    ! {problem}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record/replay benchmark suite for the analysis pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="Record fixtures for the corpus against the live upstreams")
+    record_parser.add_argument("--corpus", default=CORPUS_PATH)
+    record_parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    record_parser.add_argument("--passes", type=int, default=3, help="Recording passes per location")
+
+    run_parser = subparsers.add_parser("run", help="Replay the corpus offline and check budgets")
+    run_parser.add_argument("--corpus", default=CORPUS_PATH)
+    run_parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    run_parser.add_argument("--budgets", default=BUDGETS_PATH)
+    run_parser.add_argument("--repeat", type=int, default=3, help="Runs per location (medians are reported)")
+    run_parser.add_argument("--simulate-latency", action="store_true", help="Replay with the recorded latencies")
+    run_parser.add_argument("--baseline", help="Report from an earlier run (--json) to compare against")
+    run_parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline")
+    run_parser.add_argument("--check-results", action="store_true", help="Fail when results differ from the recording")
+    run_parser.add_argument("--json", help="Write the report to this file")
+
+    measure_parser = subparsers.add_parser("measure")  # one run; used by record / run in a child process
+    measure_parser.add_argument("location")
+    measure_parser.add_argument("--mode", choices=("record", "update", "replay"), required=True)
+    measure_parser.add_argument("--fixtures", required=True)
+    measure_parser.add_argument("--simulate-latency", action="store_true")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "measure":
+        print(json.dumps(measure(json.loads(args.location), args.mode, args.fixtures, args.simulate_latency)))
+        return 0
+    return record(args) if args.command == "record" else run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
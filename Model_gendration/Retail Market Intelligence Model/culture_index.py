@@ -0,0 +1,292 @@
+"""
+Offline local-culture corpus index.
+
+The cultural fit score counts culture keywords and sentiment words in text
+about a place. Instead of fetching that text live, a Wikipedia / Wikivoyage
+dump subset is scanned once (with the same keyword matcher the analysis uses)
+into per-place label frequencies, stored in a compact memory-mapped file, so
+scoring a covered place is one dict access plus a row read.
+
+File layout:
+    b"CULTIDX1" | uint64 header length | JSON header (8-byte aligned) | uint32[places, labels]
+
+Pages are assigned to places by title: "Chennai", "Chennai/T. Nagar"
+(Wikivoyage districts count for the city and the district) and "Culture of
+Chennai"-style articles; a trailing "(...)" qualifier is dropped. With
+--places, only the listed places (one name per line) are kept.
+
+Build from MediaWiki XML dumps (.xml, .xml.bz2, .xml.gz) or WikiExtractor-style
+JSON lines ({"title": ..., "text": ...}):
+    python culture_index.py build enwikivoyage-latest-pages-articles.xml.bz2 \\
+        india_pages.jsonl --places india_places.txt --output data/culture.cidx
+"""
+import argparse
+import bz2
+import gzip
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter, defaultdict
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from keyword_matcher import culture_frequencies, get_culture_matcher
+
+logger = logging.getLogger(__name__)
+
+CULTURE_INDEX_PATH = os.environ.get(
+    "RADIU_CULTURE_INDEX",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "culture.cidx")
+)
+
+MAGIC = b"CULTIDX1"
+PAGES_LABEL = "_pages"  # column holding the number of pages behind each place
+
+
+def normalize_place(name: str) -> str:
+    return " ".join(str(name).casefold().replace(".", " ").split())
+
+
+class CultureIndex:
+    """Read-only, memory-mapped per-place keyword frequencies"""
+
+    def __init__(self, path: str = CULTURE_INDEX_PATH):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a culture index")
+            (header_length,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_length).decode("utf-8"))
+
+        self.path = path
+        self.labels: List[str] = header["labels"]
+        self.sources: List[str] = header.get("sources", [])
+        self.rows = {place: row for row, place in enumerate(header["places"])}
+        self.counts = np.memmap(
+            path, dtype="<u4", mode="r", offset=header["data_offset"],
+            shape=(len(header["places"]), len(self.labels))
+        )
+
+    def __len__(self):
+        return len(self.rows)
+
+    def lookup(self, *names: str) -> Optional[Tuple[str, Counter, int]]:
+        """(place, label frequencies, pages) for the first of names the index covers"""
+        for name in names:
+            if not name:
+                continue
+            row = self.rows.get(normalize_place(name))
+            if row is None:
+                continue
+            values = self.counts[row]
+            frequencies = Counter({
+                label: int(value) for label, value in zip(self.labels, values)
+                if value and label != PAGES_LABEL
+            })
+            return name, frequencies, int(values[self.labels.index(PAGES_LABEL)])
+        return None
+
+
+_index = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+def get_culture_index() -> Optional[CultureIndex]:
+    """Process-wide culture index, or None if no index file has been built"""
+    global _index, _index_loaded
+    with _index_lock:
+        if not _index_loaded:
+            _index_loaded = True
+            if os.path.exists(CULTURE_INDEX_PATH):
+                try:
+                    _index = CultureIndex(CULTURE_INDEX_PATH)
+                except Exception as e:
+                    logger.warning(f"Could not open culture index {CULTURE_INDEX_PATH}: {e}")
+        return _index
+
+
+# --- Corpus builder ---
+
+_REF_RE = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.S | re.I)
+_COMMENT_RE = re.compile(r"<!--.*?-->", re.S)
+_TEMPLATE_RE = re.compile(r"\{\{[^{}]*\}\}|\{\|[^{}]*?\|\}")  # innermost templates / tables
+_FILE_LINK_RE = re.compile(r"\[\[(?:File|Image|Category):[^\[\]]*(?:\[\[[^\]]*\]\][^\[\]]*)*\]\]", re.I)
+_LINK_RE = re.compile(r"\[\[(?:[^|\]]*\|)?([^\]]*)\]\]")
+_EXTERNAL_LINK_RE = re.compile(r"\[https?://\S+\s*([^\]]*)\]")
+_TAG_RE = re.compile(r"<[^>]+>")
+_MARKUP_RE = re.compile(r"'{2,}|^[=*#:;]+|=+$", re.M)
+
+
+def wikitext_to_text(wikitext: str) -> str:
+    """Rough plain text of a wikitext page: enough for keyword counting"""
+    text = _COMMENT_RE.sub("", wikitext)
+    text = _REF_RE.sub("", text)
+    previous = None
+    while previous != text:  # templates nest
+        previous, text = text, _TEMPLATE_RE.sub("", text)
+    text = _FILE_LINK_RE.sub("", text)
+    text = _LINK_RE.sub(r"\1", text)
+    text = _EXTERNAL_LINK_RE.sub(r"\1", text)
+    text = _TAG_RE.sub("", text)
+    return _MARKUP_RE.sub("", text)
+
+
+def _open_dump(path: str):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_xml_dump(path: str) -> Iterator[Tuple[str, str]]:
+    """(title, plain text) of the article pages in a MediaWiki XML export, streamed"""
+    with _open_dump(path) as f:
+        title, namespace, redirect, text = None, None, False, None
+        for _, element in ET.iterparse(f, events=("end",)):
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag == "title":
+                title = element.text or ""
+            elif tag == "ns":
+                namespace = element.text
+            elif tag == "redirect":
+                redirect = True
+            elif tag == "text":
+                text = element.text or ""
+            elif tag == "page":
+                if namespace in (None, "0") and not redirect and text and not text.lstrip().lower().startswith("#redirect"):
+                    yield title, wikitext_to_text(text)
+                title, namespace, redirect, text = None, None, False, None
+                element.clear()
+
+
+def read_json_lines(path: str) -> Iterator[Tuple[str, str]]:
+    """(title, text) from JSON lines with "title" and "text" fields"""
+    with _open_dump(path) as f:
+        for line in f:
+            if line.strip():
+                page = json.loads(line)
+                if page.get("title") and page.get("text"):
+                    yield page["title"], page["text"]
+
+
+def read_pages(path: str) -> Iterator[Tuple[str, str]]:
+    name = re.sub(r"\.(bz2|gz)$", "", path)
+    return read_json_lines(path) if name.endswith((".jsonl", ".json")) else read_xml_dump(path)
+
+
+_QUALIFIER_RE = re.compile(r"\s*\([^)]*\)\s*$")
+_TOPIC_OF_RE = re.compile(r"^(?:culture|cuisine|economy|tourism|history|geography|demographics) of (.+)$", re.I)
+
+
+def place_keys(title: str) -> Set[str]:
+    """Normalized places a page title is about"""
+    keys = set()
+    topic = _TOPIC_OF_RE.match(title)
+    if topic:
+        title = topic.group(1)
+    parts = [_QUALIFIER_RE.sub("", part) for part in title.split("/")]
+    for part in (parts[0], parts[-1]):
+        key = normalize_place(part)
+        if key:
+            keys.add(key)
+    return keys
+
+
+def build_frequencies(paths: List[str], places: Optional[Set[str]] = None) -> Dict[str, Counter]:
+    """Label frequencies per normalized place over every page of the given dumps"""
+    matcher = get_culture_matcher()
+    frequencies: Dict[str, Counter] = defaultdict(Counter)
+    for path in paths:
+        pages = 0
+        for title, text in read_pages(path):
+            keys = place_keys(title)
+            if places is not None:
+                keys &= places
+            if not keys:
+                continue
+            page_frequencies = culture_frequencies([text], matcher)
+            page_frequencies[PAGES_LABEL] = 1
+            for key in keys:
+                frequencies[key].update(page_frequencies)
+            pages += 1
+        logger.info(f"{path}: {pages} pages about indexed places")
+    return frequencies
+
+
+def read_places(path: str) -> Set[str]:
+    with open(path, encoding="utf-8") as f:
+        return {normalize_place(line) for line in f if line.strip() and not line.lstrip().startswith("#")}
+
+
+def write_index(frequencies: Dict[str, Counter], output: str, sources: Optional[List[str]] = None):
+    if not frequencies:
+        raise ValueError("No pages about the requested places were found in the input files")
+    places = sorted(frequencies)
+    labels = sorted({label for counts in frequencies.values() for label in counts} | {PAGES_LABEL})
+    columns = {label: column for column, label in enumerate(labels)}
+
+    matrix = np.zeros((len(places), len(labels)), dtype="<u4")
+    for row, place in enumerate(places):
+        for label, count in frequencies[place].items():
+            matrix[row, columns[label]] = min(count, np.iinfo(np.uint32).max)
+
+    header = {"labels": labels, "places": places, "sources": sources or [], "built_at": int(time.time())}
+    # data_offset depends on the header length; iterate until it is stable
+    data_offset = 0
+    while True:
+        header["data_offset"] = data_offset
+        encoded = json.dumps(header, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        padded = len(MAGIC) + 8 + len(encoded)
+        padded += (-padded) % 8
+        if padded == data_offset:
+            break
+        data_offset = padded
+    encoded += b" " * (data_offset - len(MAGIC) - 8 - len(encoded))
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(encoded)))
+        f.write(encoded)
+        f.write(matrix.tobytes())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline local-culture corpus index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Scan Wikipedia / Wikivoyage dumps into an index file")
+    build.add_argument("dumps", nargs="+", help="MediaWiki XML exports or JSON lines (optionally .bz2 / .gz)")
+    build.add_argument("--places", help="Only index these places (one name per line)")
+    build.add_argument("--output", default=CULTURE_INDEX_PATH)
+
+    lookup = subparsers.add_parser("lookup", help="Show the frequencies stored for a place")
+    lookup.add_argument("place")
+    lookup.add_argument("--index", default=CULTURE_INDEX_PATH)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        logging.basicConfig(level=logging.INFO)
+        places = read_places(args.places) if args.places else None
+        frequencies = build_frequencies(args.dumps, places)
+        write_index(frequencies, args.output, [os.path.basename(path) for path in args.dumps])
+        print(f"Wrote {len(frequencies)} places to {args.output}")
+    else:
+        found = CultureIndex(args.index).lookup(args.place)
+        if found is None:
+            print(json.dumps(None))
+        else:
+            place, frequencies, pages = found
+            print(json.dumps({"place": place, "pages": pages, "frequencies": frequencies}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Shared reverse-geocoding service.
+
+Every stage that needs to know where a coordinate is (country code, city, state)
+goes through one ReverseGeocoder instead of calling Nominatim itself. Results are
+kept in a disk-backed SQLite cache keyed on quantized coordinates and zoom level,
+so repeated and overlapping analyses reuse earlier answers, and lower-zoom
+questions (country) are answered from cached higher-zoom results (city / state).
+Country and state questions are first tried against the offline region index
+(region_index.py), so Nominatim is only asked when an address is really needed.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from http_client import HttpClient, get_http_client
+from region_index import get_region_index
+
+logger = logging.getLogger(__name__)
+
+NOMINATIM_REVERSE_URL = "https://nominatim.openstreetmap.org/reverse"
+USER_AGENT = "RetailMarketIntelligence/1.0 (contact@example.com)"
+
+CACHE_DIR = os.environ.get("RADIU_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+GEOCODE_CACHE_PATH = os.path.join(CACHE_DIR, "geocode.sqlite")
+
+# Grid size (degrees) used to quantize coordinates for each zoom level. Country
+# answers hold over large areas, city answers over ~1 km, streets over ~100 m.
+ZOOM_GRID = [(3, 0.1), (5, 0.05), (8, 0.02), (10, 0.01), (14, 0.002), (18, 0.0005)]
+
+# Address components that are meaningful at each zoom level
+ZOOM_ADDRESS_KEYS = [
+    (3, ("country", "country_code")),
+    (5, ("state", "region", "state_district")),
+    (8, ("county", "district")),
+    (10, ("city", "town", "village", "municipality", "postcode")),
+]
+
+# Order of components in a derived display name (most specific first)
+DISPLAY_ORDER = ("city", "town", "village", "municipality", "county", "district",
+                 "state_district", "state", "region", "postcode", "country")
+
+
+def grid_for_zoom(zoom: int) -> float:
+    for max_zoom, grid in ZOOM_GRID:
+        if zoom <= max_zoom:
+            return grid
+    return ZOOM_GRID[-1][1]
+
+
+def quantize(value: float, grid: float) -> int:
+    return int(round(value / grid))
+
+
+def derive_lower_zoom(payload: dict, zoom: int) -> dict:
+    """Trim a higher-zoom Nominatim payload to the components valid at `zoom`"""
+    allowed = [key for max_zoom, keys in ZOOM_ADDRESS_KEYS if max_zoom <= zoom for key in keys]
+    address = payload.get("address", {})
+    trimmed = {key: address[key] for key in allowed if key in address}
+
+    # Most specific component first, like Nominatim's display_name
+    names = [trimmed[key] for key in DISPLAY_ORDER if key in trimmed]
+    return {"display_name": ", ".join(names), "address": trimmed, "derived_from_zoom": payload.get("zoom")}
+
+
+class ReverseGeocoder:
+    """Nominatim reverse geocoder with a shared, persistent cache"""
+
+    def __init__(self, cache_path: str = GEOCODE_CACHE_PATH, http: Optional[HttpClient] = None):
+        self.cache_path = cache_path
+        self.http = http or get_http_client()
+        self.lock = threading.Lock()
+        self.request_lock = threading.Lock()
+        self.counters = {"offline_hits": 0, "hits": 0, "derived_hits": 0, "misses": 0, "errors": 0}
+
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(cache_path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS geocode (
+                lat_q INTEGER, lon_q INTEGER, zoom INTEGER,
+                payload TEXT, created REAL,
+                PRIMARY KEY (lat_q, lon_q, zoom)
+            )
+        """)
+        self.db.commit()
+
+    def _cache_get(self, lat: float, lon: float, zoom: int) -> Optional[dict]:
+        grid = grid_for_zoom(zoom)
+        with self.lock:
+            row = self.db.execute(
+                "SELECT payload FROM geocode WHERE lat_q = ? AND lon_q = ? AND zoom = ?",
+                (quantize(lat, grid), quantize(lon, grid), zoom)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _cache_put(self, lat: float, lon: float, zoom: int, payload: dict):
+        grid = grid_for_zoom(zoom)
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?)",
+                (quantize(lat, grid), quantize(lon, grid), zoom, json.dumps(payload), time.time())
+            )
+            self.db.commit()
+
+    def _count(self, counter: str):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def _fetch(self, lat: float, lon: float, zoom: int) -> dict:
+        """Live Nominatim request; the HTTP client paces it to the usage policy (caller holds request_lock)"""
+        params = {"format": "json", "lat": lat, "lon": lon, "zoom": zoom, "addressdetails": 1}
+        response = self.http.get(NOMINATIM_REVERSE_URL, params=params,
+                                 headers={"User-Agent": USER_AGENT}, timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    def reverse(self, lat: float, lon: float, zoom: int = 10) -> dict:
+        """
+        Reverse geocode (lat, lon) at a Nominatim zoom level. Returns the raw
+        Nominatim payload ('display_name', 'address', or 'error').
+        """
+        # Country (zoom <= 3) and state (zoom <= 5) questions from the offline index
+        if zoom <= 5:
+            index = get_region_index()
+            address = index.address(lat, lon) if index is not None else None
+            if address and (zoom <= 3 or "state" in address):
+                self._count("offline_hits")
+                return derive_lower_zoom({"address": address, "zoom": zoom}, zoom)
+
+        cached = self._cache_get(lat, lon, zoom)
+        if cached is not None:
+            self._count("hits")
+            return cached
+
+        # A finer cached answer for the same spot also answers coarser questions
+        for higher_zoom, _ in ZOOM_GRID:
+            if higher_zoom <= zoom:
+                continue
+            cached = self._cache_get(lat, lon, higher_zoom)
+            if cached is not None and "error" not in cached:
+                self._count("derived_hits")
+                return derive_lower_zoom(cached, zoom)
+
+        with self.request_lock:
+            # Another thread may have fetched the same cell while we waited
+            cached = self._cache_get(lat, lon, zoom)
+            if cached is not None:
+                self._count("hits")
+                return cached
+
+            self._count("misses")
+            try:
+                payload = self._fetch(lat, lon, zoom)
+            except Exception:
+                self._count("errors")
+                raise
+
+            payload["zoom"] = zoom
+            self._cache_put(lat, lon, zoom, payload)
+            return payload
+
+    def country_code(self, lat: float, lon: float) -> Optional[str]:
+        """ISO 3166-1 alpha-2 country code (upper case) or None"""
+        address = self.reverse(lat, lon, zoom=3).get("address", {})
+        return address.get("country_code", "").upper() or None
+
+    def country(self, lat: float, lon: float) -> str:
+        return self.reverse(lat, lon, zoom=3).get("address", {}).get("country", "")
+
+    def stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.counters)
+        answered = stats["offline_hits"] + stats["hits"] + stats["derived_hits"]
+        lookups = answered + stats["misses"]
+        stats["hit_rate"] = round(answered / lookups, 3) if lookups else 0.0
+        return stats
+
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+def get_reverse_geocoder() -> ReverseGeocoder:
+    """Process-wide ReverseGeocoder shared by every stage"""
+    global _geocoder
+    with _geocoder_lock:
+        if _geocoder is None:
+            _geocoder = ReverseGeocoder()
+        return _geocoder
@@ -0,0 +1,207 @@
+"""
+City-scale traffic score / market factor heatmap.
+
+Scoring every cell of a city grid with calculate_traffic_score() and
+get_market_factors() would mean an Overpass query (or several) per cell.
+Instead the POIs and roads of the whole area are loaded once as a single OSM
+snapshot, rasterized into per-cell counts with numpy.histogram2d, and the
+"how many features within r meters" counts the scalar functions use are taken
+for every cell at once by convolving those rasters with a disk kernel (FFT).
+The per-cell formulas mirror the scalar ones in runner.py.
+
+The result is a compact raster: one base64 uint8 band per score, rows from
+north to south, with offset/scale to recover the values.
+"""
+import base64
+import math
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from geocoding import get_reverse_geocoder
+from osm_snapshot import fetch_osm_snapshot, haversine_m
+from runner import (BUSINESS_ADJUSTMENTS, BUSINESS_OSM_TAGS, TrafficScoreCalculator,
+                    get_regulatory_index, get_seasonality_index)
+
+HEATMAP_CELL_M = 100
+HEATMAP_MAX_CELLS = 1_000_000
+HEATMAP_MAX_SPAN_KM = 80
+
+TRAFFIC_RADIUS_M = 1000   # calculate_traffic_score default radius
+URBAN_CHECK_M = 2000      # POI radius of the urban / rural classification
+MARKET_RADIUS_M = 5000    # get_market_factors default radius
+
+METERS_PER_DEGREE = 111320.0
+NODATA = 255
+
+
+class HeatmapGrid:
+    """Regular grid of cell_m cells over a lat/lon bounding box (local equirectangular)"""
+
+    def __init__(self, south: float, west: float, north: float, east: float, cell_m: float):
+        self.south, self.west, self.north, self.east = south, west, north, east
+        self.cell_m = cell_m
+        self.center = ((south + north) / 2, (west + east) / 2)
+        self.dlat = cell_m / METERS_PER_DEGREE
+        self.dlon = cell_m / (METERS_PER_DEGREE * math.cos(math.radians(self.center[0])))
+        self.rows = max(1, int(math.ceil((north - south) / self.dlat - 1e-9)))
+        self.cols = max(1, int(math.ceil((east - west) / self.dlon - 1e-9)))
+
+    def half_diagonal_m(self) -> float:
+        return float(haversine_m(self.center[0], self.center[1], self.north, self.east))
+
+    def padded_histogram(self, lats: np.ndarray, lons: np.ndarray, pad: int) -> np.ndarray:
+        """Feature counts per cell on the grid extended by `pad` cells on every side"""
+        lat_edges = self.south + self.dlat * np.arange(-pad, self.rows + pad + 1)
+        lon_edges = self.west + self.dlon * np.arange(-pad, self.cols + pad + 1)
+        counts, _, _ = np.histogram2d(lats, lons, bins=(lat_edges, lon_edges))
+        return counts
+
+
+def disk_kernel(radius_m: float, cell_m: float) -> np.ndarray:
+    radius = radius_m / cell_m
+    r = int(math.ceil(radius))
+    yy, xx = np.mgrid[-r:r + 1, -r:r + 1]
+    return (xx ** 2 + yy ** 2 <= radius ** 2).astype(float)
+
+
+def disk_sums(counts: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """Sum of counts within the kernel around every cell ('same'-size FFT convolution)"""
+    r = kernel.shape[0] // 2
+    shape = (counts.shape[0] + 2 * r, counts.shape[1] + 2 * r)
+    full = np.fft.irfft2(np.fft.rfft2(counts, shape) * np.fft.rfft2(kernel, shape), shape)
+    return np.maximum(np.rint(full[r:r + counts.shape[0], r:r + counts.shape[1]]), 0)
+
+
+def encode_band(values: np.ndarray, offset: float, scale: float) -> dict:
+    """Quantize a band to uint8 (NODATA for NaN), north row first, base64 encoded"""
+    quantized = np.clip(np.rint((values - offset) / scale), 0, NODATA - 1)
+    quantized = np.where(np.isnan(values), NODATA, quantized).astype(np.uint8)[::-1]
+    return {
+        "dtype": "uint8",
+        "offset": offset,
+        "scale": scale,
+        "nodata": NODATA,
+        "data": base64.b64encode(quantized.tobytes()).decode("ascii"),
+        "min": round(float(np.nanmin(values)), 3),
+        "max": round(float(np.nanmax(values)), 3),
+        "mean": round(float(np.nanmean(values)), 3),
+    }
+
+
+def traffic_scores(poi_1km, roads_1km, poi_2km, country_code: Optional[str]) -> np.ndarray:
+    """Vectorized TrafficScoreCalculator.calculate_traffic_score over per-cell counts"""
+    area_km2 = 3.1416 * (TRAFFIC_RADIUS_M / 1000) ** 2
+    poi_density = poi_1km / area_km2
+    road_density = roads_1km / area_km2
+
+    # get_population_density: country base density scaled by urban / suburban / rural
+    base_density = TrafficScoreCalculator().country_densities.get(country_code, 100) if country_code else 100
+    pop_density = np.where(poi_2km > 100, base_density * 100, np.where(poi_2km > 30, base_density * 50, base_density * 10))
+
+    norm_poi = np.minimum(1.0, poi_density / 50)
+    norm_pop = np.minimum(1.0, pop_density / 20000)
+    norm_road = np.minimum(1.0, road_density / 10)
+    return np.round((norm_poi * 0.4 + norm_pop * 0.3 + norm_road * 0.3) * 100, 1)
+
+
+def market_factors(properties_5km, competitors_5km, business_type: str, regulatory: float,
+                   seasonality: float) -> np.ndarray:
+    """Vectorized get_market_factors over per-cell counts (country-level parts are scalars)"""
+    # get_rent_index / estimate_rent_from_osm
+    estimated_rent = 500 * (1 + np.minimum(properties_5km / 10, 5))
+    rent = np.round(1.0 - np.clip(estimated_rent / 5000, 0.1, 1.0), 3)
+
+    # get_competition_density
+    competition = np.round(np.maximum(0.1, 1.0 - competitors_5km * 0.09), 3)
+
+    market_factor = rent * 0.4 + regulatory * 0.3 + seasonality * 0.2 + competition * 0.1
+    adjustment = BUSINESS_ADJUSTMENTS.get(business_type, BUSINESS_ADJUSTMENTS["default"])
+    return np.round(np.clip(market_factor * adjustment, 0.1, 1.0), 3)
+
+
+def _bounds(bounds=None, center=None, radius_km=None) -> Tuple[float, float, float, float]:
+    if bounds is not None:
+        south, west, north, east = (float(v) for v in bounds)
+    elif center is not None and radius_km:
+        lat, lon = (float(v) for v in center)
+        dlat = radius_km * 1000 / METERS_PER_DEGREE
+        dlon = radius_km * 1000 / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+        south, west, north, east = lat - dlat, lon - dlon, lat + dlat, lon + dlon
+    else:
+        raise ValueError("Give either bounds (south, west, north, east) or a center and radius_km")
+
+    if not (-90 <= south < north <= 90 and -180 <= west < east <= 180):
+        raise ValueError("Bounds must be south < north and west < east in degrees")
+    return south, west, north, east
+
+
+def build_heatmap(business_type: str, bounds=None, center=None, radius_km=None,
+                  cell_m: float = HEATMAP_CELL_M) -> Dict:
+    """
+    Traffic score and market factor for every cell of a city grid.
+    Returns {"error": ...} on invalid input or when OSM data cannot be loaded.
+    """
+    try:
+        grid = HeatmapGrid(*_bounds(bounds, center, radius_km), cell_m)
+    except (TypeError, ValueError) as e:
+        return {"error": str(e)}
+
+    if max(grid.rows, grid.cols) * cell_m > HEATMAP_MAX_SPAN_KM * 1000:
+        return {"error": f"Heatmap area is larger than {HEATMAP_MAX_SPAN_KM} km across"}
+    if grid.rows * grid.cols > HEATMAP_MAX_CELLS:
+        return {"error": f"{grid.rows}x{grid.cols} cells exceeds {HEATMAP_MAX_CELLS}; use larger cells"}
+
+    # One snapshot covering every cell's largest disk
+    reach = grid.half_diagonal_m()
+    snapshot = fetch_osm_snapshot(*grid.center, {
+        "poi": reach + max(MARKET_RADIUS_M, URBAN_CHECK_M),
+        "roads": reach + TRAFFIC_RADIUS_M,
+    })
+    if snapshot is None:
+        return {"error": "Could not load OpenStreetMap data for the heatmap area"}
+
+    kernels = {radius: disk_kernel(radius, cell_m) for radius in (TRAFFIC_RADIUS_M, URBAN_CHECK_M, MARKET_RADIUS_M)}
+    pad = max(kernel.shape[0] // 2 for kernel in kernels.values())
+    lats, lons = snapshot.coords[:, 0], snapshot.coords[:, 1]
+
+    def counts_within(mask, radius_m):
+        raster = grid.padded_histogram(lats[mask], lons[mask], pad)
+        sums = disk_sums(raster, kernels[radius_m])
+        return sums[pad:pad + grid.rows, pad:pad + grid.cols]
+
+    # Same tag filters as the scalar functions
+    traffic_pois = snapshot.matches(['["shop"]', '["amenity"]', '["office"]'], element_types=("node",))
+    roads = snapshot.matches(['["highway"]'], element_types=("way",))
+    rent_filter = '["amenity"~"restaurant|cafe|bar"]' if business_type in ["restaurant", "cafe", "bar"] else '["shop"]'
+    properties = snapshot.matches([rent_filter])
+    competitors = snapshot.matches([BUSINESS_OSM_TAGS.get(business_type, '["shop"]')], element_types=("node",))
+
+    country_code = get_reverse_geocoder().country_code(*grid.center)
+    traffic = traffic_scores(
+        counts_within(traffic_pois, TRAFFIC_RADIUS_M),
+        counts_within(roads, TRAFFIC_RADIUS_M),
+        counts_within(traffic_pois, URBAN_CHECK_M),
+        country_code,
+    )
+    market = market_factors(
+        counts_within(properties, MARKET_RADIUS_M),
+        counts_within(competitors, MARKET_RADIUS_M),
+        business_type,
+        get_regulatory_index(*grid.center, country_code=country_code or ''),
+        get_seasonality_index(*grid.center, business_type),
+    )
+
+    return {
+        "business_type": business_type,
+        "cell_m": cell_m,
+        "bounds": {"south": grid.south, "west": grid.west,
+                   "north": grid.south + grid.rows * grid.dlat, "east": grid.west + grid.cols * grid.dlon},
+        "width": grid.cols,
+        "height": grid.rows,
+        "layers": {
+            "traffic_score": encode_band(traffic, 0.0, 100 / 254),
+            "market_factor": encode_band(market, 0.0, 1 / 254),
+        },
+        "source": {"osm_elements": len(snapshot.elements), "country_code": country_code},
+    }
@@ -0,0 +1,262 @@
+"""
+Upstream response cache shared by every worker process.
+
+Responses are stored in SQLite under the SHA-256 of the canonicalized request:
+method, URL with its query parameters merged and sorted, and the request body
+(whitespace-collapsed for text bodies such as Overpass QL, sorted for form
+data). Each provider has its own TTL (HOST_CACHE_TTLS); hosts without one are
+not cached. Bodies a provider returns with a 200 but that are incomplete (an
+Overpass runtime-error remark) are never stored. The file is bounded in bytes
+and evicts least recently used entries.
+
+Identical requests in flight at the same time share one upstream call: threads
+of one process wait on an event, other processes see a lease row and poll for
+the stored response.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+HTTP_CACHE_PATH = os.environ.get("RADIU_HTTP_CACHE", os.path.join(
+    os.environ.get("RADIU_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")),
+    "http.sqlite"
+))
+HTTP_CACHE_ENABLED = os.environ.get("RADIU_HTTP_CACHE_ENABLED", "1") != "0"
+HTTP_CACHE_MAX_BYTES = int(os.environ.get("RADIU_HTTP_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+HTTP_CACHE_MAX_ENTRY_BYTES = 32 * 1024 * 1024
+
+# host -> seconds a successful response stays valid
+HOST_CACHE_TTLS = {
+    "overpass-api.de": 6 * 3600,
+    "nominatim.openstreetmap.org": 30 * 24 * 3600,
+    "en.wikipedia.org": 30 * 24 * 3600,       # cultural fit: one search per (place, business type)
+    "api.worldbank.org": 30 * 24 * 3600,
+    "api.worldpop.org": 30 * 24 * 3600,
+    "api.geonames.org": 30 * 24 * 3600,
+    "api.bigdatacloud.net": 30 * 24 * 3600,
+}
+
+# Overpass reports runtime errors (timeout, out of memory) with a 200 status, a
+# truncated element list and a "remark" such as "runtime error: Query timed out ..."
+_OVERPASS_REMARK_RE = re.compile(rb'"remark"\s*:\s*"runtime (?:error|remark)')
+
+LEASE_SECONDS = 150   # longest an upstream call may hold a key (Overpass snapshots: 120 s)
+LEASE_POLL = 0.1
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def cacheable_body(host: str, body: bytes) -> bool:
+    """Whether a 200 response body is complete enough to replay for the host's TTL"""
+    if host == "overpass-api.de":
+        return _OVERPASS_REMARK_RE.search(body) is None
+    return True
+
+
+def canonical_request(method: str, url: str, params=None, data=None) -> Tuple[str, str]:
+    """(cache key, host) of a request; equivalent requests get the same key"""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query += [(str(k), str(v)) for k, v in (params.items() if isinstance(params, dict) else params)]
+    canonical_url = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/",
+                                urlencode(sorted(query)), ""))
+
+    if data is None:
+        body = b""
+    elif isinstance(data, dict):
+        body = urlencode(sorted((str(k), str(v)) for k, v in data.items())).encode("utf-8")
+    else:
+        text = data.decode("utf-8", "replace") if isinstance(data, bytes) else str(data)
+        body = _WHITESPACE_RE.sub(" ", text).strip().encode("utf-8")
+
+    digest = hashlib.sha256(method.upper().encode("ascii") + b"\n" + canonical_url.encode("utf-8") + b"\n" + body)
+    return digest.hexdigest(), parts.netloc.lower().rsplit(":", 1)[0]
+
+
+class StoredResponse:
+    """Response body and metadata as read back from the cache"""
+
+    def __init__(self, status_code: int, headers: Dict[str, str], content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class HttpCache:
+    """SQLite response cache with per-host TTLs, byte-size LRU eviction and request de-duplication"""
+
+    def __init__(self, path: str = HTTP_CACHE_PATH, max_bytes: int = HTTP_CACHE_MAX_BYTES,
+                 ttls: Optional[Dict[str, float]] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = HOST_CACHE_TTLS if ttls is None else ttls
+        self.owner = str(os.getpid())
+        self.lock = threading.Lock()
+        self.inflight: Dict[str, threading.Event] = {}
+        self.counters = {"hits": 0, "shared": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, host TEXT, status INTEGER, headers TEXT, body BLOB,
+                size INTEGER, expires REAL, last_used REAL
+            );
+            CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+            CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT, expires REAL);
+        """)
+        self.db.commit()
+
+    def ttl(self, host: str) -> float:
+        return self.ttls.get(host, 0)
+
+    def _count(self, counter: str):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def lookup(self, key: str) -> Optional[StoredResponse]:
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT status, headers, body FROM responses WHERE key = ? AND expires > ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                self.db.commit()
+        if row is None:
+            return None
+        return StoredResponse(row[0], json.loads(row[1]), bytes(row[2]))
+
+    def store(self, key: str, host: str, status_code: int, headers, body: bytes):
+        """Keep a successful response for its host's TTL, then trim the file to max_bytes"""
+        ttl = self.ttl(host)
+        if ttl <= 0 or status_code != 200 or len(body) > HTTP_CACHE_MAX_ENTRY_BYTES:
+            return
+        if not cacheable_body(host, body):
+            logger.info(f"Not caching incomplete response from {host}")
+            return
+        kept_headers = {name: headers[name] for name in ("Content-Type",) if headers.get(name)}
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, host, status_code, json.dumps(kept_headers), body, len(body), now + ttl, now)
+            )
+            self.counters["stored"] += 1
+            self.db.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                evicted = 0
+                for old_key, size in self.db.execute(
+                        "SELECT key, size FROM responses ORDER BY last_used").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self.db.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    total -= size
+                    evicted += 1
+                self.counters["evicted"] += evicted
+            self.db.commit()
+
+    def _take_lease(self, key: str) -> bool:
+        now = time.time()
+        with self.lock:
+            self.db.execute("DELETE FROM leases WHERE key = ? AND expires <= ?", (key, now))
+            cursor = self.db.execute("INSERT OR IGNORE INTO leases VALUES (?, ?, ?)",
+                                     (key, self.owner, now + LEASE_SECONDS))
+            self.db.commit()
+            return cursor.rowcount == 1
+
+    def acquire(self, key: str) -> Tuple[Optional[StoredResponse], bool]:
+        """
+        Cached response for key, waiting for an identical request in flight in
+        this or another process. Returns (response, False) on a hit, or
+        (None, owner) when the caller must fetch; an owner calls release(key).
+        """
+        deadline = time.monotonic() + LEASE_SECONDS
+        waited = False
+        while True:
+            hit = self.lookup(key)
+            if hit is not None:
+                self._count("shared" if waited else "hits")
+                return hit, False
+            with self.lock:
+                event = self.inflight.get(key)
+                if event is None:
+                    self.inflight[key] = threading.Event()
+                    break
+            waited = True
+            if not event.wait(max(0.0, deadline - time.monotonic())):
+                self._count("misses")
+                return None, False
+
+        leased = self._take_lease(key)
+        while not leased and time.monotonic() < deadline:
+            time.sleep(LEASE_POLL)
+            hit = self.lookup(key)
+            if hit is not None:
+                self._count("shared")
+                self.release(key, lease=False)
+                return hit, False
+            leased = self._take_lease(key)
+
+        if leased:
+            # The previous holder may have stored the response just before giving the lease up
+            hit = self.lookup(key)
+            if hit is not None:
+                self._count("shared")
+                self.release(key)
+                return hit, False
+
+        self._count("misses")
+        return None, True
+
+    def release(self, key: str, lease: bool = True):
+        """End an owner's fetch of key (after storing its response) and wake waiting threads"""
+        if lease:
+            with self.lock:
+                self.db.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+                self.db.commit()
+        with self.lock:
+            event = self.inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.counters)
+            entries, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        stats.update({"entries": entries, "bytes": size})
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> Optional[HttpCache]:
+    """Process-wide HttpCache, or None when disabled with RADIU_HTTP_CACHE_ENABLED=0"""
+    global _cache
+    if not HTTP_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache()
+        return _cache
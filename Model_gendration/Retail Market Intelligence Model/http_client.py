@@ -0,0 +1,638 @@
+"""
+Shared HTTP client for every upstream call (Overpass, Nominatim, World Bank,
+Wikipedia, WorldPop, ...).
+
+One process-wide HttpClient keeps a keep-alive connection pool per host, applies
+the same connect / read timeouts everywhere and records per-host latency. With
+httpx installed it runs an httpx.AsyncClient (HTTP/2 when the h2 package is
+present) on a background event loop; stages keep calling it synchronously from
+their threads, async callers can await arequest(). Without httpx it falls back to
+one pooled requests.Session per host.
+
+Whatever the backend, responses offer .status_code / .json() / .text /
+.raise_for_status() and failures raise requests.exceptions (Timeout,
+ConnectionError, HTTPError), so existing error handling keeps working.
+
+Requests to the public providers are paced by a token bucket per host sized to
+each provider's usage policy (HOST_RATE_LIMITS), so a call only waits when that
+host's budget is used up instead of sleeping a fixed delay every time. Budgets
+are per process.
+
+Responses from providers with a cache TTL are answered from, and stored in, the
+shared response cache (http_cache.py); cache hits skip the rate limiter.
+Upstream traffic can be recorded into, or replayed from, fixture bundles
+(http_fixtures.py) in place of the network.
+
+Requests made inside a deadline() block never wait past it: timeouts are cut to
+the time left and, once it has passed, requests fail with a Timeout instead of
+being sent, so an analysis stage that overran its budget stops at its next
+upstream call.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from urllib.parse import urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import tracing
+from http_cache import HTTP_CACHE_MAX_ENTRY_BYTES, HttpCache, StoredResponse, canonical_request, get_http_cache
+from http_fixtures import ReplayedResponse, replay_from_env
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+HTTP_BACKEND = os.environ.get("RADIU_HTTP_BACKEND", "auto")  # "auto", "httpx" or "requests"
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("RADIU_HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.environ.get("RADIU_HTTP_READ_TIMEOUT", 30))
+HTTP_POOL_SIZE = int(os.environ.get("RADIU_HTTP_POOL_SIZE", 10))  # keep-alive connections per host
+HTTP_KEEPALIVE_EXPIRY = 60  # seconds an idle connection is kept open
+
+USER_AGENT = "RetailMarketIntelligence/1.0 (contact@example.com)"
+LATENCY_WINDOW = 256  # recent requests per host used for percentiles
+
+# host -> (sustained requests per second, burst). Hosts not listed are not limited.
+HOST_RATE_LIMITS = {
+    "nominatim.openstreetmap.org": (1.0, 1),   # usage policy: at most 1 request/s
+    "overpass-api.de": (0.5, 2),               # 2 query slots per IP on the main instance
+    "en.wikipedia.org": (5.0, 10),             # API etiquette: modest, serial use
+    "api.worldbank.org": (10.0, 20),
+    "api.worldpop.org": (2.0, 4),
+    "api.geonames.org": (0.25, 4),             # free accounts: 1000 credits/hour
+    "api.bigdatacloud.net": (2.0, 4),
+}
+
+
+def _rate_limits_from_env(value: str) -> dict:
+    """Parse RADIU_RATE_LIMITS="host=rate:burst,host=rate:burst" overrides"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        host, _, spec = item.partition("=")
+        rate, _, burst = spec.partition(":")
+        limits[host.strip()] = (float(rate), int(burst or 1))
+    return limits
+
+
+HOST_RATE_LIMITS.update(_rate_limits_from_env(os.environ.get("RADIU_RATE_LIMITS", "")))
+
+
+_deadline = contextvars.ContextVar("radiu_http_deadline", default=None)
+
+
+@contextmanager
+def deadline(at: Optional[float]):
+    """Bound the requests made inside the block by time.monotonic() deadline `at` (None: no bound)"""
+    token = _deadline.set(at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def _check_deadline():
+    at = _deadline.get()
+    if at is not None and time.monotonic() >= at:
+        raise requests.exceptions.Timeout("Deadline passed before the request was sent")
+
+
+def bounded_timeout(timeout: Optional[float]) -> Optional[float]:
+    """timeout cut to the time left before the active deadline"""
+    _check_deadline()
+    at = _deadline.get()
+    if at is None:
+        return timeout
+    remaining = at - time.monotonic()
+    return min(HTTP_READ_TIMEOUT if timeout is None else timeout, max(remaining, 0.001))
+
+
+def split_timeout(timeout: Optional[float]):
+    """(connect, read) seconds; a single number caps both, like requests' timeout"""
+    if timeout is None:
+        return HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT
+    return min(HTTP_CONNECT_TIMEOUT, timeout), timeout
+
+
+class TokenBucket:
+    """Token bucket that hands out send times, so waiting callers queue up fairly"""
+
+    def __init__(self, rate: float, burst: int, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.tokens = float(self.burst)
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token and return how many seconds to wait before using it"""
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RateLimiter:
+    """One token bucket per upstream host"""
+
+    def __init__(self, limits: Optional[dict] = None, clock=time.monotonic, sleep=time.sleep):
+        self.limits = HOST_RATE_LIMITS if limits is None else limits
+        self.clock = clock
+        self.sleep = sleep
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def reserve(self, host: str) -> float:
+        hostname = host.rsplit(":", 1)[0] if host.count(":") == 1 else host
+        limit = self.limits.get(hostname)
+        if limit is None:
+            return 0.0
+        with self.lock:
+            bucket = self.buckets.get(hostname)
+            if bucket is None:
+                bucket = self.buckets[hostname] = TokenBucket(*limit, clock=self.clock)
+        return bucket.reserve()
+
+    def acquire(self, host: str) -> float:
+        """Block until a request to host fits its budget; returns the time waited"""
+        wait = self.reserve(host)
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+
+class HttpResponse:
+    """Fully read response from either backend"""
+
+    def __init__(self, raw, url: str):
+        self.raw = raw
+        self.url = url
+        self.status_code = raw.status_code
+        self.headers = raw.headers
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def content(self) -> bytes:
+        return self.raw.content
+
+    @property
+    def text(self) -> str:
+        return self.raw.text
+
+    def json(self):
+        return self.raw.json()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            kind = "Client" if self.status_code < 500 else "Server"
+            raise requests.exceptions.HTTPError(f"{self.status_code} {kind} Error for url: {self.url}", response=self)
+
+
+class StreamingResponse(HttpResponse):
+    """Response whose body is read chunk by chunk; close() releases the connection"""
+
+    def __init__(self, raw, url: str, chunks, close):
+        super().__init__(raw, url)
+        self._chunks = chunks
+        self._close = close
+        self.closed = False
+
+    def iter_content(self, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        return self._chunks(chunk_size)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _stored_stream(stored: StoredResponse, url: str) -> StreamingResponse:
+    body = stored.content
+    return StreamingResponse(stored, url, lambda size: (body[i:i + size] for i in range(0, len(body), size)),
+                             lambda: None)
+
+
+def _from_cache(response: HttpResponse) -> bool:
+    return isinstance(response.raw, StoredResponse) and not isinstance(response.raw, ReplayedResponse)
+
+
+def _tee_stream(response: StreamingResponse, on_complete, max_bytes: Optional[int] = None,
+                on_close=None) -> StreamingResponse:
+    """
+    Pass a stream through while keeping a copy of the body; on_complete(body) is
+    called at close() if the body was read to the end (and fits max_bytes).
+    """
+    inner_chunks, inner_close = response._chunks, response._close
+    body = bytearray()
+    state = {"complete": False, "too_large": False}
+
+    def chunks(size):
+        for chunk in inner_chunks(size):
+            if not state["too_large"]:
+                body.extend(chunk)
+                if max_bytes is not None and len(body) > max_bytes:
+                    state["too_large"] = True
+                    body.clear()
+            yield chunk
+        state["complete"] = True
+
+    def close():
+        try:
+            inner_close()
+            if state["complete"] and not state["too_large"]:
+                on_complete(bytes(body))
+        finally:
+            if on_close is not None:
+                on_close()
+
+    return StreamingResponse(response.raw, response.url, chunks, close)
+
+
+class HostStats:
+    """Request count, errors and latency distribution for one upstream host"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.throttled_s = 0.0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, elapsed: float, error: bool, waited: float = 0.0):
+        self.requests += 1
+        self.throttled_s += waited
+        self.errors += int(error)
+        self.total_s += elapsed
+        self.max_s = max(self.max_s, elapsed)
+        self.recent.append(elapsed)
+
+    def summary(self) -> dict:
+        recent = sorted(self.recent)
+
+        def percentile(q):
+            return round(recent[min(len(recent) - 1, int(q * len(recent)))] * 1000, 1) if recent else 0.0
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "mean_ms": round(self.total_s / self.requests * 1000, 1) if self.requests else 0.0,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "max_ms": round(self.max_s * 1000, 1),
+            "throttled_ms": round(self.throttled_s * 1000, 1),
+        }
+
+
+class _RequestsBackend:
+    """One pooled requests.Session per host"""
+
+    name = "requests"
+    http2 = False
+
+    def __init__(self):
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def _session(self, host: str) -> requests.Session:
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                session.headers.update({"User-Agent": USER_AGENT})
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.sessions[host] = session
+            return session
+
+    def request(self, method, url, host, params, data, headers, timeout) -> HttpResponse:
+        raw = self._session(host).request(method, url, params=params, data=data, headers=headers,
+                                          timeout=split_timeout(timeout))
+        return HttpResponse(raw, raw.url)
+
+    def stream(self, method, url, host, params, data, headers, timeout) -> StreamingResponse:
+        raw = self._session(host).request(method, url, params=params, data=data, headers=headers,
+                                          timeout=split_timeout(timeout), stream=True)
+        return StreamingResponse(raw, raw.url, lambda size: raw.iter_content(chunk_size=size), raw.close)
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
+
+class _HttpxBackend:
+    """httpx.AsyncClient driven from a background event loop thread"""
+
+    name = "httpx"
+
+    def __init__(self):
+        self.http2 = HTTP2_AVAILABLE
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="http-client", daemon=True)
+        self.thread.start()
+        self.client = self.call(self._create_client())
+
+    async def _create_client(self):
+        return httpx.AsyncClient(
+            http2=self.http2,
+            headers={"User-Agent": USER_AGENT},
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=HTTP_POOL_SIZE * 8,
+                                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY),
+        )
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, coro):
+        return self.submit(coro).result()
+
+    async def send(self, method, url, params, data, headers, timeout, stream=False):
+        connect, read = split_timeout(timeout)
+        request = self.client.build_request(
+            method, url, params=params, headers=headers,
+            content=data if isinstance(data, (str, bytes)) else None,
+            data=data if isinstance(data, dict) else None,
+            timeout=httpx.Timeout(read, connect=connect),
+        )
+        try:
+            return await self.client.send(request, stream=stream)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e) or "Request timed out") from e
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e) or type(e).__name__) from e
+        except httpx.HTTPError as e:
+            raise requests.exceptions.RequestException(str(e)) from e
+
+    def request(self, method, url, host, params, data, headers, timeout) -> HttpResponse:
+        raw = self.call(self.send(method, url, params, data, headers, timeout))
+        return HttpResponse(raw, str(raw.url))
+
+    def stream(self, method, url, host, params, data, headers, timeout) -> StreamingResponse:
+        raw = self.call(self.send(method, url, params, data, headers, timeout, stream=True))
+
+        async def next_chunk(chunks):
+            try:
+                return await chunks.__anext__()
+            except StopAsyncIteration:
+                return None
+            except httpx.TimeoutException as e:
+                raise requests.exceptions.Timeout(str(e) or "Read timed out") from e
+            except httpx.TransportError as e:
+                raise requests.exceptions.ConnectionError(str(e) or type(e).__name__) from e
+
+        def chunks(size):
+            body = raw.aiter_bytes(chunk_size=size)
+            while True:
+                chunk = self.call(next_chunk(body))
+                if chunk is None:
+                    return
+                yield chunk
+
+        return StreamingResponse(raw, str(raw.url), chunks, lambda: self.call(raw.aclose()))
+
+    def close(self):
+        self.call(self.client.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class HttpClient:
+    """Process-wide HTTP client with per-host pools, rate limits, uniform timeouts and latency stats"""
+
+    def __init__(self, backend: str = HTTP_BACKEND, limiter: Optional[RateLimiter] = None,
+                 cache: Optional[HttpCache] = None):
+        if backend == "httpx" and httpx is None:
+            raise RuntimeError("RADIU_HTTP_BACKEND=httpx needs the httpx package (pip install 'httpx[http2]')")
+        use_httpx = httpx is not None and backend in ("auto", "httpx")
+        self.backend = _HttpxBackend() if use_httpx else _RequestsBackend()
+        self.limiter = limiter or RateLimiter()
+        self.cache = cache or get_http_cache()
+        self.fixtures = replay_from_env()  # http_fixtures Recorder / Replayer, see use_fixtures()
+        self.lock = threading.Lock()
+        self.hosts: Dict[str, HostStats] = {}
+
+    def _record(self, host: str, started: float, error: bool, waited: float = 0.0):
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.hosts.setdefault(host, HostStats()).record(elapsed, error, waited)
+
+    def _perform(self, send, method, url, params, data, headers, timeout):
+        host = urlsplit(url).netloc
+        span = tracing.current_span()
+        replayed = self._replay(method, url, params, data)
+        if replayed is not None:
+            span.set_attributes(replayed=True, **{"http.status_code": replayed.status_code})
+            self._record(host, time.perf_counter(), error=replayed.status_code >= 400)
+            return _stored_stream(replayed, url) if send == self.backend.stream else HttpResponse(replayed, url)
+
+        _check_deadline()
+        waited = self.limiter.acquire(host)
+        started = time.perf_counter()
+        if waited > 0:
+            span.set("throttled_ms", round(waited * 1000, 1))
+        try:
+            response = send(method, url, host, params, data, headers, bounded_timeout(timeout))
+        except Exception:
+            self._record(host, started, error=True, waited=waited)
+            raise
+        elapsed = time.perf_counter() - started
+        self._record(host, started, error=response.status_code >= 400, waited=waited)
+        span.set("http.status_code", response.status_code)
+        if response.status_code >= 400:
+            span.record_error(f"HTTP {response.status_code}")
+
+        recorder = self.fixtures if self.fixtures is not None and self.fixtures.mode == "record" else None
+        if recorder is not None:
+            key, _ = canonical_request(method, url, params, data)
+
+            def record(body):
+                recorder.record(key, method, url, response.status_code, response.headers, body, elapsed)
+
+            if isinstance(response, StreamingResponse):
+                return _tee_stream(response, record)
+            record(response.content)
+        return response
+
+    def _replay(self, method, url, params, data) -> Optional[ReplayedResponse]:
+        """Response from the installed fixtures, or None to send the request"""
+        if self.fixtures is None:
+            return None
+        key, _ = canonical_request(method, url, params, data)
+        return self.fixtures.respond(key, method, f"{url}?{urlencode(params)}" if params else url)
+
+    def _cache_for(self, url: str, use_cache: bool) -> Optional[HttpCache]:
+        if not use_cache or self.cache is None:
+            return None
+        return self.cache if self.cache.ttl(urlsplit(url).hostname or "") > 0 else None
+
+    @staticmethod
+    def _span_attributes(method: str, url: str) -> dict:
+        parts = urlsplit(url)
+        return {"http.method": method, "http.host": parts.netloc, "http.url": f"{parts.scheme}://{parts.netloc}{parts.path}"}
+
+    def request(self, method: str, url: str, params=None, data=None, headers=None,
+                timeout: Optional[float] = None, cache: bool = True) -> HttpResponse:
+        """Send a request and read the whole body; timeout=None uses the uniform defaults"""
+        with tracing.span(f"HTTP {method}", kind="client", **self._span_attributes(method, url)) as span:
+            response = self._request(method, url, params, data, headers, timeout, cache)
+            span.set_attributes(bytes=len(response.content), cache_hit=_from_cache(response))
+            return response
+
+    def _request(self, method, url, params, data, headers, timeout, cache) -> HttpResponse:
+        http_cache = self._cache_for(url, cache)
+        if http_cache is None:
+            return self._perform(self.backend.request, method, url, params, data, headers, timeout)
+
+        key, host = canonical_request(method, url, params, data)
+        hit, owner = http_cache.acquire(key)
+        if hit is not None:
+            return HttpResponse(hit, url)
+        try:
+            response = self._perform(self.backend.request, method, url, params, data, headers, timeout)
+            http_cache.store(key, host, response.status_code, response.headers, response.content)
+            return response
+        finally:
+            if owner:
+                http_cache.release(key)
+
+    def get(self, url: str, **kwargs) -> HttpResponse:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> HttpResponse:
+        return self.request("POST", url, **kwargs)
+
+    def stream(self, method: str, url: str, params=None, data=None, headers=None,
+               timeout: Optional[float] = None, cache: bool = True) -> StreamingResponse:
+        """Send a request and return once headers arrive; the caller must close() the response"""
+        with tracing.span(f"HTTP {method}", kind="client", **self._span_attributes(method, url)) as span:
+            response = self._stream(method, url, params, data, headers, timeout, cache)
+            span.set("cache_hit", _from_cache(response))
+        if span is tracing.NOOP_SPAN:
+            return response
+        return self._counting_stream(response, span)
+
+    @staticmethod
+    def _counting_stream(response: StreamingResponse, span) -> StreamingResponse:
+        """Record the bytes and read time of a streamed body on its span (which ends at the headers)"""
+        inner_chunks, inner_close = response._chunks, response._close
+        opened = time.perf_counter()
+        received = [0]
+
+        def chunks(size):
+            for chunk in inner_chunks(size):
+                received[0] += len(chunk)
+                yield chunk
+
+        def close():
+            span.set_attributes(bytes=received[0], read_ms=round((time.perf_counter() - opened) * 1000, 1))
+            inner_close()
+
+        return StreamingResponse(response.raw, response.url, chunks, close)
+
+    def _stream(self, method, url, params, data, headers, timeout, cache) -> StreamingResponse:
+        http_cache = self._cache_for(url, cache)
+        if http_cache is None:
+            return self._perform(self.backend.stream, method, url, params, data, headers, timeout)
+
+        key, host = canonical_request(method, url, params, data)
+        hit, owner = http_cache.acquire(key)
+        if hit is not None:
+            return _stored_stream(hit, url)
+        try:
+            response = self._perform(self.backend.stream, method, url, params, data, headers, timeout)
+        except Exception:
+            if owner:
+                http_cache.release(key)
+            raise
+        if response.status_code != 200:
+            if owner:
+                http_cache.release(key)
+            return response
+        # Stored once it has been read completely
+        return _tee_stream(
+            response,
+            lambda body: http_cache.store(key, host, response.status_code, response.headers, body),
+            max_bytes=HTTP_CACHE_MAX_ENTRY_BYTES,
+            on_close=(lambda: http_cache.release(key)) if owner else None,
+        )
+
+    async def arequest(self, method: str, url: str, **kwargs) -> HttpResponse:
+        """request() for asyncio callers, without blocking their event loop"""
+        if (isinstance(self.backend, _HttpxBackend) and self.fixtures is None
+                and self._cache_for(url, kwargs.get("cache", True)) is None):
+            host = urlsplit(url).netloc
+            waited = self.limiter.reserve(host)
+            if waited > 0:
+                await asyncio.sleep(waited)
+            started = time.perf_counter()
+            try:
+                raw = await asyncio.wrap_future(self.backend.submit(self.backend.send(
+                    method, url, kwargs.get("params"), kwargs.get("data"), kwargs.get("headers"), kwargs.get("timeout")
+                )))
+            except Exception:
+                self._record(host, started, error=True, waited=waited)
+                raise
+            self._record(host, started, error=raw.status_code >= 400, waited=waited)
+            return HttpResponse(raw, str(raw.url))
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: self.request(method, url, **kwargs))
+
+    def host_stats(self) -> dict:
+        """Per-host request counts and latency percentiles"""
+        with self.lock:
+            hosts = {host: stats.summary() for host, stats in sorted(self.hosts.items())}
+        return {
+            "backend": self.backend.name,
+            "http2": self.backend.http2,
+            "hosts": hosts,
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+    def close(self):
+        self.backend.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Process-wide HttpClient shared by every stage"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
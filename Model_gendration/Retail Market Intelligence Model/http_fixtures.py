@@ -0,0 +1,174 @@
+"""
+Record / replay of upstream HTTP traffic.
+
+In record mode every request the shared HttpClient sends upstream is captured,
+with its response and latency, into a FixtureBundle (a JSON file keyed on the
+canonical request, see http_cache.canonical_request). In replay mode the client
+answers from a bundle instead of the network, without rate limiting, and a request that was never recorded fails like a connection error, so
+an analysis replays deterministically and offline. Fixtures stand in for the
+network only: the response cache in front of it still de-duplicates requests,
+so replayed call counts are the ones a live analysis would make.
+
+    with use_fixtures(Recorder()) as recorder:
+        run_analysis(...)
+    recorder.bundle.save("fixtures/chennai.json")
+
+    with use_fixtures(Replayer(FixtureBundle.load("fixtures/chennai.json"))):
+        run_analysis(...)
+
+Which requests an analysis sends depends on thread timing (stages share the
+geocoding and response caches), so a bundle can be topped up: a Recorder with
+replay_recorded=True answers known requests from the bundle, at replay speed,
+and records only the ones it has not seen.
+
+RADIU_REPLAY_FIXTURES=<bundle>[:<bundle>...] puts the process-wide client in
+replay mode from the start (e.g. to run the analysis service offline).
+"""
+import base64
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import requests
+
+from http_cache import StoredResponse
+
+FIXTURE_FORMAT = 1
+REPLAY_FIXTURES = os.environ.get("RADIU_REPLAY_FIXTURES")
+
+
+class FixtureBundle:
+    """Recorded responses, a list per canonical request key (in the order they were sent)"""
+
+    def __init__(self, entries: Optional[Dict[str, List[dict]]] = None, meta: Optional[dict] = None):
+        self.entries = entries or {}
+        self.meta = meta or {}
+
+    def add(self, key: str, entry: dict):
+        self.entries.setdefault(key, []).append(entry)
+
+    def __len__(self):
+        return sum(len(responses) for responses in self.entries.values())
+
+    def merge(self, other: "FixtureBundle"):
+        """Add the requests of other that this bundle has no recording for"""
+        for key, responses in other.entries.items():
+            self.entries.setdefault(key, list(responses))
+
+    @classmethod
+    def load(cls, path: str) -> "FixtureBundle":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != FIXTURE_FORMAT:
+            raise ValueError(f"{path}: unsupported fixture format {data.get('format')}")
+        return cls(data["entries"], data.get("meta"))
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"format": FIXTURE_FORMAT, "meta": self.meta, "entries": self.entries}, f, indent=1)
+
+
+def _encode_body(body: bytes) -> dict:
+    try:
+        return {"text": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(body).decode("ascii")}
+
+
+def _decode_body(entry: dict) -> bytes:
+    if "base64" in entry:
+        return base64.b64decode(entry["base64"])
+    return entry.get("text", "").encode("utf-8")
+
+
+class ReplayedResponse(StoredResponse):
+    """Response served from a fixture bundle"""
+
+
+def _stored(entry: dict) -> ReplayedResponse:
+    return ReplayedResponse(entry["status"], entry.get("headers", {}), _decode_body(entry))
+
+
+class Recorder:
+    """Captures every upstream response into a bundle"""
+
+    mode = "record"
+
+    def __init__(self, bundle: Optional[FixtureBundle] = None, replay_recorded: bool = False):
+        self.bundle = bundle or FixtureBundle()
+        self.replay_recorded = replay_recorded
+        self.lock = threading.Lock()
+
+    def respond(self, key: str, method: str, url: str) -> Optional[ReplayedResponse]:
+        """The recorded response when topping up a bundle, None to go upstream"""
+        if not self.replay_recorded:
+            return None
+        with self.lock:
+            responses = self.bundle.entries.get(key)
+        return _stored(responses[0]) if responses else None
+
+    def record(self, key: str, method: str, url: str, status_code: int, headers, body: bytes, elapsed: float):
+        entry = {
+            "method": method,
+            "url": url,
+            "status": status_code,
+            "headers": {name: headers[name] for name in ("Content-Type",) if headers.get(name)},
+            "elapsed_ms": round(elapsed * 1000, 1),
+            **_encode_body(body),
+        }
+        with self.lock:
+            self.bundle.add(key, entry)
+
+
+class Replayer:
+    """Serves responses from a bundle; repeated requests get the recorded responses in order"""
+
+    mode = "replay"
+
+    def __init__(self, bundle: FixtureBundle, simulate_latency: bool = False):
+        self.bundle = bundle
+        self.simulate_latency = simulate_latency
+        self.lock = threading.Lock()
+        self.served: Dict[str, int] = {}
+        self.missing: List[str] = []
+
+    def respond(self, key: str, method: str, url: str) -> ReplayedResponse:
+        responses = self.bundle.entries.get(key)
+        with self.lock:
+            if not responses:
+                self.missing.append(f"{method} {url}")
+                raise requests.exceptions.ConnectionError(f"No recorded response for {method} {url}")
+            index = self.served.get(key, 0)
+            self.served[key] = index + 1
+        entry = responses[min(index, len(responses) - 1)]
+        if self.simulate_latency:
+            time.sleep(entry.get("elapsed_ms", 0) / 1000)
+        return _stored(entry)
+
+
+@contextmanager
+def use_fixtures(fixtures, client=None):
+    """Install a Recorder or Replayer on the HTTP client for the duration of the block"""
+    if client is None:
+        from http_client import get_http_client
+        client = get_http_client()
+    previous = client.fixtures
+    client.fixtures = fixtures
+    try:
+        yield fixtures
+    finally:
+        client.fixtures = previous
+
+
+def replay_from_env() -> Optional[Replayer]:
+    """Replayer over the bundles listed in RADIU_REPLAY_FIXTURES, if set"""
+    if not REPLAY_FIXTURES:
+        return None
+    bundle = FixtureBundle()
+    for path in filter(None, REPLAY_FIXTURES.split(os.pathsep)):
+        bundle.merge(FixtureBundle.load(path))
+    return Replayer(bundle)
@@ -0,0 +1,226 @@
+"""
+Multi-keyword matching for the cultural fit analysis.
+
+All keyword sets (the culture categories, the sentiment words and the Hindi /
+Tamil transliterations) are compiled once per process into a single
+Aho-Corasick automaton, turned into a dense transition table, so each text is
+scanned in one pass no matter how many keywords there are: one dict lookup per
+character instead of one substring search per keyword.
+
+Every keyword carries a label (its category, or "positive" / "negative") and a
+whole-word flag. English keywords keep the historical substring semantics
+("bar" also counts in "barista") unless RADIU_KEYWORD_WHOLE_WORDS=1; the
+transliterated keywords are short and ambiguous inside other words, so they
+only ever match whole words. Occurrences of one keyword are counted without
+overlaps, like str.count.
+"""
+import os
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+KEYWORD_WHOLE_WORDS = os.environ.get("RADIU_KEYWORD_WHOLE_WORDS", "0") == "1"
+
+CULTURE_KEYWORDS = {
+    "coffee": ["coffee", "espresso", "latte", "cappuccino", "americano", "macchiato", "flat white", "café"],
+    "tea": ["tea", "chai", "green tea", "black tea", "matcha", "oolong", "herbal tea", "bubble tea", "boba"],
+    "vegetarian": ["vegetarian", "plant-based", "vegan", "veggie", "meat-free", "cruelty-free"],
+    "nonveg": ["chicken", "meat", "fish", "beef", "pork", "steak", "seafood", "lamb", "poultry", "bacon"],
+    "streetfood": ["street food", "tacos", "bbq", "kebab", "shawarma", "falafel", "food truck", "food stall"],
+    "fastfood": ["burger", "fries", "pizza", "sandwich", "hotdog", "fast food", "quick service"],
+    "healthy": ["salad", "organic", "gluten-free", "low-carb", "superfood", "wellness", "nutrition", "clean eating"],
+    "dessert": ["ice cream", "cake", "pastry", "donut", "pudding", "brownie", "sweet", "bakery", "patisserie"],
+    "alcohol": ["wine", "beer", "cocktail", "bar", "pub", "brewery", "spirits", "whiskey", "vodka"],
+    "cafe": ["cafe", "coffee shop", "tea house", "espresso bar", "pastry shop"],
+    "fine_dining": ["fine dining", "gourmet", "luxury restaurant", "chef's table", "michelin"],
+    "casual_dining": ["casual dining", "family restaurant", "bistro", "brunch", "eatery"]
+}
+
+# Romanized and native-script food vocabulary, per language, by culture category
+TRANSLITERATED_KEYWORDS = {
+    "hi": {
+        "coffee": ["kofi", "कॉफ़ी", "कॉफी"],
+        "tea": ["chaay", "masala chai", "cutting chai", "चाय"],
+        "vegetarian": ["shakahari", "shudh shakahari", "शाकाहारी"],
+        "nonveg": ["mansahari", "murgh", "gosht", "machhli", "मांसाहारी", "मुर्ग"],
+        "streetfood": ["chaat", "pani puri", "golgappa", "vada pav", "pav bhaji", "dhaba", "चाट", "ढाबा"],
+        "fastfood": ["kathi roll", "frankie"],
+        "healthy": ["ayurvedic", "sattvic", "millet"],
+        "dessert": ["mithai", "halwai", "halwa", "jalebi", "gulab jamun", "kulfi", "rasgulla", "मिठाई"],
+        "alcohol": ["daru", "theka", "sharab", "शराब"],
+        "cafe": ["tapri", "chai tapri", "chai stall"],
+        "casual_dining": ["bhojanalaya", "thali", "भोजनालय"],
+    },
+    "ta": {
+        "coffee": ["kaapi", "filter kaapi", "காபி"],
+        "tea": ["theneer", "tea kadai", "தேநீர்", "டீ"],
+        "vegetarian": ["saivam", "pure veg", "சைவம்"],
+        "nonveg": ["asaivam", "kozhi", "meen", "அசைவம்", "கோழி", "மீன்"],
+        "streetfood": ["kaiyendhi bhavan", "bajji", "bonda", "kothu parotta", "கையேந்தி பவன்"],
+        "dessert": ["payasam", "mysore pak", "inippu", "இனிப்பு"],
+        "alcohol": ["tasmac", "kallu", "கள்ளு"],
+        "cafe": ["tiffin centre", "tiffin center", "டிபன்"],
+        "casual_dining": ["unavagam", "உணவகம்"],
+    },
+}
+
+SENTIMENT_WORDS = {
+    "positive": ["good", "great", "excellent", "amazing", "love", "best", "popular", "favorite", "trending", "growth", "success", "demand"],
+    "negative": ["bad", "poor", "terrible", "hate", "worst", "avoid", "overpriced", "disappointing", "decline", "saturated", "competition"],
+}
+
+
+def _is_word_char(ch: str) -> bool:
+    # Combining marks (Devanagari / Tamil vowel signs, viramas) are part of a word
+    return ch.isalnum() or ch == "_" or unicodedata.category(ch)[0] == "M"
+
+
+class KeywordHits:
+    """What one scan found: occurrences per label and the distinct keywords seen per label"""
+
+    __slots__ = ("counts", "found")
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.found: Dict[str, Set[str]] = {}
+
+    def add(self, label: str, keyword: str, count: int = 1):
+        self.counts[label] += count
+        self.found.setdefault(label, set()).add(keyword)
+
+    def update(self, other: "KeywordHits"):
+        self.counts.update(other.counts)
+        for label, keywords in other.found.items():
+            self.found.setdefault(label, set()).update(keywords)
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over (label, keyword, whole_word) patterns, matching case-insensitively"""
+
+    def __init__(self, patterns: Iterable[Tuple[str, str, bool]]):
+        self.labels: List[str] = []
+        self.keywords: List[str] = []
+        self.lengths: List[int] = []
+        self.whole_word: List[bool] = []
+
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for label, keyword, whole_word in patterns:
+            keyword = keyword.lower()
+            if not keyword:
+                continue
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = goto[state][ch] = len(goto)
+                    goto.append({})
+                    outputs.append([])
+                state = nxt
+            outputs[state].append(len(self.keywords))
+            self.labels.append(label)
+            self.keywords.append(keyword)
+            self.lengths.append(len(keyword))
+            self.whole_word.append(whole_word)
+
+        # Breadth-first: failure links, inherited outputs and the dense transition table, where
+        # delta[s] holds every character that leads anywhere but the root from state s
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [None] * (len(goto) - 1)
+        queue = list(goto[0].values())
+        for state in queue:
+            delta[state] = dict(delta[fail[state]])
+            delta[state].update(goto[state])
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            for ch, child in goto[state].items():
+                fail[child] = delta[fail[state]].get(ch, 0)
+                queue.append(child)
+        self.delta = delta
+        self.outputs = [tuple(out) for out in outputs]
+        self.accepting = frozenset(state for state, out in enumerate(outputs) if out)
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def scan(self, text: str, hits: Optional[KeywordHits] = None) -> KeywordHits:
+        """Count keyword occurrences in text (in one pass), adding them to hits if given"""
+        hits = hits if hits is not None else KeywordHits()
+        if not text:
+            return hits
+        text = text.lower()
+        delta, outputs, accepting = self.delta, self.outputs, self.accepting
+        lengths, whole_word = self.lengths, self.whole_word
+        last_end: Dict[int, int] = {}  # pattern -> end of its last counted occurrence
+        counted: Counter = Counter()
+
+        state = 0
+        end = 0
+        for ch in text:
+            end += 1
+            state = delta[state].get(ch, 0)
+            if state not in accepting:
+                continue
+            for pattern in outputs[state]:
+                start = end - lengths[pattern]
+                if start < last_end.get(pattern, 0):
+                    continue
+                if whole_word[pattern] and (
+                    (start > 0 and _is_word_char(text[start - 1]))
+                    or (end < len(text) and _is_word_char(text[end]))
+                ):
+                    continue
+                last_end[pattern] = end
+                counted[pattern] += 1
+
+        for pattern, count in counted.items():
+            hits.add(self.labels[pattern], self.keywords[pattern], count)
+        return hits
+
+    def scan_all(self, texts: Iterable[str]) -> KeywordHits:
+        """Totals over many texts"""
+        hits = KeywordHits()
+        for text in texts:
+            self.scan(text, hits)
+        return hits
+
+
+def culture_patterns(whole_words: bool = KEYWORD_WHOLE_WORDS) -> List[Tuple[str, str, bool]]:
+    """(label, keyword, whole_word) for the culture categories, transliterations and sentiment words"""
+    patterns = []
+    for keyword_sets, whole_word in ((CULTURE_KEYWORDS, whole_words), (SENTIMENT_WORDS, whole_words)):
+        for label, keywords in keyword_sets.items():
+            patterns.extend((label, keyword, whole_word) for keyword in keywords)
+    for language_sets in TRANSLITERATED_KEYWORDS.values():
+        for label, keywords in language_sets.items():
+            patterns.extend((label, keyword, True) for keyword in keywords)
+    return patterns
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_culture_matcher() -> KeywordMatcher:
+    """Process-wide matcher over culture_patterns(), compiled on first use"""
+    global _matcher
+    with _matcher_lock:
+        if _matcher is None:
+            _matcher = KeywordMatcher(culture_patterns())
+        return _matcher
+
+
+def culture_frequencies(texts: Iterable[str], matcher: Optional[KeywordMatcher] = None) -> Counter:
+    """
+    Per-label totals over texts as the cultural fit score uses them: keyword
+    occurrences for the culture categories, and for "positive" / "negative" the
+    number of distinct sentiment words found in each text.
+    """
+    matcher = matcher or get_culture_matcher()
+    totals = Counter()
+    for text in texts:
+        if text:
+            hits = matcher.scan(text)
+            for label, count in hits.counts.items():
+                totals[label] += len(hits.found[label]) if label in SENTIMENT_WORDS else count
+    return totals
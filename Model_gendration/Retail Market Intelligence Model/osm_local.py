@@ -0,0 +1,314 @@
+"""
+Offline OpenStreetMap query engine.
+
+Ingests an OSM extract (a .pbf through pyosmium, or an Overpass JSON dump) into
+a SQLite database with an R*Tree over feature coordinates, and answers the
+Overpass QL subset the analysis builds: unions of node / way / nwr statements
+with ["key"], ["key"="value"] and ["key"~"regex"] filters, an (around:r,lat,lon)
+or (south,west,north,east) area, and `out count` / `out [body|center|tags]`.
+Ways are stored by their bounding-box center, like Overpass `out center`.
+
+Select it with OSM_BACKEND=local (and OSM_LOCAL_DB=<path>); see
+osm_snapshot.run_overpass_query.
+
+Build the database:
+    python osm_local.py ingest india-latest.osm.pbf --output data/osm.sqlite
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from osm_snapshot import haversine_m, parse_tag_filter, tags_match
+
+try:
+    import osmium
+except ImportError:
+    osmium = None
+
+logger = logging.getLogger(__name__)
+
+OSM_LOCAL_DB = os.environ.get(
+    "OSM_LOCAL_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "osm.sqlite")
+)
+
+# Only features carrying one of these keys are indexed; the analysis never asks for others
+INDEXED_KEYS = ("shop", "amenity", "office", "leisure", "highway", "building",
+                "tourism", "craft", "healthcare")
+
+INSERT_BATCH = 10000
+METERS_PER_DEGREE = 111320.0
+
+_SETTINGS_RE = re.compile(r"^\s*(?:\[[^\]]*\]\s*)+;")
+_STATEMENT_RE = re.compile(r"\b(node|way|relation|rel|nwr)((?:\[[^\]]*\])*)\(([^)]*)\)\s*;")
+_OUT_RE = re.compile(r"\bout\b([^;]*);")
+
+
+class OverpassQueryError(ValueError):
+    """Query uses Overpass QL the local engine does not support"""
+
+
+def _parse_area(text: str) -> dict:
+    text = text.strip()
+    if text.startswith("around:"):
+        radius, lat, lon = (float(v) for v in text[len("around:"):].split(","))
+        return {"around": (radius, lat, lon)}
+    parts = text.split(",")
+    if len(parts) == 4:
+        return {"bbox": tuple(float(v) for v in parts)}
+    raise OverpassQueryError(f"Unsupported area filter '({text})'")
+
+
+def parse_query(query: str) -> dict:
+    """Parse the supported Overpass QL subset into statements and an output mode"""
+    body = _SETTINGS_RE.sub("", query, count=1)
+
+    out = _OUT_RE.search(body)
+    if out is None:
+        raise OverpassQueryError("Query has no 'out' statement")
+    # Anything after the first out (e.g. '>; out skel qt;' recursion) is not needed:
+    # ways are answered with their centers
+    body = body[:out.start()]
+
+    statements = []
+    for element_type, filters, area in _STATEMENT_RE.findall(body):
+        element_types = {"node": ("node",), "way": ("way",), "nwr": ("node", "way")}.get(element_type, ())
+        statements.append({
+            "element_types": element_types,
+            "filters": parse_tag_filter(filters),
+            **_parse_area(area),
+        })
+    if not statements:
+        raise OverpassQueryError("Query has no supported node/way statements")
+
+    return {"statements": statements, "count": "count" in out.group(1).split()}
+
+
+class LocalOSMEngine:
+    """Read-only spatial index over ingested OSM features"""
+
+    def __init__(self, db_path: str = OSM_LOCAL_DB):
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Local OSM database {db_path} not found; run 'osm_local.py ingest' first")
+        self.db_path = db_path
+        self.local = threading.local()
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            self.local.db = db
+        return db
+
+    def _candidates(self, statement: dict, bbox) -> list:
+        south, west, north, east = bbox
+        sql = """
+            SELECT f.osm_type, f.osm_id, f.lat, f.lon, f.tags
+            FROM features_rtree r JOIN features f ON f.id = r.id
+            WHERE r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ?
+        """
+        params = [north, south, east, west]
+
+        types = statement["element_types"]
+        sql += f" AND f.osm_type IN ({','.join('?' * len(types))})"
+        params.extend(types)
+
+        # Narrow by the first tag key before decoding any tags
+        if statement["filters"]:
+            sql += " AND EXISTS (SELECT 1 FROM feature_keys k WHERE k.key = ? AND k.feature_id = f.id)"
+            params.append(statement["filters"][0][0])
+
+        return self._db().execute(sql, params).fetchall()
+
+    def select(self, statement: dict) -> List[dict]:
+        """Elements matched by one parsed statement, in Overpass JSON form"""
+        if not statement["element_types"]:
+            return []
+
+        if "around" in statement:
+            radius, lat, lon = statement["around"]
+            dlat = radius / METERS_PER_DEGREE
+            dlon = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+            bbox = (lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+        else:
+            bbox = statement["bbox"]
+
+        rows = self._candidates(statement, bbox)
+        if "around" in statement and rows:
+            coords = np.array([(row[2], row[3]) for row in rows], dtype=float)
+            inside = haversine_m(lat, lon, coords[:, 0], coords[:, 1]) <= radius
+            rows = [row for row, keep in zip(rows, inside) if keep]
+
+        elements = []
+        for osm_type, osm_id, el_lat, el_lon, tags in rows:
+            tags = json.loads(tags)
+            if not tags_match(tags, statement["filters"]):
+                continue
+            if osm_type == "node":
+                elements.append({"type": "node", "id": osm_id, "lat": el_lat, "lon": el_lon, "tags": tags})
+            else:
+                elements.append({"type": osm_type, "id": osm_id, "center": {"lat": el_lat, "lon": el_lon}, "tags": tags})
+        return elements
+
+    def query(self, query: str) -> dict:
+        """Answer an Overpass QL query with the same JSON Overpass would return"""
+        parsed = parse_query(query)
+
+        union = {}
+        for statement in parsed["statements"]:
+            for element in self.select(statement):
+                union[(element["type"], element["id"])] = element
+        elements = [union[key] for key in sorted(union)]
+
+        if parsed["count"]:
+            nodes = sum(1 for element in elements if element["type"] == "node")
+            ways = len(elements) - nodes
+            elements = [{"type": "count", "id": 0, "tags": {
+                "nodes": str(nodes), "ways": str(ways), "relations": "0", "areas": "0", "total": str(len(elements))
+            }}]
+
+        return {"version": 0.6, "generator": "radiu-local-osm", "elements": elements}
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_local_engine() -> LocalOSMEngine:
+    """Process-wide local engine over OSM_LOCAL_DB"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = LocalOSMEngine(OSM_LOCAL_DB)
+        return _engine
+
+
+# --- Ingestion ---
+
+def _indexed_tags(tags) -> Optional[Dict[str, str]]:
+    tags = {tag.k: tag.v for tag in tags} if not isinstance(tags, dict) else tags
+    return tags if any(key in tags for key in INDEXED_KEYS) else None
+
+
+class _Writer:
+    """Batches features into the SQLite tables"""
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+        self.rows = []
+        self.count = 0
+
+    def add(self, osm_type: str, osm_id: int, lat: float, lon: float, tags: Dict[str, str]):
+        self.rows.append((osm_type, osm_id, lat, lon, tags))
+        if len(self.rows) >= INSERT_BATCH:
+            self.flush()
+
+    def flush(self):
+        for osm_type, osm_id, lat, lon, tags in self.rows:
+            cursor = self.db.execute(
+                "INSERT INTO features (osm_type, osm_id, lat, lon, tags) VALUES (?, ?, ?, ?, ?)",
+                (osm_type, osm_id, lat, lon, json.dumps(tags, ensure_ascii=False, separators=(",", ":")))
+            )
+            feature_id = cursor.lastrowid
+            self.db.execute("INSERT INTO features_rtree VALUES (?, ?, ?, ?, ?)", (feature_id, lat, lat, lon, lon))
+            self.db.executemany(
+                "INSERT OR IGNORE INTO feature_keys VALUES (?, ?)",
+                [(key, feature_id) for key in tags if key in INDEXED_KEYS]
+            )
+        self.db.commit()
+        self.count += len(self.rows)
+        self.rows = []
+
+
+def _create_schema(db: sqlite3.Connection):
+    db.executescript("""
+        CREATE TABLE features (
+            id INTEGER PRIMARY KEY, osm_type TEXT, osm_id INTEGER,
+            lat REAL, lon REAL, tags TEXT
+        );
+        CREATE VIRTUAL TABLE features_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+        CREATE TABLE feature_keys (
+            key TEXT, feature_id INTEGER,
+            PRIMARY KEY (key, feature_id)
+        ) WITHOUT ROWID;
+    """)
+
+
+def ingest_pbf(path: str, writer: _Writer):
+    if osmium is None:
+        raise RuntimeError("Reading .pbf extracts needs pyosmium (pip install osmium)")
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, n):
+            tags = _indexed_tags(n.tags)
+            if tags and n.location.valid():
+                writer.add("node", n.id, n.location.lat, n.location.lon, tags)
+
+        def way(self, w):
+            tags = _indexed_tags(w.tags)
+            if not tags:
+                return
+            points = [(node.lat, node.lon) for node in w.nodes if node.location.valid()]
+            if points:
+                lats, lons = zip(*points)
+                writer.add("way", w.id, (min(lats) + max(lats)) / 2, (min(lons) + max(lons)) / 2, tags)
+
+    Handler().apply_file(path, locations=True, idx="flex_mem")
+
+
+def ingest_overpass_json(path: str, writer: _Writer):
+    """Ingest an Overpass JSON dump fetched with 'out center tags'"""
+    with open(path, encoding="utf-8") as f:
+        elements = json.load(f).get("elements", [])
+    for element in elements:
+        tags = _indexed_tags(element.get("tags", {}))
+        if not tags or element.get("type") not in ("node", "way"):
+            continue
+        point = element if "lat" in element else element.get("center")
+        if point:
+            writer.add(element["type"], element["id"], point["lat"], point["lon"], tags)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline OpenStreetMap query engine")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser("ingest", help="Build the spatial index from .pbf or Overpass .json files")
+    ingest.add_argument("inputs", nargs="+")
+    ingest.add_argument("--output", default=OSM_LOCAL_DB)
+
+    query = subparsers.add_parser("query", help="Run an Overpass QL query against the index")
+    query.add_argument("query")
+    query.add_argument("--db", default=OSM_LOCAL_DB)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "ingest":
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        if os.path.exists(args.output):
+            os.unlink(args.output)
+        db = sqlite3.connect(args.output)
+        _create_schema(db)
+        writer = _Writer(db)
+        for path in args.inputs:
+            if path.endswith(".json"):
+                ingest_overpass_json(path, writer)
+            else:
+                ingest_pbf(path, writer)
+        writer.flush()
+        db.close()
+        print(f"Indexed {writer.count} features into {args.output}")
+    else:
+        print(json.dumps(LocalOSMEngine(args.db).query(args.query)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Consolidated OpenStreetMap snapshot for a single analysis.
+
+Instead of every stage sending its own Overpass query for overlapping data around
+the same point, fetch_osm_snapshot() pulls the shop / amenity / office / leisure,
+highway and residential building features (with centers and tags) in one request.
+Stages then compute their counts, densities and competitor lists from the
+in-memory OSMSnapshot.
+
+All Overpass traffic goes through run_overpass_query() / stream_overpass_query(),
+which answer from the offline engine in osm_local.py instead when
+OSM_BACKEND=local. Element lists are streamed: stream_overpass_query() decodes
+the response one element at a time, so memory stays flat however large the
+radius is. A response carrying an Overpass runtime-error remark (timeout, out
+of memory) holds a truncated element list and raises OverpassRemarkError.
+"""
+import codecs
+import json
+import logging
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import tracing
+from http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+OSM_BACKEND = os.environ.get("OSM_BACKEND", "overpass")  # "overpass" or "local"
+SNAPSHOT_TIMEOUT = 120  # seconds; one bigger query instead of eight small ones
+
+EARTH_RADIUS_KM = 6371.0088  # same mean radius as the haversine package
+
+RESIDENTIAL_BUILDINGS = "residential|apartments|house|detached"
+
+# layer name -> (OSM element types, Overpass tag filters)
+SNAPSHOT_LAYERS = {
+    "poi": (("node", "way"), ('["shop"]', '["amenity"]', '["office"]', '["leisure"]')),
+    "roads": (("way",), ('["highway"]',)),
+    "buildings": (("node", "way"), (f'["building"~"{RESIDENTIAL_BUILDINGS}"]',)),
+}
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_TAG_FILTER_RE = re.compile(r'\["([^"]+)"(?:\s*(=|~)\s*"([^"]*)")?\]')
+_ELEMENTS_START_RE = re.compile(r'"elements"\s*:\s*\[')
+_REMARK_RE = re.compile(r'"remark"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+class OverpassRemarkError(RuntimeError):
+    """Overpass reported a runtime error (e.g. timeout or out of memory); its elements are incomplete"""
+
+
+def parse_tag_filter(text: str) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Parse Overpass tag filters such as '["shop"]', '["amenity"="cafe"]' or
+    '["amenity"~"restaurant|cafe"]' into (key, operator, value) tuples
+    """
+    return [(key, op or None, value if op else None) for key, op, value in _TAG_FILTER_RE.findall(text)]
+
+
+def tags_match(tags: dict, filters) -> bool:
+    """Check element tags against parsed filters with Overpass semantics"""
+    for key, op, value in filters:
+        if key not in tags:
+            return False
+        if op == "=" and tags[key] != value:
+            return False
+        if op == "~" and not re.search(value, tags[key]):
+            return False
+    return True
+
+
+def haversine_m(lat, lon, lats, lons):
+    """Great-circle distance in meters from (lat, lon) to arrays of coordinates"""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * 1000 * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def element_coordinates(element: dict) -> Tuple[Optional[float], Optional[float]]:
+    """Coordinates of a node, or the center of a way/relation"""
+    if "lat" in element and "lon" in element:
+        return element["lat"], element["lon"]
+    center = element.get("center")
+    if center:
+        return center.get("lat"), center.get("lon")
+    return None, None
+
+
+def build_snapshot_query(lat: float, lon: float, layer_radii: Dict[str, float]) -> str:
+    """Build the single Overpass query covering every requested layer"""
+    statements = []
+    for layer, radius_m in layer_radii.items():
+        element_types, filters = SNAPSHOT_LAYERS[layer]
+        for element_type in element_types:
+            for tag_filter in filters:
+                statements.append(f'{element_type}{tag_filter}(around:{radius_m:.0f},{lat},{lon});')
+
+    return f"""
+    [out:json][timeout:{SNAPSHOT_TIMEOUT - 10}];
+    (
+      {" ".join(statements)}
+    );
+    out center tags;
+    """
+
+
+class OSMSnapshot:
+    """In-memory OSM features around one point, with per-layer radius coverage"""
+
+    def __init__(self, lat: float, lon: float, layer_radii: Dict[str, float], elements: Iterable[dict],
+                 coords: Optional[np.ndarray] = None):
+        self.lat = lat
+        self.lon = lon
+        self.layer_radii = dict(layer_radii)
+
+        if coords is None:
+            self.elements = []
+            coords = []
+            for element in elements:
+                if element.get("type") not in ("node", "way"):
+                    continue
+                el_lat, el_lon = element_coordinates(element)
+                if el_lat is None or el_lon is None:
+                    continue
+                self.elements.append(element)
+                coords.append((el_lat, el_lon))
+        else:
+            self.elements = list(elements)
+
+        self.coords = np.array(coords, dtype=float).reshape(-1, 2)
+        self.distances = haversine_m(lat, lon, self.coords[:, 0], self.coords[:, 1])
+
+    def recenter(self, lat: float, lon: float, layer_radii: Dict[str, float]) -> "OSMSnapshot":
+        """
+        View of this snapshot around another point. Only layers whose requested
+        radius lies fully inside this snapshot's coverage are marked as covered.
+        """
+        offset = float(haversine_m(self.lat, self.lon, lat, lon))
+        covered = {
+            layer: radius_m for layer, radius_m in layer_radii.items()
+            if self.covers(layer, offset + radius_m)
+        }
+
+        distances = haversine_m(lat, lon, self.coords[:, 0], self.coords[:, 1])
+        keep = np.flatnonzero(distances <= max(covered.values(), default=0))
+        return OSMSnapshot(lat, lon, covered, [self.elements[i] for i in keep], self.coords[keep])
+
+    def covers(self, layer: str, radius_m: float) -> bool:
+        """Whether the snapshot holds every feature of a layer up to radius_m"""
+        return radius_m <= self.layer_radii.get(layer, -1) + 1e-6
+
+    def matches(self, tag_filters: Iterable[str], element_types=("node", "way")) -> np.ndarray:
+        """Boolean mask of elements matching at least one tag filter (an Overpass union)"""
+        parsed = [parse_tag_filter(f) for f in tag_filters]
+        return np.fromiter(
+            (
+                element["type"] in element_types
+                and any(tags_match(element.get("tags", {}), filters) for filters in parsed)
+                for element in self.elements
+            ),
+            dtype=bool, count=len(self.elements)
+        )
+
+    def match_matrix(self, tag_filters: List[str]) -> np.ndarray:
+        """
+        Boolean [elements, filters] matrix of which element matches which tag
+        filter (element types not considered), built in one pass over the
+        elements: single key=value filters are looked up per element tag, the
+        rest go through tags_match.
+        """
+        exact = {}
+        general = []
+        for column, filters in enumerate(parse_tag_filter(f) for f in tag_filters):
+            if len(filters) == 1 and filters[0][1] == "=":
+                exact.setdefault((filters[0][0], filters[0][2]), []).append(column)
+            else:
+                general.append((column, filters))
+
+        matrix = np.zeros((len(self.elements), len(tag_filters)), dtype=bool)
+        for row, element in enumerate(self.elements):
+            tags = element.get("tags", {})
+            for tag in tags.items():
+                columns = exact.get(tag)
+                if columns:
+                    matrix[row, columns] = True
+            for column, filters in general:
+                if tags_match(tags, filters):
+                    matrix[row, column] = True
+        return matrix
+
+    def type_mask(self, element_types=("node", "way")) -> np.ndarray:
+        """Boolean mask of elements of the given OSM types"""
+        return np.fromiter((element["type"] in element_types for element in self.elements),
+                           dtype=bool, count=len(self.elements))
+
+    def select(self, tag_filter: str, radius_m: float, element_types=("node", "way")) -> List[dict]:
+        """Elements matching an Overpass tag filter within radius_m of the center"""
+        mask = self.matches([tag_filter], element_types) & (self.distances <= radius_m)
+        return [self.elements[i] for i in np.flatnonzero(mask)]
+
+    def count(self, tag_filter: str, radius_m: float, element_types=("node", "way")) -> int:
+        return self.count_any([tag_filter], radius_m, element_types)
+
+    def count_any(self, tag_filters: Iterable[str], radius_m: float, element_types=("node", "way")) -> int:
+        """Count elements matching at least one of several tag filters within radius_m"""
+        return int(np.count_nonzero(self.matches(tag_filters, element_types) & (self.distances <= radius_m)))
+
+
+def run_overpass_query(query: str, timeout: Optional[float] = None) -> dict:
+    """Run an Overpass QL query on the configured backend and return its JSON"""
+    if OSM_BACKEND == "local":
+        from osm_local import get_local_engine
+        return get_local_engine().query(query)
+
+    response = get_http_client().post(OVERPASS_URL, data=query, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    if data.get("remark"):
+        raise OverpassRemarkError(data["remark"])
+    return data
+
+
+def iter_overpass_elements(chunks: Iterable[bytes]) -> Iterator[dict]:
+    """
+    Incrementally decode the "elements" array of an Overpass JSON response.
+    Only the element being decoded is buffered, never the whole document.
+    Raises OverpassRemarkError after the elements if the response has a remark.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    in_elements = False
+    finished = False
+
+    for chunk in chunks:
+        buffer += text.decode(chunk)
+
+        if finished:
+            continue
+
+        if not in_elements:
+            match = _ELEMENTS_START_RE.search(buffer)
+            if match is None:
+                continue
+            buffer = buffer[match.end():]
+            in_elements = True
+
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == "]":
+                finished = True
+                pos += 1
+                break
+            try:
+                element, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # element continues in the next chunk
+            yield element
+        buffer = buffer[pos:]
+
+    if in_elements and not finished:
+        raise ValueError("Overpass response ended inside the elements array")
+
+    # Overpass reports runtime errors (timeouts, memory) in a trailing remark;
+    # the elements before it are then only part of the result
+    remark = _REMARK_RE.search(buffer)
+    if remark:
+        raise OverpassRemarkError(json.loads(remark.group(1)))
+
+
+def overpass_count(data: dict, field: str = "total") -> int:
+    """
+    Count reported by an `out count;` query: "total", "nodes", "ways" or
+    "relations". Overpass answers with a single element of type "count" whose
+    tags hold the numbers as strings.
+    """
+    for element in data.get("elements", []):
+        if element.get("type") == "count":
+            return int(element.get("tags", {}).get(field, 0))
+    return 0
+
+
+def stream_overpass_query(query: str, timeout: Optional[float] = None) -> Iterator[dict]:
+    """
+    Run an Overpass QL query and return an iterator over its elements. The
+    request is sent (and HTTP errors raised) before this returns.
+    """
+    if OSM_BACKEND == "local":
+        from osm_local import get_local_engine
+        return iter(get_local_engine().query(query)["elements"])
+
+    response = get_http_client().stream("POST", OVERPASS_URL, data=query, timeout=timeout)
+    try:
+        response.raise_for_status()
+    except Exception:
+        response.close()
+        raise
+
+    def elements():
+        try:
+            yield from iter_overpass_elements(response.iter_content(chunk_size=STREAM_CHUNK_SIZE))
+        finally:
+            response.close()
+
+    return elements()
+
+
+def fetch_osm_snapshot(lat: float, lon: float, layer_radii: Dict[str, float]) -> Optional[OSMSnapshot]:
+    """Fetch one consolidated snapshot; returns None if Overpass fails or reports a runtime error"""
+    query = build_snapshot_query(lat, lon, layer_radii)
+    try:
+        snapshot = OSMSnapshot(lat, lon, layer_radii, stream_overpass_query(query, timeout=SNAPSHOT_TIMEOUT))
+        tracing.annotate(osm_elements=len(snapshot.elements))
+        return snapshot
+    except Exception as e:
+        logger.warning(f"Overpass snapshot failed: {e}")
+        tracing.current_span().record_error(e)  # stages fall back to their own queries
+        return None
@@ -0,0 +1,330 @@
+"""
+Offline country / admin-region lookup.
+
+Resolves the country (and, where boundaries are loaded, the Indian state) of a
+coordinate with a local point-in-polygon index, so that questions which only
+need a country code never hit Nominatim.
+
+Polygons are simplified once at build time and registered in a regular grid.
+Grid cells that no polygon edge passes through lie entirely inside or outside
+each polygon, so their answer is computed once from the cell center and then
+memoized; only points in boundary cells run a full (vectorized) ray-casting test.
+
+Build the index from Natural Earth GeoJSON:
+    python region_index.py build \\
+        --countries ne_50m_admin_0_countries.geojson \\
+        --states ne_10m_admin_1_states_provinces.geojson --state-country IN \\
+        --output data/regions.json
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+REGION_INDEX_PATH = os.environ.get(
+    "RADIU_REGION_INDEX",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "regions.json")
+)
+CELL_SIZE = 0.5  # degrees
+SIMPLIFY_TOLERANCE = 0.01  # degrees (~1 km)
+METERS_PER_DEGREE = 111_320
+# How far a simplified border may lie from the true one
+BORDER_UNCERTAINTY_M = SIMPLIFY_TOLERANCE * METERS_PER_DEGREE
+
+
+def _points_in_ring(lats, lons, ring) -> np.ndarray:
+    """Even-odd ray casting of many points against one ring of (lon, lat) vertices"""
+    xs, ys = ring[:, 0], ring[:, 1]
+    x2, y2 = np.roll(xs, -1), np.roll(ys, -1)
+    lats = np.asarray(lats, dtype=float)[:, None]
+    lons = np.asarray(lons, dtype=float)[:, None]
+
+    crosses = (ys > lats) != (y2 > lats)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_at = xs + (lats - ys) * (x2 - xs) / (y2 - ys)
+    return np.count_nonzero(crosses & (lons < x_at), axis=1) % 2 == 1
+
+
+class PreparedPolygon:
+    """Polygon (outer ring + holes) with bbox and the set of grid cells its edges touch"""
+
+    def __init__(self, rings: List[List[List[float]]], cell_size: float):
+        self.rings = [np.asarray(ring, dtype=float) for ring in rings if len(ring) >= 3]
+        outer = self.rings[0]
+        self.min_lon, self.min_lat = outer.min(axis=0)
+        self.max_lon, self.max_lat = outer.max(axis=0)
+        self.cell_size = cell_size
+        self.boundary_cells = self._edge_cells()
+
+    def _edge_cells(self) -> set:
+        """Every cell an edge passes through, corner clips included (supercover of each segment)"""
+        cells = set()
+        size = self.cell_size
+        for ring in self.rings:
+            for (x1, y1), (x2, y2) in zip(ring.tolist(), np.roll(ring, -1, axis=0).tolist()):
+                # Walk the rows the segment spans; within a row the segment covers one x interval
+                for row in range(int(math.floor(min(y1, y2) / size)), int(math.floor(max(y1, y2) / size)) + 1):
+                    if y1 == y2:
+                        xa, xb = x1, x2
+                    else:
+                        ta, tb = (row * size - y1) / (y2 - y1), ((row + 1) * size - y1) / (y2 - y1)
+                        t_lo, t_hi = max(0.0, min(ta, tb)), min(1.0, max(ta, tb))
+                        xa, xb = x1 + t_lo * (x2 - x1), x1 + t_hi * (x2 - x1)
+                    # A little slack so an edge through a grid corner marks the cells on both sides
+                    slack = size * 1e-9
+                    for col in range(int(math.floor((min(xa, xb) - slack) / size)),
+                                     int(math.floor((max(xa, xb) + slack) / size)) + 1):
+                        cells.add((row, col))
+        return cells
+
+    def cells(self):
+        """Grid cells overlapped by the bbox"""
+        for i in range(int(math.floor(self.min_lat / self.cell_size)), int(math.floor(self.max_lat / self.cell_size)) + 1):
+            for j in range(int(math.floor(self.min_lon / self.cell_size)), int(math.floor(self.max_lon / self.cell_size)) + 1):
+                yield i, j
+
+    def contains(self, lat: float, lon: float) -> bool:
+        if not (self.min_lat <= lat <= self.max_lat and self.min_lon <= lon <= self.max_lon):
+            return False
+        if not _points_in_ring([lat], [lon], self.rings[0])[0]:
+            return False
+        return not any(_points_in_ring([lat], [lon], hole)[0] for hole in self.rings[1:])
+
+    def distance_m(self, lat: float, lon: float) -> float:
+        """Distance in meters from a point to the nearest edge of any ring (local flat-earth projection)"""
+        x_scale = math.cos(math.radians(lat)) * METERS_PER_DEGREE
+        nearest = math.inf
+        for ring in self.rings:
+            xs = (ring[:, 0] - lon) * x_scale
+            ys = (ring[:, 1] - lat) * METERS_PER_DEGREE
+            dx, dy = np.roll(xs, -1) - xs, np.roll(ys, -1) - ys
+            lengths_sq = dx * dx + dy * dy
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = np.clip(np.where(lengths_sq > 0, -(xs * dx + ys * dy) / lengths_sq, 0.0), 0.0, 1.0)
+            nearest = min(nearest, float(np.hypot(xs + t * dx, ys + t * dy).min()))
+        return nearest
+
+
+class RegionIndex:
+    """Grid-indexed point-in-polygon lookup over country and state boundaries"""
+
+    def __init__(self, regions: List[dict], cell_size: float = CELL_SIZE):
+        self.cell_size = cell_size
+        self.regions = []
+        self.polygons = []  # (region idx, PreparedPolygon)
+        self.grid: Dict[tuple, List[int]] = {}
+        self.cell_answers = {}  # (cell, polygon idx) -> inside?
+        self.lock = threading.Lock()
+
+        for region in regions:
+            region_idx = len(self.regions)
+            self.regions.append({key: value for key, value in region.items() if key != "polygons"})
+            for rings in region["polygons"]:
+                polygon = PreparedPolygon(rings, cell_size)
+                polygon_idx = len(self.polygons)
+                self.polygons.append((region_idx, polygon))
+                for cell in polygon.cells():
+                    self.grid.setdefault(cell, []).append(polygon_idx)
+
+    @classmethod
+    def load(cls, path: str = REGION_INDEX_PATH) -> "RegionIndex":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["regions"], data.get("cell_size", CELL_SIZE))
+
+    def _inside(self, cell, polygon_idx: int, lat: float, lon: float) -> bool:
+        _, polygon = self.polygons[polygon_idx]
+        if cell in polygon.boundary_cells:
+            return polygon.contains(lat, lon)
+
+        # No edge crosses this cell: the whole cell shares the answer of its center
+        key = (cell, polygon_idx)
+        answer = self.cell_answers.get(key)
+        if answer is None:
+            center_lat = (cell[0] + 0.5) * self.cell_size
+            center_lon = (cell[1] + 0.5) * self.cell_size
+            answer = polygon.contains(center_lat, center_lon)
+            with self.lock:
+                self.cell_answers[key] = answer
+        return answer
+
+    def lookup(self, lat: float, lon: float, level: str = "country") -> Optional[dict]:
+        """Region ('country' or 'state') containing the point, or None"""
+        cell = (int(math.floor(lat / self.cell_size)), int(math.floor(lon / self.cell_size)))
+        for polygon_idx in self.grid.get(cell, ()):
+            region_idx, _ = self.polygons[polygon_idx]
+            region = self.regions[region_idx]
+            if region["level"] == level and self._inside(cell, polygon_idx, lat, lon):
+                return region
+        return None
+
+    def border_distance_m(self, lat: float, lon: float, level: str = "country") -> Optional[float]:
+        """
+        Distance in meters from a point to the border of the region containing
+        it, or None outside every region. Borders are simplified, so treat
+        anything within BORDER_UNCERTAINTY_M as possibly across the border.
+        """
+        cell = (int(math.floor(lat / self.cell_size)), int(math.floor(lon / self.cell_size)))
+        for polygon_idx in self.grid.get(cell, ()):
+            region_idx, polygon = self.polygons[polygon_idx]
+            if self.regions[region_idx]["level"] == level and self._inside(cell, polygon_idx, lat, lon):
+                return polygon.distance_m(lat, lon)
+        return None
+
+    def address(self, lat: float, lon: float) -> Optional[dict]:
+        """Nominatim-style address components (country, country_code, state) or None"""
+        country = self.lookup(lat, lon, "country")
+        if country is None:
+            return None
+
+        address = {"country": country["name"], "country_code": country["code"].lower()}
+        state = self.lookup(lat, lon, "state")
+        if state is not None:
+            address["state"] = state["name"]
+        return address
+
+
+_index = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+def get_region_index() -> Optional[RegionIndex]:
+    """Process-wide region index, or None if no index file has been built"""
+    global _index, _index_loaded
+    with _index_lock:
+        if not _index_loaded:
+            _index_loaded = True
+            if os.path.exists(REGION_INDEX_PATH):
+                try:
+                    _index = RegionIndex.load(REGION_INDEX_PATH)
+                except Exception as e:
+                    logger.warning(f"Could not load region index {REGION_INDEX_PATH}: {e}")
+        return _index
+
+
+# --- Index builder ---
+
+def simplify_ring(ring: List[List[float]], tolerance: float) -> List[List[float]]:
+    """Douglas-Peucker simplification of a closed ring"""
+    points = np.asarray(ring, dtype=float)
+    if len(points) <= 4:
+        return points.tolist()
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        rel = points[start + 1:end] - points[start]
+        norm = np.hypot(*segment)
+        if norm == 0:
+            distances = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            distances = np.abs(segment[0] * rel[:, 1] - segment[1] * rel[:, 0]) / norm
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.extend([(start, split), (split, end)])
+
+    simplified = points[keep]
+    return simplified.tolist() if len(simplified) >= 4 else points.tolist()
+
+
+def _feature_polygons(geometry: dict, tolerance: float) -> List[List[List[List[float]]]]:
+    if geometry["type"] == "Polygon":
+        polygons = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        polygons = geometry["coordinates"]
+    else:
+        return []
+    return [[simplify_ring(ring, tolerance) for ring in polygon] for polygon in polygons]
+
+
+def _first(properties: dict, *keys) -> str:
+    for key in keys:
+        value = properties.get(key)
+        if value and value not in ("-99", -99):
+            return str(value)
+    return ""
+
+
+def build_regions(countries_path: str, states_path: Optional[str] = None,
+                  state_countries=("IN",), tolerance: float = SIMPLIFY_TOLERANCE) -> List[dict]:
+    """Read Natural Earth admin-0 (and admin-1) GeoJSON into simplified region records"""
+    regions = []
+    with open(countries_path, encoding="utf-8") as f:
+        for feature in json.load(f)["features"]:
+            props = feature["properties"]
+            code = _first(props, "ISO_A2_EH", "ISO_A2", "iso_a2")
+            if not code:
+                continue
+            regions.append({
+                "level": "country",
+                "code": code.upper(),
+                "name": _first(props, "NAME_EN", "NAME", "ADMIN", "name"),
+                "polygons": _feature_polygons(feature["geometry"], tolerance),
+            })
+
+    if states_path:
+        with open(states_path, encoding="utf-8") as f:
+            for feature in json.load(f)["features"]:
+                props = feature["properties"]
+                country_code = _first(props, "iso_a2", "ISO_A2").upper()
+                if state_countries and country_code not in state_countries:
+                    continue
+                regions.append({
+                    "level": "state",
+                    "code": _first(props, "iso_3166_2", "code_hasc", "adm1_code"),
+                    "name": _first(props, "name_en", "name"),
+                    "country_code": country_code,
+                    "polygons": _feature_polygons(feature["geometry"], tolerance),
+                })
+
+    return regions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the offline country / state lookup index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Build the index from Natural Earth GeoJSON")
+    build.add_argument("--countries", required=True, help="Admin-0 countries GeoJSON")
+    build.add_argument("--states", help="Admin-1 states/provinces GeoJSON")
+    build.add_argument("--state-country", action="append", default=None,
+                       help="Keep admin-1 regions of this ISO country code (default: IN)")
+    build.add_argument("--tolerance", type=float, default=SIMPLIFY_TOLERANCE)
+    build.add_argument("--cell-size", type=float, default=CELL_SIZE)
+    build.add_argument("--output", default=REGION_INDEX_PATH)
+
+    lookup = subparsers.add_parser("lookup", help="Resolve a coordinate with an existing index")
+    lookup.add_argument("lat", type=float)
+    lookup.add_argument("lon", type=float)
+    lookup.add_argument("--index", default=REGION_INDEX_PATH)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        regions = build_regions(args.countries, args.states, tuple(args.state_country or ["IN"]), args.tolerance)
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"cell_size": args.cell_size, "regions": regions}, f, separators=(",", ":"))
+        print(f"Wrote {len(regions)} regions to {args.output}")
+    else:
+        index = RegionIndex.load(args.index)
+        print(json.dumps(index.address(args.lat, args.lon)))
+
+
+if __name__ == "__main__":
+    main()
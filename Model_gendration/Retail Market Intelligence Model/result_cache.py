@@ -0,0 +1,199 @@
+"""
+Final-result cache in front of run_analysis.
+
+Popular locations are analysed again and again, so finished results are kept in
+a size-bounded SQLite LRU keyed on normalized inputs: coordinates quantized to
+RESULT_CACHE_GRID degrees, the canonical business type and the radius.
+
+Entries younger than RESULT_CACHE_TTL are served as they are. Older entries, up
+to RESULT_CACHE_MAX_STALE, are still served at once while a background thread
+recomputes them (stale-while-revalidate); anything older is recomputed before
+answering. Concurrent requests for the same key share one computation.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Optional
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_PATH = os.path.join(
+    os.environ.get("RADIU_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")),
+    "results.sqlite"
+)
+RESULT_CACHE_ENABLED = os.environ.get("RADIU_RESULT_CACHE", "1") != "0"
+RESULT_CACHE_GRID = float(os.environ.get("RADIU_RESULT_CACHE_GRID", 0.001))  # degrees (~110 m)
+RESULT_CACHE_TTL = float(os.environ.get("RADIU_RESULT_CACHE_TTL", 24 * 3600))  # seconds a result is fresh
+RESULT_CACHE_MAX_STALE = float(os.environ.get("RADIU_RESULT_CACHE_MAX_STALE", 7 * 24 * 3600))  # ... and servable
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RADIU_RESULT_CACHE_MAX_ENTRIES", 5000))
+REFRESH_WORKERS = 2
+
+
+def canonical_business_type(business_type: str) -> str:
+    return " ".join(str(business_type).lower().split())
+
+
+class ResultCache:
+    """Disk-backed LRU of analysis results with stale-while-revalidate"""
+
+    def __init__(self, path: str = RESULT_CACHE_PATH, ttl: float = RESULT_CACHE_TTL,
+                 max_stale: float = RESULT_CACHE_MAX_STALE, max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+                 grid: float = RESULT_CACHE_GRID):
+        self.path = path
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self.grid = grid
+        self.lock = threading.Lock()
+        self.inflight = {}  # key -> Future of the computation in progress
+        self.refreshing = {}  # key -> Future of a queued or running background refresh
+        self.refresher = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="result-refresh")
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY, inputs TEXT, result TEXT,
+                created REAL, last_used REAL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self.db.commit()
+
+    def normalize(self, lat: float, lon: float, business_type: str, radius_km: float):
+        """(cache key, canonical inputs) for one analysis request"""
+        inputs = (float(lat), float(lon), canonical_business_type(business_type), round(float(radius_km), 2))
+        key = "{}:{}:{}:{}".format(
+            int(round(inputs[0] / self.grid)), int(round(inputs[1] / self.grid)), inputs[2], inputs[3]
+        )
+        return key, inputs
+
+    def _count(self, counter: str):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def _load(self, key: str):
+        with self.lock:
+            row = self.db.execute("SELECT inputs, result, created FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.db.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+                self.db.commit()
+        if row is None:
+            return None
+        return tuple(json.loads(row[0])), json.loads(row[1]), row[2]
+
+    def _store(self, key: str, inputs, result: dict):
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(inputs), json.dumps(result), now, now)
+            )
+            # Least recently used entries beyond the size bound
+            self.db.execute(
+                "DELETE FROM results WHERE key IN "
+                "(SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self.db.commit()
+
+    def _compute(self, key: str, inputs, compute: Callable[..., dict]) -> dict:
+        """Run compute(*inputs) once per key at a time and store a successful result"""
+        with self.lock:
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self.inflight[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            result = compute(*inputs)
+            if isinstance(result, dict) and "error" not in result:
+                self._store(key, inputs, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+
+    def _refresh(self, key: str, inputs, compute: Callable[..., dict]):
+        try:
+            self._compute(key, inputs, compute)
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"Background refresh of {key} failed: {e}")
+        finally:
+            with self.lock:
+                self.refreshing.pop(key, None)
+
+    def get_or_compute(self, lat: float, lon: float, business_type: str, radius_km: float,
+                       compute: Callable[..., dict]) -> dict:
+        """
+        Cached result for the request, computing it with
+        compute(lat, lon, business_type, radius_km) when needed.
+        """
+        key, inputs = self.normalize(lat, lon, business_type, radius_km)
+        cached = self._load(key)
+
+        if cached is not None:
+            cached_inputs, result, created = cached
+            age = time.time() - created
+            if age <= self.ttl:
+                self._count("hits")
+                tracing.annotate(result_cache="hit", result_age_s=round(age))
+                return result
+            if age <= self.ttl + self.max_stale:
+                with self.lock:
+                    self.counters["stale_hits"] += 1
+                    if key not in self.refreshing and key not in self.inflight:
+                        self.counters["refreshes"] += 1
+                        # Refresh the entry for the inputs it was computed for
+                        self.refreshing[key] = self.refresher.submit(self._refresh, key, cached_inputs, compute)
+                tracing.annotate(result_cache="stale", result_age_s=round(age))
+                return result
+
+        self._count("misses")
+        tracing.annotate(result_cache="miss")
+        return self._compute(key, inputs, compute)
+
+    def wait_for_refreshes(self, timeout: Optional[float] = None):
+        """Block until background refreshes started so far have finished"""
+        with self.lock:
+            pending = list(self.refreshing.values())
+        wait(pending, timeout=timeout)
+
+    def stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.counters)
+            stats["entries"] = self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        served = stats["hits"] + stats["stale_hits"]
+        lookups = served + stats["misses"]
+        stats["hit_rate"] = round(served / lookups, 3) if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Process-wide ResultCache, or None when disabled with RADIU_RESULT_CACHE=0"""
+    global _cache
+    if not RESULT_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
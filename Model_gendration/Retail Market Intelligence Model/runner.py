@@ -1,31 +1,25 @@
 import json
-import requests
+import os
 import math
-from geopy.geocoders import Nominatim
 import time
 from datetime import datetime
-import geocoder
-import numpy as np
-from collections import defaultdict
 import sys
-import urllib.parse
 from dataclasses import dataclass
-import urllib.parse
-from typing import List, Dict, Optional, Tuple, Any
-from dataclasses import dataclass
-import pandas as pd
-import time
-import json
-from functools import lru_cache
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple, Any
 import logging
-import math
-import random
-from typing import List, Tuple
-import time
 from math import radians, sin, cos, sqrt, atan2
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FuturesTimeoutError
+from result_cache import canonical_business_type
+import tracing
+
+if TYPE_CHECKING:
+    import numpy as np
 
-# Configuration
-OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+# numpy, requests and the OSM/geocoding/store/index modules are imported by the
+# functions that use them, so that `import runner` stays cheap for callers that
+# only hit the result cache or never reach a given stage.
 
 class TrafficScoreCalculator:
     def __init__(self):
@@ -68,42 +62,25 @@ class TrafficScoreCalculator:
         return R * c
     
     def get_country_code(self, lat, lon):
-        """Get country code from coordinates using Nominatim with proper headers"""
-        url = "https://nominatim.openstreetmap.org/reverse"
-        headers = {
-            'User-Agent': 'TrafficScoreCalculator/1.0 (https://example.com; contact@example.com)'
-        }
-        params = {
-            'format': 'json',
-            'lat': lat,
-            'lon': lon,
-            'zoom': 3,
-            'addressdetails': 1
-        }
-        
+        """Get country code from coordinates using the shared reverse geocoder"""
+        from geocoding import get_reverse_geocoder
         try:
-            response = requests.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            
-            if 'address' in data and 'country_code' in data['address']:
-                return data['address']['country_code'].upper()
-            else:
-                return None
+            return get_reverse_geocoder().country_code(lat, lon)
                 
         except Exception as e:
             print(f"Error getting country code: {e}")
             return None
     
-    def get_population_density(self, lat, lon, radius_km=1):
+    def get_population_density(self, lat, lon, radius_km=1, country_code=None, snapshot=None):
         """
         Estimate population density based on country data and urban/rural classification
         """
-        # Get country code first
-        country_code = self.get_country_code(lat, lon)
+        # Get country code first (unless the caller already resolved it)
+        if country_code is None:
+            country_code = self.get_country_code(lat, lon)
         
         # Get POI count to determine urban/rural classification
-        poi_count = self.query_overpass_count(lat, lon, 2000)  # Check POIs in 2km radius
+        poi_count = self.query_overpass_count(lat, lon, 2000, snapshot=snapshot)  # Check POIs in 2km radius
         
         # Get base density for country or use default
         base_density = self.country_densities.get(country_code, 100) if country_code else 100
@@ -121,96 +98,76 @@ class TrafficScoreCalculator:
             
         return density
     
-    def query_overpass_count(self, lat, lon, radius):
+    def query_overpass_count(self, lat, lon, radius, snapshot=None):
         """Query Overpass API for count of POIs around the location"""
-        # Define the bounding box
-        radius_deg = radius / 111000  # Approximate conversion from meters to degrees
-        min_lat = lat - radius_deg
-        max_lat = lat + radius_deg
-        min_lon = lon - radius_deg
-        max_lon = lon + radius_deg
-        
-        # Overpass QL query for counting POIs
+        import numpy as np
+        from osm_snapshot import overpass_count, run_overpass_query
+        if snapshot is not None and snapshot.covers("poi", radius):
+            return snapshot.count_any(['["shop"]', '["amenity"]', '["office"]'], radius, element_types=("node",))
+        
+        # Overpass QL query for counting POIs (same circle as the snapshot)
         query = f"""
         [out:json];
         (
-          node["shop"]({min_lat},{min_lon},{max_lat},{max_lon});
-          node["amenity"]({min_lat},{min_lon},{max_lat},{max_lon});
-          node["office"]({min_lat},{min_lon},{max_lat},{max_lon});
+          node["shop"](around:{radius},{lat},{lon});
+          node["amenity"](around:{radius},{lat},{lon});
+          node["office"](around:{radius},{lat},{lon});
         );
         out count;
         """
         
         try:
-            response = requests.post(OVERPASS_URL, data=query)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Count elements
-            total_count = 0
-            for element in data['elements']:
-                if 'tags' in element:
-                    total_count += 1
-            
-            return total_count
+            data = run_overpass_query(query)
+            return overpass_count(data)
             
         except Exception as e:
             print(f"Overpass API error: {e}")
             # Return a reasonable estimate based on urban/rural classification
             if "timeout" in str(e).lower():
                 return 100  # Reasonable default for urban areas
+            tracing.annotate(fallback_used=True, fallback="random_estimate")
             return np.random.randint(20, 100)
     
-    def query_overpass_roads(self, lat, lon, radius):
+    def query_overpass_roads(self, lat, lon, radius, snapshot=None):
         """Query Overpass API for roads around the location"""
-        # Define the bounding box
-        radius_deg = radius / 111000
-        min_lat = lat - radius_deg
-        max_lat = lat + radius_deg
-        min_lon = lon - radius_deg
-        max_lon = lon + radius_deg
-        
-        # Overpass QL query for roads
+        import numpy as np
+        from osm_snapshot import overpass_count, run_overpass_query
+        if snapshot is not None and snapshot.covers("roads", radius):
+            return snapshot.count('["highway"]', radius, element_types=("way",))
+        
+        # Overpass QL query for roads (same circle as the snapshot)
         query = f"""
         [out:json];
         (
-          way["highway"]({min_lat},{min_lon},{max_lat},{max_lon});
+          way["highway"](around:{radius},{lat},{lon});
         );
         out count;
         """
         
         try:
-            response = requests.post(OVERPASS_URL, data=query)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Count road elements
-            road_count = 0
-            for element in data['elements']:
-                if 'tags' in element and 'highway' in element['tags']:
-                    road_count += 1
-            
-            return road_count
+            data = run_overpass_query(query)
+            return overpass_count(data)
             
         except Exception as e:
             print(f"Overpass API error for roads: {e}")
             # Return a reasonable estimate
+            tracing.annotate(fallback_used=True, fallback="random_estimate")
             return np.random.randint(5, 20)
     
-    def get_poi_density(self, lat, lon, radius_km):
+    def get_poi_density(self, lat, lon, radius_km, snapshot=None):
         """Calculate POI density within the given radius"""
         radius_m = radius_km * 1000
-        poi_count = self.query_overpass_count(lat, lon, radius_m)
+        poi_count = self.query_overpass_count(lat, lon, radius_m, snapshot=snapshot)
         
         # Calculate area in km²
         area_km2 = 3.1416 * (radius_km ** 2)
         
         return poi_count / area_km2 if area_km2 > 0 else 0
     
-    def get_road_density(self, lat, lon, radius_km):
+    def get_road_density(self, lat, lon, radius_km, snapshot=None):
         """Calculate road density within the given radius"""
         radius_m = radius_km * 1000
-        road_count = self.query_overpass_roads(lat, lon, radius_m)
+        road_count = self.query_overpass_roads(lat, lon, radius_m, snapshot=snapshot)
         
         # Calculate area in km²
         area_km2 = 3.1416 * (radius_km ** 2)
@@ -219,7 +176,7 @@ class TrafficScoreCalculator:
     
     def get_poi_category_breakdown(self, lat, lon, radius_km):
         """Get breakdown of POIs by category"""
-        radius_m = radius_km * 1000
+        import numpy as np
         category_breakdown = {}
         
         for category in self.poi_categories:
@@ -229,19 +186,19 @@ class TrafficScoreCalculator:
             
         return category_breakdown
     
-    def calculate_traffic_score(self, lat, lon, radius_km=1):
+    def calculate_traffic_score(self, lat, lon, radius_km=1, country_code=None, snapshot=None):
         """
         Calculate traffic score based on POI density, population density, and road density
         Returns a score between 0-100
         """
         # Get POI density
-        poi_density = self.get_poi_density(lat, lon, radius_km)
+        poi_density = self.get_poi_density(lat, lon, radius_km, snapshot=snapshot)
         
         # Get population density
-        pop_density = self.get_population_density(lat, lon, radius_km)
+        pop_density = self.get_population_density(lat, lon, radius_km, country_code=country_code, snapshot=snapshot)
         
         # Get road density
-        road_density = self.get_road_density(lat, lon, radius_km)
+        road_density = self.get_road_density(lat, lon, radius_km, snapshot=snapshot)
         
         # Normalize factors (0-1 range)
         # These normalization values can be adjusted based on typical ranges
@@ -275,31 +232,38 @@ class TrafficScoreCalculator:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Income sample points are snapped to this lattice (degrees, ~550 m) so that
+# repeated and overlapping analyses ask for the same coordinates
+INCOME_SAMPLE_LATTICE = 0.005
+GOLDEN_ANGLE = math.pi * (3 - math.sqrt(5))
+
 class RadiusIncomeFetcher:
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
+        from http_client import get_http_client
+        self.http = get_http_client()
+        self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        })
+        }
         
     def generate_points_in_radius(self, center_lat: float, center_lon: float, 
                                  radius_km: float = 2, num_points: int = 8) -> List[Tuple[float, float]]:
         """
-        Generate multiple points within specified radius using Fibonacci sphere sampling
-        for better distribution around the center point
+        Generate multiple points within specified radius using a Fibonacci (sunflower)
+        spiral for an even, deterministic spread around the center point. Points
+        are snapped to INCOME_SAMPLE_LATTICE; points that snap together are merged.
         """
         points = []
         
         # Always include the center point
         points.append((center_lat, center_lon))
         
-        # Generate points in concentric circles around center
+        # Equal-area rings, each point a golden angle further round
         for i in range(1, num_points):
             # Calculate distance from center (0 to radius)
-            distance_km = radius_km * math.sqrt(random.random())
+            distance_km = radius_km * math.sqrt((i - 0.5) / (num_points - 1))
             
             # Calculate bearing (0 to 360 degrees)
-            bearing = 2 * math.pi * random.random()
+            bearing = (i * GOLDEN_ANGLE) % (2 * math.pi)
             
             # Convert to radians
             lat_rad = math.radians(center_lat)
@@ -323,9 +287,14 @@ class RadiusIncomeFetcher:
             
             points.append((new_lat_deg, new_lon_deg))
         
-        return points
+        snapped = []
+        for lat, lon in points:
+            point = (round(round(lat / INCOME_SAMPLE_LATTICE) * INCOME_SAMPLE_LATTICE, 6),
+                     round(round(lon / INCOME_SAMPLE_LATTICE) * INCOME_SAMPLE_LATTICE, 6))
+            if point not in snapped:
+                snapped.append(point)
+        return snapped
     
-    @lru_cache(maxsize=1000)
     def reverse_geocode_with_fallback(self, lat: float, lon: float) -> dict:
         """
         Reverse geocode with multiple fallback services for better accuracy
@@ -336,10 +305,11 @@ class RadiusIncomeFetcher:
             self._geocode_bigdatacloud
         ]
         
-        for service in services:
+        for attempt, service in enumerate(services):
             try:
                 result = service(lat, lon)
                 if result and result.get('country_code'):
+                    tracing.annotate(geocode_service=result.get('service'), fallback_used=attempt > 0)
                     return result
             except Exception as e:
                 logger.warning(f"Geocoding service failed: {e}")
@@ -348,11 +318,10 @@ class RadiusIncomeFetcher:
         raise Exception("All geocoding services failed")
     
     def _geocode_nominatim(self, lat: float, lon: float) -> dict:
-        """OpenStreetMap Nominatim"""
-        url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lon}&zoom=10&addressdetails=1"
-        response = self.session.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        """OpenStreetMap Nominatim (through the shared, cached reverse geocoder)"""
+        from geocoding import get_reverse_geocoder
+        # Only the country is needed, which the offline region index can answer
+        data = get_reverse_geocoder().reverse(lat, lon, zoom=3)
         
         if 'address' in data:
             address = data['address']
@@ -366,7 +335,7 @@ class RadiusIncomeFetcher:
     def _geocode_geonames(self, lat: float, lon: float) -> dict:
         """GeoNames fallback service"""
         url = f"http://api.geonames.org/countryCode?lat={lat}&lng={lon}&username=demo&type=JSON"
-        response = self.session.get(url, timeout=10)
+        response = self.http.get(url, headers=self.headers, timeout=10)
         response.raise_for_status()
         data = response.json()
         
@@ -381,7 +350,7 @@ class RadiusIncomeFetcher:
     def _geocode_bigdatacloud(self, lat: float, lon: float) -> dict:
         """BigDataCloud fallback (free tier available)"""
         url = f"https://api.bigdatacloud.net/data/reverse-geocode-client?latitude={lat}&longitude={lon}&localityLanguage=en"
-        response = self.session.get(url, timeout=10)
+        response = self.http.get(url, headers=self.headers, timeout=10)
         response.raise_for_status()
         data = response.json()
         
@@ -393,13 +362,19 @@ class RadiusIncomeFetcher:
             }
         return None
     
-    @lru_cache(maxsize=1000)
     def get_worldbank_data(self, country_code: str, indicator: str, start_year: int, end_year: int) -> list:
-        """Get World Bank data with caching"""
+        """Get World Bank data, from the local indicator store when it has the series"""
+        from worldbank_store import get_worldbank_store
+        store = get_worldbank_store()
+        if store is not None:
+            data = store.get(country_code, indicator, start_year, end_year)
+            if data is not None:
+                return data
+        
         url = f"http://api.worldbank.org/v2/country/{country_code}/indicator/{indicator}?format=json&date={start_year}:{end_year}&per_page=100"
         
         try:
-            response = self.session.get(url, timeout=15)
+            response = self.http.get(url, headers=self.headers, timeout=15)
             response.raise_for_status()
             data = response.json()
             
@@ -446,61 +421,104 @@ class RadiusIncomeFetcher:
         return None
     
     def fetch_income_for_single_point(self, lat: float, lon: float, 
-                                    indicator: str, start_year: int, end_year: int) -> dict:
-        """Fetch income data for a single coordinate point"""
+                                    indicator: str, start_year: int, end_year: int,
+                                    by_country: Optional[dict] = None) -> dict:
+        """
+        Fetch income data for a single coordinate point. by_country (country
+        code -> result) reuses the answer of an earlier point in the same country.
+        """
+        with tracing.span("income_point", lat=lat, lon=lon) as span:
+            result = self._fetch_income_for_single_point(lat, lon, indicator, start_year, end_year, by_country)
+            if result is None:
+                span.record_error("no income data for this point")
+            else:
+                span.set_attributes(source=result.get('source'), fallback_used=result.get('source') != 'world_bank')
+                if 'error' in result:
+                    span.record_error(result['error'])
+            return result
+
+    def _fetch_income_for_single_point(self, lat: float, lon: float,
+                                       indicator: str, start_year: int, end_year: int,
+                                       by_country: Optional[dict] = None) -> dict:
         try:
             geo_data = self.reverse_geocode_with_fallback(lat, lon)
             country_code = geo_data['country_code']
             country_name = geo_data['country']
             
-            wb_data = self.get_worldbank_data(country_code, indicator, start_year, end_year)
-            
-            if not wb_data:
-                # Try alternatives
-                alternatives = {}
-                for year in range(start_year, end_year + 1):
-                    year_alternatives = self.get_alternative_indicators(country_code, year)
-                    if year_alternatives:
-                        alternatives[year] = year_alternatives
-                
-                if alternatives:
-                    year_data = {}
-                    for year, alt_data in alternatives.items():
-                        estimated_value = self.estimate_income_from_alternatives(alt_data)
-                        if estimated_value:
-                            year_data[str(year)] = estimated_value
-                    return {
-                        'country_code': country_code,
-                        'country_name': country_name,
-                        'data': year_data,
-                        'source': 'estimated'
-                    }
-            
-            # Process standard World Bank data
-            year_data = {}
-            for item in wb_data:
-                if item.get('value') is not None:
-                    year_data[item["date"]] = item["value"]
-            
-            return {
-                'country_code': country_code,
-                'country_name': country_name,
-                'data': year_data,
-                'source': 'world_bank'
-            }
+            if by_country is not None:
+                if country_code not in by_country:
+                    by_country[country_code] = self._fetch_country_income(
+                        country_code, country_name, indicator, start_year, end_year
+                    )
+                return by_country[country_code]
+            return self._fetch_country_income(country_code, country_name, indicator, start_year, end_year)
             
         except Exception as e:
             logger.warning(f"Failed to fetch data for point {lat}, {lon}: {e}")
             return None
     
+    def _fetch_country_income(self, country_code: str, country_name: str,
+                              indicator: str, start_year: int, end_year: int) -> dict:
+        wb_data = self.get_worldbank_data(country_code, indicator, start_year, end_year)
+        
+        if not wb_data:
+            # Try alternatives
+            alternatives = {}
+            for year in range(start_year, end_year + 1):
+                year_alternatives = self.get_alternative_indicators(country_code, year)
+                if year_alternatives:
+                    alternatives[year] = year_alternatives
+            
+            if alternatives:
+                year_data = {}
+                for year, alt_data in alternatives.items():
+                    estimated_value = self.estimate_income_from_alternatives(alt_data)
+                    if estimated_value:
+                        year_data[str(year)] = estimated_value
+                return {
+                    'country_code': country_code,
+                    'country_name': country_name,
+                    'data': year_data,
+                    'source': 'estimated'
+                }
+        
+        # Process standard World Bank data
+        year_data = {}
+        for item in wb_data:
+            if item.get('value') is not None:
+                year_data[item["date"]] = item["value"]
+        
+        return {
+            'country_code': country_code,
+            'country_name': country_name,
+            'data': year_data,
+            'source': 'world_bank'
+        }
+    
+    def _inside_one_country(self, center_lat: float, center_lon: float, radius_km: float) -> bool:
+        """Whether the offline region index puts the whole circle inside one country"""
+        from region_index import BORDER_UNCERTAINTY_M, get_region_index
+        index = get_region_index()
+        if index is None:
+            tracing.annotate(income_sampling="points")
+            return False
+        border_m = index.border_distance_m(center_lat, center_lon)
+        inside = border_m is not None and border_m > radius_km * 1000 + BORDER_UNCERTAINTY_M
+        tracing.annotate(income_sampling="single_country" if inside else "points",
+                         border_distance_m=round(border_m) if border_m is not None else None)
+        return inside
+    
     def fetch_avg_income_on_country(self, center_lat: float, center_lon: float, 
                                   radius_km: float = 2, 
                                   indicator: str = "NY.GDP.PCAP.CD", 
                                   start_year: int = 2020, 
                                   end_year: int = 2023,
-                                  num_sample_points: int = 8) -> pd.DataFrame:
+                                  num_sample_points: int = 8) -> List[Dict[str, Any]]:
         """
-        Fetch average income within specified radius by sampling multiple points
+        Fetch average income within specified radius by sampling multiple points.
+        When the circle is well inside one country (offline border distance
+        check) the center alone answers; otherwise points are sampled and each
+        country's series is fetched once.
         
         Args:
             center_lat (float): Center latitude
@@ -512,27 +530,30 @@ class RadiusIncomeFetcher:
             num_sample_points (int): Number of points to sample within radius
             
         Returns:
-            pd.DataFrame: DataFrame with averaged income data
+            List[dict]: averaged income per year ('year', 'value', 'confidence_score'),
+            oldest first
         """
+        import numpy as np
                 
-        # Generate points within radius
-        points = self.generate_points_in_radius(center_lat, center_lon, radius_km, num_sample_points)
+        if self._inside_one_country(center_lat, center_lon, radius_km):
+            # Every sample point would resolve to the same country and series
+            points = [(center_lat, center_lon)]
+        else:
+            # Generate points within radius
+            points = self.generate_points_in_radius(center_lat, center_lon, radius_km, num_sample_points)
         
         all_results = []
         successful_points = 0
+        by_country = {}  # country code -> result, so each country is fetched once
         
         for i, (lat, lon) in enumerate(points):
             try:
                 
-                result = self.fetch_income_for_single_point(lat, lon, indicator, start_year, end_year)
+                result = self.fetch_income_for_single_point(lat, lon, indicator, start_year, end_year, by_country)
                 
                 if result and result['data']:
                     all_results.append(result)
                     successful_points += 1
-                
-                # Rate limiting
-                if i < len(points) - 1:
-                    time.sleep(0.5)
                     
             except Exception as e:
                 logger.warning(f"Point {i+1} failed: {e}")
@@ -568,24 +589,26 @@ class RadiusIncomeFetcher:
         # Sort by year
         records.sort(key=lambda x: x['year'])
         
-        return pd.DataFrame(records)
-
-# Install required packages if missing
-try:
-    from haversine import haversine
-except ImportError:
-    print("Installing required haversine package...")
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "haversine"])
-    from haversine import haversine
-
-try:
-    import requests
-except ImportError:
-    print("Installing required requests package...")
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "requests"])
-    import requests
+        return records
+
+
+def _json_float(value: float) -> float:
+    """value rounded the way DataFrame.to_json wrote it (10 decimals, 10 digits in exponent form)"""
+    value = float(value)
+    if value != 0 and (abs(value) >= 1e16 or abs(value) < 1e-15):
+        return float(f"{value:.10g}")
+    return round(value, 10)
+
+
+def income_records_json(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Income records as plain JSON values, identical to the former DataFrame export"""
+    return [
+        {key: _json_float(value) if isinstance(value, float) else value for key, value in record.items()}
+        for record in records
+    ]
+
+def google_maps_url(lat: float, lon: float) -> str:
+    return f"https://www.google.com/maps?q={lat},{lon}"
 
 @dataclass
 class Competitor:
@@ -597,20 +620,94 @@ class Competitor:
     osm_id: str
     osm_type: str
     address: str = ""
-    google_maps_url: str = ""
+
+    @property
+    def google_maps_url(self) -> str:
+        return google_maps_url(self.latitude, self.longitude)
+
+OSM_TYPES = ("node", "way")
+NO_ADDRESS = "Address not specified"
+
+class CompetitorTable:
+    """
+    Competitors as parallel columns (struct of arrays) with interned type names.
+    Filtering, grouping and statistics work on the arrays; Competitor rows and
+    JSON dicts are only built for the rows that are displayed or serialized.
+    """
+    
+    def __init__(self, names=(), type_codes=(), type_names=(), distances=(), latitudes=(), longitudes=(),
+                 osm_ids=(), osm_type_codes=(), addresses=()):
+        import numpy as np
+        self.names = np.asarray(names, dtype=object)
+        self.type_codes = np.asarray(type_codes, dtype=np.int64)
+        self.type_names = list(type_names)  # code -> type
+        self.distances = np.asarray(distances, dtype=float)
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.osm_ids = np.asarray(osm_ids, dtype=np.int64)
+        self.osm_type_codes = np.asarray(osm_type_codes, dtype=np.int8)  # index into OSM_TYPES
+        self.addresses = np.asarray(addresses, dtype=object)
+    
+    def __len__(self):
+        return len(self.distances)
+    
+    def __getitem__(self, i: int) -> Competitor:
+        return Competitor(
+            name=self.names[i],
+            type=self.type_names[self.type_codes[i]],
+            distance=float(self.distances[i]),
+            latitude=float(self.latitudes[i]),
+            longitude=float(self.longitudes[i]),
+            osm_id=int(self.osm_ids[i]),
+            osm_type=OSM_TYPES[self.osm_type_codes[i]],
+            address=self.addresses[i],
+        )
+    
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+    
+    def type_of(self, i: int) -> str:
+        return self.type_names[self.type_codes[i]]
+    
+    def subset(self, indices) -> "CompetitorTable":
+        return CompetitorTable(
+            self.names[indices], self.type_codes[indices], self.type_names, self.distances[indices],
+            self.latitudes[indices], self.longitudes[indices], self.osm_ids[indices],
+            self.osm_type_codes[indices], self.addresses[indices],
+        )
+    
+    def records(self, indices) -> List[Dict[str, Any]]:
+        """JSON dicts for the given rows, in that order"""
+        latitudes = self.latitudes[indices].tolist()
+        longitudes = self.longitudes[indices].tolist()
+        return [
+            {
+                "name": name,
+                "type": self.type_names[code],
+                "distance": distance,
+                "latitude": lat,
+                "longitude": lon,
+                "address": address,
+                "google_maps_url": google_maps_url(lat, lon),
+            }
+            for name, code, distance, lat, lon, address in zip(
+                self.names[indices], self.type_codes[indices].tolist(), self.distances[indices].tolist(),
+                latitudes, longitudes, self.addresses[indices]
+            )
+        ]
 
 class CompetitorAnalyzer:
     def __init__(self):
-        self.overpass_url = "http://overpass-api.de/api/interpreter"
         self.request_timeout = 45
-        self.rate_limit_delay = 2  # seconds between requests
+        self.snapshot = None
     
-    def set_parameters(self, latitude: float, longitude: float, radius: int, business_types: List[str]):
+    def set_parameters(self, latitude: float, longitude: float, radius: int, business_types: List[str], snapshot=None):
         """Set analysis parameters directly"""
         self.latitude = latitude
         self.longitude = longitude
         self.radius = radius
         self.business_types = business_types
+        self.snapshot = snapshot
         
     def get_user_input(self) -> Tuple[float, float, int, List[str]]:
         """Get comprehensive user input including location"""
@@ -674,10 +771,9 @@ class CompetitorAnalyzer:
     
     def _geocode_place_name(self, place_name: str) -> Optional[Tuple[float, float]]:
         """Convert place name to coordinates using Nominatim (OpenStreetMap's geocoder)"""
+        from http_client import get_http_client
         try:
             print(f"Looking up coordinates for: {place_name}")
-            time.sleep(1)  # Rate limiting
-            
             nominatim_url = "https://nominatim.openstreetmap.org/search"
             params = {
                 'q': place_name,
@@ -685,7 +781,7 @@ class CompetitorAnalyzer:
                 'limit': 1
             }
             
-            response = requests.get(nominatim_url, params=params, timeout=10)
+            response = get_http_client().get(nominatim_url, params=params, timeout=10)
             response.raise_for_status()
             
             data = response.json()
@@ -815,20 +911,23 @@ class CompetitorAnalyzer:
     
     def search_competitors(self) -> Optional[dict]:
         """Search for businesses using Overpass API"""
+        import requests
+        from osm_snapshot import OverpassRemarkError, stream_overpass_query
+        # Answer from the shared OSM snapshot when it covers the search radius
+        if self.snapshot is not None and self.snapshot.covers("poi", self.radius):
+            tracing.annotate(competitor_source="snapshot")
+            return {"elements": self._select_from_snapshot()}
+        
+        tracing.annotate(competitor_source="overpass")
         try:
-            time.sleep(self.rate_limit_delay)
-            
             query = self._build_query(self.latitude, self.longitude, self.radius, self.business_types)
             
-            response = requests.get(
-                self.overpass_url, 
-                params={"data": query}, 
-                timeout=self.request_timeout
-            )
-            response.raise_for_status()
-            
-            return response.json()
+            # Elements are decoded one at a time as the response arrives; a dropped
+            # connection or a runtime-error remark fails the whole search
+            return {"elements": list(stream_overpass_query(query, timeout=self.request_timeout))}
             
+        except OverpassRemarkError as e:
+            print(f"❌ Overpass query did not complete: {e}")
         except requests.exceptions.Timeout:
             print("⏰ Request timed out. The server is taking too long to respond.")
         except requests.exceptions.ConnectionError:
@@ -840,9 +939,8 @@ class CompetitorAnalyzer:
         
         return None
     
-    def _build_query(self, lat: float, lon: float, radius: int, business_types: List[str]) -> str:
-        """Build Overpass query for business search"""
-        # Separate amenity and shop types
+    def _split_business_types(self, business_types: List[str]) -> Tuple[List[str], List[str]]:
+        """Separate amenity and shop types"""
         amenity_types = []
         shop_types = []
         
@@ -855,6 +953,24 @@ class CompetitorAnalyzer:
             else:
                 shop_types.append(business_type)
         
+        return amenity_types, shop_types
+    
+    def _select_from_snapshot(self) -> List[dict]:
+        """Select the same elements _build_query would fetch, from the shared snapshot"""
+        amenity_types, shop_types = self._split_business_types(self.business_types)
+        
+        elements = []
+        if amenity_types:
+            elements.extend(self.snapshot.select(f'["amenity"~"{"|".join(amenity_types)}"]', self.radius))
+        if shop_types:
+            elements.extend(self.snapshot.select(f'["shop"~"{"|".join(shop_types)}"]', self.radius))
+        
+        return elements
+    
+    def _build_query(self, lat: float, lon: float, radius: int, business_types: List[str]) -> str:
+        """Build Overpass query for business search"""
+        amenity_types, shop_types = self._split_business_types(business_types)
+        
         query_parts = []
         
         if amenity_types:
@@ -876,678 +992,52 @@ class CompetitorAnalyzer:
         (
           {"".join(query_parts)}
         );
-        out body;
-        >;
-        out skel qt;
+        out center tags;
         """
         
         return query
     
-    def process_results(self, data: dict) -> List[Competitor]:
-        """Process API results and create Competitor objects"""
+    def process_results(self, data: dict) -> CompetitorTable:
+        """Process API results into a competitor table (in distance order)"""
+        import numpy as np
+        from osm_snapshot import haversine_m
         if not data or 'elements' not in data:
-            return []
+            return CompetitorTable()
         
-        competitors = []
+        parsed = []
         processed_ids = set()
+        type_names = {}
         
         for element in data.get('elements', []):
             try:
-                competitor = self._process_element(element, processed_ids)
-                if competitor:
-                    competitors.append(competitor)
-            except Exception as e:
-                continue
-        
-        competitors.sort(key=lambda x: x.distance)
-        return competitors
-    
-    def _process_element(self, element: dict, processed_ids: set) -> Optional[Competitor]:
-        """Process individual OSM element into Competitor object"""
-        if element['type'] not in ['node', 'way']:
-            return None
-        
-        tags = element.get('tags', {})
-        name = tags.get('name', '').strip()
-        
-        # Skip unnamed or invalid entries
-        if not name or name.lower() in ['yes', 'no', 'unknown', 'none']:
-            return None
-        
-        # Check for duplicates
-        osm_id = f"{element['type']}_{element['id']}"
-        if osm_id in processed_ids:
-            return None
-        processed_ids.add(osm_id)
-        
-        # Determine business type
-        business_type = tags.get('amenity') or tags.get('shop', 'unknown')
-        
-        # Get coordinates
-        if element['type'] == 'node':
-            lat, lon = element.get('lat', 0), element.get('lon', 0)
-        else:
-            center = element.get('center', {})
-            lat, lon = center.get('lat', 0), center.get('lon', 0)
-        
-        # Validate coordinates
-        if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
-            return None
-        
-        # Calculate distance
-        try:
-            distance = haversine((self.latitude, self.longitude), (lat, lon)) * 1000
-        except:
-            distance = float('inf')
-        
-        # Get address information
-        address_parts = []
-        for addr_key in ['addr:street', 'addr:road', 'addr:full']:
-            if tags.get(addr_key):
-                address_parts.append(tags.get(addr_key))
-                break
-        
-        if tags.get('addr:housenumber'):
-            address_parts.append(tags.get('addr:housenumber'))
-        
-        address = ", ".join(address_parts) if address_parts else "Address not specified"
-        
-        # Create Google Maps URL
-        google_maps_url = f"https://www.google.com/maps?q={lat},{lon}"
-        
-        return Competitor(
-            name=name,
-            type=business_type,
-            distance=distance,
-            latitude=lat,
-            longitude=lon,
-            osm_id=element['id'],
-            osm_type=element['type'],
-            address=address,
-            google_maps_url=google_maps_url
-        )
-    
-    def display_results(self, competitors: List[Competitor]):
-        """Display results with Google Maps links"""
-        if not competitors:
-            print(f"\n❌ No businesses found within the specified radius ({self.radius}m).")
-            return
-        
-        valid_competitors = [c for c in competitors if c.distance <= self.radius]
-        
-        if not valid_competitors:
-            print(f"\n❌ No businesses found within {self.radius} meters.")
-            return
-        
-        print(f"\n{'🎯'*50}")
-        print(f"           FOUND {len(valid_competitors)} BUSINESSES")
-        print(f"           WITHIN {self.radius} METERS RADIUS")
-        print(f"{'🎯'*50}")
-        
-        # Group by type
-        businesses_by_type = {}
-        for comp in valid_competitors:
-            if comp.type not in businesses_by_type:
-                businesses_by_type[comp.type] = []
-            businesses_by_type[comp.type].append(comp)
-        
-        # Display results
-        for business_type, comp_list in sorted(businesses_by_type.items()):
-            print(f"\n📋 {business_type.upper()} ({len(comp_list)} found):")
-            print("=" * 80)
-            
-            for i, comp in enumerate(comp_list, 1):
-                print(f"{i:2d}. {comp.name}")
-                print(f"    📍 Distance: {comp.distance:.0f}m")
-                print(f"    📍 Coordinates: {comp.latitude:.6f}, {comp.longitude:.6f}")
-                print(f"    🏠 Address: {comp.address}")
-                print(f"    🗺️  Google Maps: {comp.google_maps_url}")
-                print()
-        
-        # Statistics
-        print(f"{'📊'*50}")
-        print("BUSINESS INTELLIGENCE SUMMARY:")
-        print(f"{'📊'*50}")
-        
-        for business_type, comp_list in sorted(businesses_by_type.items()):
-            print(f"  {business_type}: {len(comp_list)} businesses")
-        
-        if valid_competitors:
-            closest = min(valid_competitors, key=lambda x: x.distance)
-            farthest = max(valid_competitors, key=lambda x: x.distance)
-            avg_distance = sum(c.distance for c in valid_competitors) / len(valid_competitors)
-            
-            print(f"\n  📍 Closest: {closest.name} ({closest.distance:.0f}m - {closest.type})")
-            print(f"  📍 Farthest: {farthest.name} ({farthest.distance:.0f}m - {farthest.type})")
-            print(f"  📍 Average distance: {avg_distance:.0f}m")
-            
-            # Market saturation analysis
-            total_density = len(valid_competitors) / (3.14159 * (self.radius/1000) ** 2)  # businesses per km²
-            print(f"  📍 Business density: {total_density:.1f} businesses per km²")
-    
-    def get_results_json(self, competitors: List[Competitor]) -> Dict[str, Any]:
-        """Return results as JSON for frontend consumption"""
-        valid_competitors = [c for c in competitors if c.distance <= self.radius]
-        
-        if not valid_competitors:
-            return {
-                "status": "no_competitors_found",
-                "message": f"No businesses found within {self.radius} meters",
-                "search_parameters": {
-                    "latitude": self.latitude,
-                    "longitude": self.longitude,
-                    "radius": self.radius,
-                    "business_types": self.business_types
-                }
-            }
-        
-        # Group by type
-        businesses_by_type = {}
-        for comp in valid_competitors:
-            if comp.type not in businesses_by_type:
-                businesses_by_type[comp.type] = []
-            businesses_by_type[comp.type].append(comp)
-        
-        # Prepare competitors list
-        competitors_list = []
-        for business_type, comp_list in sorted(businesses_by_type.items()):
-            for comp in comp_list:
-                competitors_list.append({
-                    "name": comp.name,
-                    "type": comp.type,
-                    "distance": comp.distance,
-                    "latitude": comp.latitude,
-                    "longitude": comp.longitude,
-                    "address": comp.address,
-                    "google_maps_url": comp.google_maps_url
-                })
-        
-        # Calculate statistics
-        closest = min(valid_competitors, key=lambda x: x.distance)
-        farthest = max(valid_competitors, key=lambda x: x.distance)
-        avg_distance = sum(c.distance for c in valid_competitors) / len(valid_competitors)
-        total_density = len(valid_competitors) / (3.14159 * (self.radius/1000) ** 2)  # businesses per km²
-        
-        # Count by type
-        count_by_type = {}
-        for business_type, comp_list in businesses_by_type.items():
-            count_by_type[business_type] = len(comp_list)
-        
-        return {
-            "status": "success",
-            "total_competitors": len(valid_competitors),
-            "search_parameters": {
-                "latitude": self.latitude,
-                "longitude": self.longitude,
-                "radius": self.radius,
-                "business_types": self.business_types
-            },
-            "competitors": competitors_list,
-            "statistics": {
-                "closest": {
-                    "name": closest.name,
-                    "distance": closest.distance,
-                    "type": closest.type
-                },
-                "farthest": {
-                    "name": farthest.name,
-                    "distance": farthest.distance,
-                    "type": farthest.type
-                },
-                "average_distance": avg_distance,
-                "business_density": total_density,
-                "count_by_type": count_by_type
-            }
-        }
-    
-    def export_results(self, competitors: List[Competitor], filename: str = "business_analysis_report.txt"):
-        """Export results to a text file"""
-        try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write("BUSINESS COMPETITOR ANALYSIS REPORT\n")
-                f.write("=" * 50 + "\n\n")
-                f.write(f"Generated: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Search radius: {self.radius} meters\n")
-                f.write(f"Location: {self.latitude:.6f}, {self.longitude:.6f}\n")
-                f.write(f"Business types: {', '.join(self.business_types)}\n\n")
-                
-                valid_competitors = [c for c in competitors if c.distance <= self.radius]
-                f.write(f"Total businesses found: {len(valid_competitors)}\n\n")
-                
-                f.write("DETAILED LISTING:\n")
-                f.write("-" * 50 + "\n")
-                
-                for comp in valid_competitors:
-                    f.write(f"Name: {comp.name}\n")
-                    f.write(f"Type: {comp.type}\n")
-                    f.write(f"Distance: {comp.distance:.0f} meters\n")
-                    f.write(f"Coordinates: {comp.latitude:.6f}, {comp.longitude:.6f}\n")
-                    f.write(f"Address: {comp.address}\n")
-                    f.write(f"Google Maps: {comp.google_maps_url}\n")
-                    f.write("-" * 40 + "\n")
-                
-                # Add summary statistics
-                f.write("\nSUMMARY STATISTICS:\n")
-                f.write("-" * 30 + "\n")
-                
-                businesses_by_type = {}
-                for comp in valid_competitors:
-                    businesses_by_type[comp.type] = businesses_by_type.get(comp.type, 0) + 1
-                
-                for business_type, count in sorted(businesses_by_type.items()):
-                    f.write(f"{business_type}: {count} businesses\n")
-                
-            print(f"\n💾 Report exported to: {filename}")
-            
-        except Exception as e:
-            print(f"❌ Error exporting report: {e}")
-    
-    def run_analysis(self, export: bool = False, filename: str = None, json_output: bool = False):
-        """Run analysis with current parameters"""
-        data = self.search_competitors()
-        
-        if data:
-            competitors = self.process_results(data)
-            
-            if json_output:
-                # Return JSON for frontend
-                return self.get_results_json(competitors)
-            else:
-                # Display results in console
-                self.display_results(competitors)
-                
-                if competitors and export:
-                    if not filename:
-                        filename = "business_report.txt"
-                    self.export_results(competitors, filename)
-        
-        return competitors if not json_output else self.get_results_json(competitors)
-    
-    def main(self, auto_mode: bool = False, json_output: bool = False, **kwargs):
-        """Main application with optional auto mode"""
-        if not json_output:
-            print("🏪 BUSINESS COMPETITOR ANALYSIS TOOL")
-            print("📍 Find and analyze local businesses with Google Maps integration")
-            print("=" * 70)
-        
-        try:
-            if auto_mode:
-                # Auto mode - use provided parameters
-                latitude = kwargs.get('latitude', 13.0827)
-                longitude = kwargs.get('longitude', 80.2707)
-                radius = kwargs.get('radius', 500)
-                business_types = kwargs.get('business_types', ['restaurant', 'cafe'])
-                
-                self.set_parameters(latitude, longitude, radius, business_types)
-                result = self.run_analysis(
-                    export=kwargs.get('export', False),
-                    filename=kwargs.get('filename'),
-                    json_output=json_output
-                )
-
-                return result
-            else:
-                # Interactive mode
-                while True:
-                    latitude, longitude, radius, business_types = self.get_user_input()
-                    self.set_parameters(latitude, longitude, radius, business_types)
-                    
-                    if json_output:
-                        result = self.run_analysis(json_output=True)
-                        print(json.dumps(result, indent=2))
-                    else:
-                        self.run_analysis()
-                    
-                    if json_output:
-                        break
-                        
-                    again = input("\n🔄 Perform another analysis? (y/n): ").strip().lower()
-                    if again not in ['y', 'yes']:
-                        if not json_output:
-                            print("\n✅ Analysis complete! Thank you for using the tool.")
-                            print("👋 Goodbye!")
-                        break
-                    
-        except KeyboardInterrupt:
-            if not json_output:
-                print("\n\n⏹️ Operation cancelled by user.")
-        except Exception as e:
-            if not json_output:
-                print(f"\n❌ Unexpected error: {e}")
-
-try:
-    from haversine import haversine
-except ImportError:
-    print("Installing required haversine package...")
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "haversine"])
-    from haversine import haversine
-
-try:
-    import requests
-except ImportError:
-    print("Installing required requests package...")
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "requests"])
-    import requests
-
-@dataclass
-class Competitor:
-    name: str
-    type: str
-    distance: float
-    latitude: float
-    longitude: float
-    osm_id: str
-    osm_type: str
-    address: str = ""
-    google_maps_url: str = ""
-
-class CompetitorAnalyzer:
-    def __init__(self):
-        self.overpass_url = "http://overpass-api.de/api/interpreter"
-        self.request_timeout = 45
-        self.rate_limit_delay = 2  # seconds between requests
-    
-    def set_parameters(self, latitude: float, longitude: float, radius: int, business_types: List[str]):
-        """Set analysis parameters directly"""
-        self.latitude = latitude
-        self.longitude = longitude
-        self.radius = radius
-        self.business_types = business_types
-        
-    def get_user_input(self) -> Tuple[float, float, int, List[str]]:
-        """Get comprehensive user input including location"""
-        print("=== Competitor Analysis Tool ===\n")
-        print("This tool helps you find competitors by name and type in any location.\n")
-        
-        # Get location input
-        latitude, longitude = self._get_location_input()
-        
-        # Get radius input
-        radius = self._get_radius_input()
-        
-        # Get business types
-        business_types = self._get_business_types_input()
-        
-        return latitude, longitude, radius, business_types
-    
-    def _get_location_input(self) -> Tuple[float, float]:
-        """Get location coordinates from user with flexible input options"""
-        while True:
-            try:
-                print("\n📍 LOCATION INPUT OPTIONS:")
-                print("1. Use default location (Chennai, India)")
-                print("2. Enter latitude and longitude")
-                print("3. Enter a place name (city, address, etc.)")
-                
-                option = input("\nChoose option (1/2/3): ").strip()
-                
-                if option == '1' or option == '':
-                    print("Using Chennai, India as location (13.0827, 80.2707)")
-                    return 13.0827, 80.2707
-                
-                elif option == '2':
-                    lat = float(input("Enter latitude (e.g., 13.0827): ").strip())
-                    lon = float(input("Enter longitude (e.g., 80.2707): ").strip())
-                    
-                    if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
-                        print("Invalid coordinates. Latitude must be between -90 and 90, longitude between -180 and 180.")
-                        continue
-                        
-                    return lat, lon
-                
-                elif option == '3':
-                    place_name = input("Enter place name (e.g., 'Paris, France', 'Times Square'): ").strip()
-                    if place_name:
-                        coords = self._geocode_place_name(place_name)
-                        if coords:
-                            return coords
-                        else:
-                            print("Could not find coordinates for that place. Please try another method.")
-                    continue
-                
-                else:
-                    print("Invalid option. Please choose 1, 2, or 3.")
-                    
-            except ValueError:
-                print("Please enter valid numbers for coordinates.")
-            except KeyboardInterrupt:
-                print("\nOperation cancelled.")
-                return 13.0827, 80.2707  # Default fallback
-    
-    def _geocode_place_name(self, place_name: str) -> Optional[Tuple[float, float]]:
-        """Convert place name to coordinates using Nominatim (OpenStreetMap's geocoder)"""
-        try:
-            print(f"Looking up coordinates for: {place_name}")
-            time.sleep(1)  # Rate limiting
-            
-            nominatim_url = "https://nominatim.openstreetmap.org/search"
-            params = {
-                'q': place_name,
-                'format': 'json',
-                'limit': 1
-            }
-            
-            response = requests.get(nominatim_url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            if data:
-                lat = float(data[0]['lat'])
-                lon = float(data[0]['lon'])
-                print(f"Found coordinates: {lat:.6f}, {lon:.6f}")
-                return lat, lon
-            else:
-                print("No results found for that place name.")
-                return None
-                
-        except Exception as e:
-            print(f"Geocoding error: {e}")
-            return None
-    
-    def _get_radius_input(self) -> int:
-        """Get search radius from user"""
-        while True:
-            try:
-                radius_input = input("\nEnter search radius in meters (max 2000, default 500): ").strip()
-                if not radius_input:
-                    radius = 500
-                else:
-                    radius = int(radius_input)
-                
-                if radius <= 0:
-                    print("Please enter a positive number.")
-                    continue
-                if radius > 2000:
-                    print("Radius too large. Maximum is 2000 meters (2km).")
-                    continue
-                return radius
-            except ValueError:
-                print("Please enter a valid number.")
-    
-    def _get_business_types_input(self) -> List[str]:
-        """Get business types from user with text input option"""
-        print("\n" + "="*60)
-        print("SELECT BUSINESS TYPES TO SEARCH FOR")
-        print("="*60)
-        
-        # Common business types with better categorization
-        business_categories = {
-            'food': ['restaurant', 'cafe', 'fast_food', 'bakery', 'food_court'],
-            'retail': ['supermarket', 'convenience', 'clothes', 'shoes', 'electronics', 'mall'],
-            'services': ['bank', 'pharmacy', 'hospital', 'dentist', 'post_office'],
-            'entertainment': ['cinema', 'theatre', 'bar', 'pub', 'nightclub'],
-            'other': ['fuel', 'car_wash', 'hotel', 'library', 'school']
-        }
-        
-        print("\nCommon business types (you can also enter custom types):")
-        for i, (category, types) in enumerate(business_categories.items(), 1):
-            print(f"{i}. {category.title()}: {', '.join(types)}")
-        
-        print("0. Enter custom business types")
-        
-        selected_types = []
-        
-        while True:
-            try:
-                print("\nYou can:")
-                print("- Enter category numbers (e.g., '1,2' for food and retail)")
-                print("- Enter specific business types (e.g., 'restaurant,cafe')")
-                print("- Type 'done' when finished")
-                
-                choice = input("\nEnter your choice: ").strip().lower()
-                
-                if choice == 'done':
-                    if not selected_types:
-                        print("No types selected. Using default: restaurant, cafe")
-                        return ['restaurant', 'cafe']
-                    print(f"\n✅ Selected business types: {', '.join(selected_types)}")
-                    return selected_types
-                
-                if choice == '0':
-                    custom_types = input("Enter custom business types (comma-separated): ").strip()
-                    if custom_types:
-                        types_list = [t.strip() for t in custom_types.split(',') if t.strip()]
-                        for business_type in types_list:
-                            if self._validate_business_type(business_type):
-                                selected_types.append(business_type)
-                                print(f"✓ Added '{business_type}'")
-                    continue
-                
-                # Process category numbers or specific types
-                choices = [c.strip() for c in choice.split(',') if c.strip()]
-                
-                for c in choices:
-                    if c.isdigit() and int(c) in range(1, len(business_categories) + 1):
-                        # It's a category number
-                        category_key = list(business_categories.keys())[int(c) - 1]
-                        for business_type in business_categories[category_key]:
-                            if business_type not in selected_types:
-                                selected_types.append(business_type)
-                        print(f"✓ Added all {category_key} businesses")
-                    else:
-                        # It's a specific business type
-                        if self._validate_business_type(c):
-                            if c not in selected_types:
-                                selected_types.append(c)
-                                print(f"✓ Added '{c}'")
-                
-                if selected_types:
-                    print(f"\nCurrent selection: {', '.join(selected_types)}")
-                    
-            except KeyboardInterrupt:
-                print("\nOperation cancelled.")
-                if selected_types:
-                    return selected_types
-                else:
-                    return ['restaurant', 'cafe']
-    
-    def _validate_business_type(self, business_type: str) -> bool:
-        """Validate that the business type is reasonable"""
-        if not business_type or len(business_type) > 50:
-            print("Business type must be between 1 and 50 characters.")
-            return False
-        
-        # Basic validation
-        invalid_chars = ['"', "'", ';', '(', ')', '[', ']', '{', '}', '~', '*']
-        if any(char in business_type for char in invalid_chars):
-            print("Business type contains invalid characters.")
-            return False
-            
-        return True
-    
-    def search_competitors(self) -> Optional[dict]:
-        """Search for businesses using Overpass API"""
-        try:
-            time.sleep(self.rate_limit_delay)
-            
-            query = self._build_query(self.latitude, self.longitude, self.radius, self.business_types)
-            
-            response = requests.get(
-                self.overpass_url, 
-                params={"data": query}, 
-                timeout=self.request_timeout
-            )
-            response.raise_for_status()
-            
-            return response.json()
-            
-        except requests.exceptions.Timeout:
-            print("⏰ Request timed out. The server is taking too long to respond.")
-        except requests.exceptions.ConnectionError:
-            print("📡 Network connection error. Please check your internet connection.")
-        except requests.exceptions.HTTPError as e:
-            print(f"❌ HTTP error: {e}")
-        except Exception as e:
-            print(f"❌ Error: {e}")
-        
-        return None
-    
-    def _build_query(self, lat: float, lon: float, radius: int, business_types: List[str]) -> str:
-        """Build Overpass query for business search"""
-        # Separate amenity and shop types
-        amenity_types = []
-        shop_types = []
-        
-        for business_type in business_types:
-            # Common amenity types
-            if business_type in ['restaurant', 'cafe', 'fast_food', 'bank', 'pharmacy', 
-                               'hospital', 'school', 'fuel', 'cinema', 'theatre', 'bar']:
-                amenity_types.append(business_type)
-            # Common shop types or assume shop
-            else:
-                shop_types.append(business_type)
-        
-        query_parts = []
-        
-        if amenity_types:
-            amenity_regex = "|".join(amenity_types)
-            query_parts.extend([
-                f'node["amenity"~"{amenity_regex}"](around:{radius},{lat},{lon});',
-                f'way["amenity"~"{amenity_regex}"](around:{radius},{lat},{lon});'
-            ])
-        
-        if shop_types:
-            shop_regex = "|".join(shop_types)
-            query_parts.extend([
-                f'node["shop"~"{shop_regex}"](around:{radius},{lat},{lon});',
-                f'way["shop"~"{shop_regex}"](around:{radius},{lat},{lon});'
-            ])
-        
-        query = f"""
-        [out:json][timeout:25];
-        (
-          {"".join(query_parts)}
-        );
-        out body;
-        >;
-        out skel qt;
-        """
-        
-        return query
-    
-    def process_results(self, data: dict) -> List[Competitor]:
-        """Process API results and create Competitor objects"""
-        if not data or 'elements' not in data:
-            return []
-        
-        competitors = []
-        processed_ids = set()
-        
-        for element in data.get('elements', []):
-            try:
-                competitor = self._process_element(element, processed_ids)
-                if competitor:
-                    competitors.append(competitor)
-            except Exception as e:
+                fields = self._parse_element(element, processed_ids, type_names)
+                if fields:
+                    parsed.append(fields)
+            except Exception:
                 continue
         
-        competitors.sort(key=lambda x: x.distance)
-        return competitors
+        if not parsed:
+            return CompetitorTable()
+        
+        names, type_codes, lats, lons, osm_ids, osm_type_codes, addresses = zip(*parsed)
+        del parsed
+        table = CompetitorTable(names, type_codes, type_names, np.zeros(len(names)), lats, lons,
+                                osm_ids, osm_type_codes, addresses)
+        
+        # Distances for every element in one vectorized pass
+        lats, lons = table.latitudes, table.longitudes
+        valid = (lats >= -90) & (lats <= 90) & (lons >= -180) & (lons <= 180)
+        table.distances = haversine_m(self.latitude, self.longitude, lats, lons)
+        
+        # Stable sort keeps API order between equal distances
+        keep = np.flatnonzero(valid)
+        return table.subset(keep[np.argsort(table.distances[keep], kind='stable')])
     
-    def _process_element(self, element: dict, processed_ids: set) -> Optional[Competitor]:
-        """Process individual OSM element into Competitor object"""
+    def _parse_element(self, element: dict, processed_ids: set, type_names: Dict[str, int]) -> Optional[tuple]:
+        """
+        Competitor columns (name, type code, lat, lon, OSM id, OSM type code,
+        address) of an OSM element; new types are interned into type_names
+        """
         if element['type'] not in ['node', 'way']:
             return None
         
@@ -1574,16 +1064,6 @@ class CompetitorAnalyzer:
             center = element.get('center', {})
             lat, lon = center.get('lat', 0), center.get('lon', 0)
         
-        # Validate coordinates
-        if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
-            return None
-        
-        # Calculate distance
-        try:
-            distance = haversine((self.latitude, self.longitude), (lat, lon)) * 1000
-        except:
-            distance = float('inf')
-        
         # Get address information
         address_parts = []
         for addr_key in ['addr:street', 'addr:road', 'addr:full']:
@@ -1594,32 +1074,48 @@ class CompetitorAnalyzer:
         if tags.get('addr:housenumber'):
             address_parts.append(tags.get('addr:housenumber'))
         
-        address = ", ".join(address_parts) if address_parts else "Address not specified"
+        address = ", ".join(address_parts) if address_parts else NO_ADDRESS
         
-        # Create Google Maps URL
-        google_maps_url = f"https://www.google.com/maps?q={lat},{lon}"
+        if business_type not in type_names:
+            type_names[sys.intern(business_type)] = len(type_names)
         
-        return Competitor(
-            name=name,
-            type=business_type,
-            distance=distance,
-            latitude=lat,
-            longitude=lon,
-            osm_id=element['id'],
-            osm_type=element['type'],
-            address=address,
-            google_maps_url=google_maps_url
-        )
+        return (name, type_names[business_type], lat, lon, element['id'],
+                OSM_TYPES.index(element['type']), address)
+    
+    def _within_radius(self, competitors: CompetitorTable) -> CompetitorTable:
+        """Competitors inside the search radius, in distance order"""
+        import numpy as np
+        return competitors.subset(np.flatnonzero(competitors.distances <= self.radius))
+    
+    def _group_by_type(self, competitors: CompetitorTable) -> Dict[str, "np.ndarray"]:
+        """Row indices per type (sorted by type, distance order within each group)"""
+        import numpy as np
+        if not len(competitors):
+            return {}
+        
+        # Stable sort on type codes keeps distance order inside each group
+        order = np.argsort(competitors.type_codes, kind='stable')
+        codes = competitors.type_codes[order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        ends = np.r_[starts[1:], len(codes)]
+        
+        groups = {
+            competitors.type_names[codes[start]]: order[start:end]
+            for start, end in zip(starts, ends)
+        }
+        return {business_type: groups[business_type] for business_type in sorted(groups)}
     
-    def display_results(self, competitors: List[Competitor]):
+    def display_results(self, competitors: CompetitorTable):
         """Display results with Google Maps links"""
-        if not competitors:
+        import numpy as np
+        if not len(competitors):
             print(f"\n❌ No businesses found within the specified radius ({self.radius}m).")
             return
         
-        valid_competitors = [c for c in competitors if c.distance <= self.radius]
+        valid_competitors = self._within_radius(competitors)
+        distances = valid_competitors.distances
         
-        if not valid_competitors:
+        if not len(valid_competitors):
             print(f"\n❌ No businesses found within {self.radius} meters.")
             return
         
@@ -1628,19 +1124,15 @@ class CompetitorAnalyzer:
         print(f"           WITHIN {self.radius} METERS RADIUS")
         print(f"{'🎯'*50}")
         
-        # Group by type
-        businesses_by_type = {}
-        for comp in valid_competitors:
-            if comp.type not in businesses_by_type:
-                businesses_by_type[comp.type] = []
-            businesses_by_type[comp.type].append(comp)
+        businesses_by_type = self._group_by_type(valid_competitors)
         
         # Display results
-        for business_type, comp_list in sorted(businesses_by_type.items()):
-            print(f"\n📋 {business_type.upper()} ({len(comp_list)} found):")
+        for business_type, rows in businesses_by_type.items():
+            print(f"\n📋 {business_type.upper()} ({len(rows)} found):")
             print("=" * 80)
             
-            for i, comp in enumerate(comp_list, 1):
+            for i, row in enumerate(rows, 1):
+                comp = valid_competitors[row]
                 print(f"{i:2d}. {comp.name}")
                 print(f"    📍 Distance: {comp.distance:.0f}m")
                 print(f"    📍 Coordinates: {comp.latitude:.6f}, {comp.longitude:.6f}")
@@ -1653,13 +1145,13 @@ class CompetitorAnalyzer:
         print("BUSINESS INTELLIGENCE SUMMARY:")
         print(f"{'📊'*50}")
         
-        for business_type, comp_list in sorted(businesses_by_type.items()):
-            print(f"  {business_type}: {len(comp_list)} businesses")
+        for business_type, rows in businesses_by_type.items():
+            print(f"  {business_type}: {len(rows)} businesses")
         
-        if valid_competitors:
-            closest = min(valid_competitors, key=lambda x: x.distance)
-            farthest = max(valid_competitors, key=lambda x: x.distance)
-            avg_distance = sum(c.distance for c in valid_competitors) / len(valid_competitors)
+        if len(valid_competitors):
+            closest = valid_competitors[int(np.argmin(distances))]
+            farthest = valid_competitors[int(np.argmax(distances))]
+            avg_distance = float(distances.mean())
             
             print(f"\n  📍 Closest: {closest.name} ({closest.distance:.0f}m - {closest.type})")
             print(f"  📍 Farthest: {farthest.name} ({farthest.distance:.0f}m - {farthest.type})")
@@ -1669,11 +1161,13 @@ class CompetitorAnalyzer:
             total_density = len(valid_competitors) / (3.14159 * (self.radius/1000) ** 2)  # businesses per km²
             print(f"  📍 Business density: {total_density:.1f} businesses per km²")
     
-    def get_results_json(self, competitors: List[Competitor]) -> Dict[str, Any]:
+    def get_results_json(self, competitors: CompetitorTable) -> Dict[str, Any]:
         """Return results as JSON for frontend consumption"""
-        valid_competitors = [c for c in competitors if c.distance <= self.radius]
+        import numpy as np
+        valid_competitors = self._within_radius(competitors)
+        distances = valid_competitors.distances
         
-        if not valid_competitors:
+        if not len(valid_competitors):
             return {
                 "status": "no_competitors_found",
                 "message": f"No businesses found within {self.radius} meters",
@@ -1685,37 +1179,19 @@ class CompetitorAnalyzer:
                 }
             }
         
-        # Group by type
-        businesses_by_type = {}
-        for comp in valid_competitors:
-            if comp.type not in businesses_by_type:
-                businesses_by_type[comp.type] = []
-            businesses_by_type[comp.type].append(comp)
-        
-        # Prepare competitors list
-        competitors_list = []
-        for business_type, comp_list in sorted(businesses_by_type.items()):
-            for comp in comp_list:
-                competitors_list.append({
-                    "name": comp.name,
-                    "type": comp.type,
-                    "distance": comp.distance,
-                    "latitude": comp.latitude,
-                    "longitude": comp.longitude,
-                    "address": comp.address,
-                    "google_maps_url": comp.google_maps_url
-                })
+        businesses_by_type = self._group_by_type(valid_competitors)
+        
+        # Prepare competitors list (grouped by type)
+        competitors_list = valid_competitors.records(np.concatenate(list(businesses_by_type.values())))
         
         # Calculate statistics
-        closest = min(valid_competitors, key=lambda x: x.distance)
-        farthest = max(valid_competitors, key=lambda x: x.distance)
-        avg_distance = sum(c.distance for c in valid_competitors) / len(valid_competitors)
+        closest = int(np.argmin(distances))
+        farthest = int(np.argmax(distances))
+        avg_distance = float(distances.mean())
         total_density = len(valid_competitors) / (3.14159 * (self.radius/1000) ** 2)  # businesses per km²
         
         # Count by type
-        count_by_type = {}
-        for business_type, comp_list in businesses_by_type.items():
-            count_by_type[business_type] = len(comp_list)
+        count_by_type = {business_type: len(rows) for business_type, rows in businesses_by_type.items()}
         
         return {
             "status": "success",
@@ -1729,14 +1205,14 @@ class CompetitorAnalyzer:
             "competitors": competitors_list,
             "statistics": {
                 "closest": {
-                    "name": closest.name,
-                    "distance": closest.distance,
-                    "type": closest.type
+                    "name": valid_competitors.names[closest],
+                    "distance": float(distances[closest]),
+                    "type": valid_competitors.type_of(closest)
                 },
                 "farthest": {
-                    "name": farthest.name,
-                    "distance": farthest.distance,
-                    "type": farthest.type
+                    "name": valid_competitors.names[farthest],
+                    "distance": float(distances[farthest]),
+                    "type": valid_competitors.type_of(farthest)
                 },
                 "average_distance": avg_distance,
                 "business_density": total_density,
@@ -1744,7 +1220,7 @@ class CompetitorAnalyzer:
             }
         }
     
-    def export_results(self, competitors: List[Competitor], filename: str = "business_analysis_report.txt"):
+    def export_results(self, competitors: CompetitorTable, filename: str = "business_analysis_report.txt"):
         """Export results to a text file"""
         try:
             with open(filename, 'w', encoding='utf-8') as f:
@@ -1755,7 +1231,7 @@ class CompetitorAnalyzer:
                 f.write(f"Location: {self.latitude:.6f}, {self.longitude:.6f}\n")
                 f.write(f"Business types: {', '.join(self.business_types)}\n\n")
                 
-                valid_competitors = [c for c in competitors if c.distance <= self.radius]
+                valid_competitors = self._within_radius(competitors)
                 f.write(f"Total businesses found: {len(valid_competitors)}\n\n")
                 
                 f.write("DETAILED LISTING:\n")
@@ -1774,12 +1250,8 @@ class CompetitorAnalyzer:
                 f.write("\nSUMMARY STATISTICS:\n")
                 f.write("-" * 30 + "\n")
                 
-                businesses_by_type = {}
-                for comp in valid_competitors:
-                    businesses_by_type[comp.type] = businesses_by_type.get(comp.type, 0) + 1
-                
-                for business_type, count in sorted(businesses_by_type.items()):
-                    f.write(f"{business_type}: {count} businesses\n")
+                for business_type, rows in self._group_by_type(valid_competitors).items():
+                    f.write(f"{business_type}: {len(rows)} businesses\n")
                 
             print(f"\n💾 Report exported to: {filename}")
             
@@ -1800,7 +1272,7 @@ class CompetitorAnalyzer:
                 # Display results in console
                 self.display_results(competitors)
                 
-                if competitors and export:
+                if len(competitors) and export:
                     if not filename:
                         filename = "business_report.txt"
                     self.export_results(competitors, filename)
@@ -1822,7 +1294,7 @@ class CompetitorAnalyzer:
                 radius = kwargs.get('radius', 500)
                 business_types = kwargs.get('business_types', ['restaurant', 'cafe'])
                 
-                self.set_parameters(latitude, longitude, radius, business_types)
+                self.set_parameters(latitude, longitude, radius, business_types, snapshot=kwargs.get('snapshot'))
                 result = self.run_analysis(
                     export=kwargs.get('export', False),
                     filename=kwargs.get('filename'),
@@ -1858,26 +1330,21 @@ class CompetitorAnalyzer:
         except Exception as e:
             if not json_output:
                 print(f"\n❌ Unexpected error: {e}")
-                
+
+
+WIKIPEDIA_API_URL = os.environ.get("RADIU_WIKIPEDIA_API_URL", "https://en.wikipedia.org/w/api.php")
+WIKIPEDIA_RESULTS = 2  # search results whose intro extracts are analysed
+WIKIPEDIA_EXTRACT_CHARS = 500
+
+
 class FreeCulturalFitAnalyzer:
     def __init__(self):
         # No API keys needed!
         
-        # Expanded global keyword database
-        self.keywords = {
-            "coffee": ["coffee", "espresso", "latte", "cappuccino", "americano", "macchiato", "flat white", "café"],
-            "tea": ["tea", "chai", "green tea", "black tea", "matcha", "oolong", "herbal tea", "bubble tea", "boba"],
-            "vegetarian": ["vegetarian", "plant-based", "vegan", "veggie", "meat-free", "cruelty-free"],
-            "nonveg": ["chicken", "meat", "fish", "beef", "pork", "steak", "seafood", "lamb", "poultry", "bacon"],
-            "streetfood": ["street food", "tacos", "bbq", "kebab", "shawarma", "falafel", "food truck", "food stall"],
-            "fastfood": ["burger", "fries", "pizza", "sandwich", "hotdog", "fast food", "quick service"],
-            "healthy": ["salad", "organic", "gluten-free", "low-carb", "superfood", "wellness", "nutrition", "clean eating"],
-            "dessert": ["ice cream", "cake", "pastry", "donut", "pudding", "brownie", "sweet", "bakery", "patisserie"],
-            "alcohol": ["wine", "beer", "cocktail", "bar", "pub", "brewery", "spirits", "whiskey", "vodka"],
-            "cafe": ["cafe", "coffee shop", "tea house", "espresso bar", "pastry shop"],
-            "fine_dining": ["fine dining", "gourmet", "luxury restaurant", "chef's table", "michelin"],
-            "casual_dining": ["casual dining", "family restaurant", "bistro", "brunch", "eatery"]
-        }
+        # Expanded global keyword database (plus Hindi / Tamil transliterations in the matcher)
+        from keyword_matcher import CULTURE_KEYWORDS, get_culture_matcher
+        self.keywords = CULTURE_KEYWORDS
+        self.matcher = get_culture_matcher()
         
         # Global seasonal patterns
         self.seasonal_patterns = {
@@ -1900,27 +1367,11 @@ class FreeCulturalFitAnalyzer:
         return "northern_hemisphere" if lat >= 0 else "southern_hemisphere"
     
     def get_location_from_coords(self, lat, lng):
-        """Free geocoding using OpenStreetMap Nominatim API"""
-        url = "https://nominatim.openstreetmap.org/reverse"
-        params = {
-            'format': 'json',
-            'lat': lat,
-            'lon': lng,
-            'zoom': 10,  # Level of detail
-            'addressdetails': 1  # Get detailed address components
-        }
-        
-        # Important: Add a user agent to identify your application
-        headers = {
-            'User-Agent': 'CulturalFitAnalyzer/1.0 (contact@example.com)'
-        }
-        
+        """Free geocoding using OpenStreetMap Nominatim API (shared cache, rate limited)"""
+        from geocoding import get_reverse_geocoder
         try:
-            response = requests.get(url, params=params, headers=headers)
-            data = response.json()
-            
-            # Respect rate limits (1 request per second)
-            time.sleep(1.1)
+            # zoom 10 = city level, with detailed address components
+            data = get_reverse_geocoder().reverse(lat, lng, zoom=10)
             
             if 'error' not in data:
                 address = data.get('display_name', 'Unknown location')
@@ -1929,6 +1380,7 @@ class FreeCulturalFitAnalyzer:
                 location_info = {
                     'formatted_address': address,
                     'country': address_components.get('country', ''),
+                    'country_code': address_components.get('country_code', '').upper(),
                     'region': address_components.get('state', address_components.get('region', '')),
                     'city': address_components.get('city', address_components.get('town', address_components.get('village', ''))),
                     'postal_code': address_components.get('postcode', ''),
@@ -1943,23 +1395,31 @@ class FreeCulturalFitAnalyzer:
             return {"error": f"Request Error: {str(e)}"}
 
     def get_wikipedia_content(self, location_name, business_type, radius_km):
-        """Get content from Wikipedia about the location with better error handling"""
+        """
+        Intro extracts of the top Wikipedia search results for the place and business type.
+
+        One generator=search request returns the search hits together with their
+        extracts. The search does not depend on radius_km, so the response cache
+        keeps one entry per (place, business type).
+        """
+        import requests
+        from http_client import get_http_client
         try:
             if not location_name or not location_name.strip():
                 return []
                 
-            # Add radius context to the search
-            radius_context = f"within {radius_km}km radius" if radius_km > 0 else ""
-            
-            # Try to get Wikipedia page for the city/region
-            search_url = "https://en.wikipedia.org/w/api.php"
             params = {
                 'action': 'query',
                 'format': 'json',
-                'list': 'search',
-                'srsearch': f"{location_name} {business_type} {radius_context}",
-                'srlimit': 3,  # Reduced from 5 to avoid rate limiting
-                'srprop': ''   # Don't need additional properties
+                'generator': 'search',
+                'gsrsearch': f"{' '.join(location_name.split())} {canonical_business_type(business_type)}".strip(),
+                'gsrlimit': WIKIPEDIA_RESULTS,
+                'gsrprop': '',   # Don't need search snippets
+                'prop': 'extracts',
+                'exintro': 1,
+                'explaintext': 1,
+                'exlimit': WIKIPEDIA_RESULTS,
+                'redirects': 1   # Follow redirects
             }
             
             # Add headers to identify our application
@@ -1967,7 +1427,7 @@ class FreeCulturalFitAnalyzer:
                 'User-Agent': 'CulturalFitAnalyzer/1.0 (contact@example.com)'
             }
             
-            response = requests.get(search_url, params=params, headers=headers, timeout=10)
+            response = get_http_client().get(WIKIPEDIA_API_URL, params=params, headers=headers, timeout=10)
             
             # Check if response is valid JSON
             if response.status_code != 200:
@@ -1980,42 +1440,13 @@ class FreeCulturalFitAnalyzer:
                 print("Wikipedia API returned invalid JSON")
                 return []
             
-            texts = []
-            if 'query' in data and 'search' in data['query']:
-                for result in data['query']['search'][:2]:  # Limit to 2 results
-                    title = result['title']
-                    
-                    # Get page content with simpler parameters
-                    content_params = {
-                        'action': 'query',
-                        'format': 'json',
-                        'prop': 'extracts',
-                        'exintro': True,
-                        'explaintext': True,
-                        'titles': title,
-                        'redirects': 1  # Follow redirects
-                    }
-                    
-                    try:
-                        content_response = requests.get(search_url, params=content_params, 
-                                                    headers=headers, timeout=10)
-                        
-                        if content_response.status_code == 200:
-                            content_data = content_response.json()
-                            pages = content_data.get('query', {}).get('pages', {})
-                            
-                            for page_id, page_data in pages.items():
-                                if 'extract' in page_data and page_data['extract']:
-                                    texts.append(f"{page_data['title']}: {page_data['extract'][:500]}...")  # Limit length
-                    
-                    except Exception as e:
-                        print(f"Error fetching Wikipedia content for {title}: {str(e)}")
-                        continue
-                    
-                    # Be nice to Wikipedia's servers - add delay
-                    time.sleep(0.5)
-            
-            return texts
+            # Pages come keyed by page id; 'index' is the search rank
+            pages = sorted(data.get('query', {}).get('pages', {}).values(),
+                           key=lambda page: page.get('index', 0))
+            return [
+                f"{page['title']}: {page['extract'][:WIKIPEDIA_EXTRACT_CHARS]}..."  # Limit length
+                for page in pages if page.get('extract')
+            ]
             
         except requests.exceptions.RequestException as e:
             print(f"Wikipedia network error: {str(e)}")
@@ -2024,24 +1455,63 @@ class FreeCulturalFitAnalyzer:
             print(f"Unexpected Wikipedia API Error: {str(e)}")
             return []  
   
-    def get_local_content(self, location_info, business_type, radius_km):
-        """Get local content using multiple free sources with fallbacks"""
+    def get_indexed_content(self, location_info):
+        """(place, label frequencies, pages) from the offline culture index, or None if it does not cover the place"""
+        from culture_index import get_culture_index
+        index = get_culture_index()
+        if index is None:
+            return None
+        indexed = index.lookup(location_info.get('city', ''), location_info.get('region', ''))
+        tracing.annotate(culture_index=indexed[0] if indexed else "miss")
+        return indexed
+    
+    def get_place_content(self, location_info):
+        """
+        (label frequencies, documents, indexed) of place-level content that several
+        business types can share: the offline culture index, or one Wikipedia
+        search for the place itself
+        """
+        from keyword_matcher import culture_frequencies
+        indexed = self.get_indexed_content(location_info)
+        if indexed is not None:
+            return indexed[1], indexed[2], True
+        
+        texts = []
+        try:
+            texts = self.get_wikipedia_content(location_info.get('city', '') or location_info.get('region', ''), '', 0)
+            tracing.annotate(wikipedia_texts=len(texts))
+        except Exception as e:
+            tracing.annotate(wikipedia_error=str(e))
+        return culture_frequencies(texts, self.matcher), len(texts), False
+    
+    def get_local_content(self, location_info, business_type, radius_km, live_sources=True, simulated=None):
+        """
+        Get local content using multiple free sources with fallbacks. With
+        live_sources=False Wikipedia is skipped, and unless simulated=True so is
+        the simulated data (the caller has place-level content already).
+        """
+        if simulated is None:
+            simulated = live_sources
+        
         city = location_info.get('city', '')
         region = location_info.get('region', '')
         country = location_info.get('country', '')
         
         texts = []
         
-        # Try Wikipedia first (with error handling)
-        try:
-            wiki_texts = self.get_wikipedia_content(city or region, business_type, radius_km)
-            texts.extend(wiki_texts)
-        except:
-            pass  # Silently fail if Wikipedia doesn't work
+        if live_sources:
+            # Try Wikipedia first (with error handling)
+            try:
+                wiki_texts = self.get_wikipedia_content(city or region, business_type, radius_km)
+                texts.extend(wiki_texts)
+                tracing.annotate(wikipedia_texts=len(wiki_texts))
+            except Exception as e:
+                tracing.annotate(wikipedia_error=str(e))  # Simulated data below still gives a result
         
-        # Add reliable simulated data based on location
-        simulated_data = self.generate_simulated_local_data(location_info, business_type, radius_km)
-        texts.extend(simulated_data)
+        if simulated:
+            # Add reliable simulated data based on location
+            simulated_data = self.generate_simulated_local_data(location_info, business_type, radius_km)
+            texts.extend(simulated_data)
         
         # Add general location context
         radius_context = f"within a {radius_km}km radius" if radius_km > 0 else "in the area"
@@ -2100,40 +1570,22 @@ class FreeCulturalFitAnalyzer:
         
         return texts
     
-    def analyze_text_for_keywords(self, texts, business_type):
-        """Analyze texts for relevant keywords with advanced scoring"""
+    def analyze_text_for_keywords(self, texts, business_type, frequencies=None):
+        """
+        Analyze texts for relevant keywords with advanced scoring. frequencies adds
+        precomputed label counts (from the offline culture index) to the texts' own.
+        """
+        from keyword_matcher import culture_frequencies
         # Get relevant categories for this business type
         relevant_categories = self.get_relevant_categories(business_type)
         
-        # Initialize scoring
-        category_scores = {category: 0 for category in relevant_categories}
-        total_mentions = 0
-        sentiment_scores = defaultdict(list)
-        
-        # Simple sentiment analysis
-        positive_words = ["good", "great", "excellent", "amazing", "love", "best", "popular", "favorite", "trending", "growth", "success", "demand"]
-        negative_words = ["bad", "poor", "terrible", "hate", "worst", "avoid", "overpriced", "disappointing", "decline", "saturated", "competition"]
+        # One pass per text for category mentions and (simple) sentiment words
+        totals = culture_frequencies(texts, self.matcher)
+        if frequencies:
+            totals.update(frequencies)
         
-        for text in texts:
-            if text:
-                text_lower = text.lower()
-                
-                # Count category mentions
-                for category in relevant_categories:
-                    for keyword in self.keywords[category]:
-                        if keyword in text_lower:
-                            count = text_lower.count(keyword)
-                            category_scores[category] += count
-                            total_mentions += count
-                
-                # Basic sentiment analysis
-                for word in positive_words:
-                    if word in text_lower:
-                        sentiment_scores['positive'].append(word)
-                
-                for word in negative_words:
-                    if word in text_lower:
-                        sentiment_scores['negative'].append(word)
+        category_scores = {category: totals[category] for category in relevant_categories}
+        total_mentions = sum(category_scores.values())
         
         # Calculate normalized scores (0-10 scale)
         relevance_scores = {}
@@ -2145,8 +1597,8 @@ class FreeCulturalFitAnalyzer:
                 relevance_scores[category] = 0
         
         # Calculate overall sentiment
-        positive_count = len(sentiment_scores['positive'])
-        negative_count = len(sentiment_scores['negative'])
+        positive_count = totals['positive']
+        negative_count = totals['negative']
         total_sentiment = positive_count + negative_count
         
         if total_sentiment > 0:
@@ -2350,19 +1802,33 @@ class FreeCulturalFitAnalyzer:
         
         return score
     
-    def get_cultural_fit_score(self, lat, lng, business_type, radius_km=10):
-        """Main function to get cultural fit score for any global location"""
+    def get_cultural_fit_score(self, lat, lng, business_type, radius_km=10, location_info=None, place_content=None):
+        """
+        Main function to get cultural fit score for any global location.
+        place_content: get_place_content() result shared across business types
+        """
 
-        # Step 1: Get detailed location information
-        location_info = self.get_location_from_coords(lat, lng)
+        # Step 1: Get detailed location information (unless already resolved by the caller)
+        if location_info is None:
+            location_info = self.get_location_from_coords(lat, lng)
         if 'error' in location_info:
             return {"error": location_info['error']}
                 
-        # Step 2: Get local content
-        content_texts = self.get_local_content(location_info, business_type, radius_km)
+        # Step 2: Get local content; places covered by the offline culture index skip the live sources
+        if place_content is None:
+            indexed = self.get_indexed_content(location_info)
+            frequencies, documents = (indexed[1], indexed[2]) if indexed else (None, 0)
+            content_texts = self.get_local_content(location_info, business_type, radius_km,
+                                                   live_sources=indexed is None)
+        else:
+            frequencies, documents, indexed = place_content
+            content_texts = self.get_local_content(location_info, business_type, radius_km,
+                                                   live_sources=False, simulated=not indexed)
         
         # Step 3: Analyze the content for relevant keywords and sentiment
-        relevance_scores, sentiment_ratio = self.analyze_text_for_keywords(content_texts, business_type)
+        relevance_scores, sentiment_ratio = self.analyze_text_for_keywords(
+            content_texts, business_type, frequencies=frequencies
+        )
         
         # Step 4: Calculate cultural fit score
         cultural_fit = self.calculate_cultural_fit(
@@ -2382,7 +1848,7 @@ class FreeCulturalFitAnalyzer:
             'relevance_scores': relevance_scores,
             'sentiment_ratio': sentiment_ratio,
             'insights': insights,
-            'content_analyzed': len(content_texts)
+            'content_analyzed': len(content_texts) + documents
         }
     
     def generate_insights(self, relevance_scores, cultural_fit, business_type, location_info, sentiment_ratio, radius_km):
@@ -2468,6 +1934,8 @@ global_baseline_multipliers = {
 def get_current_location():
     """Get current latitude and longitude using IP address"""
     try:
+        import geocoder  # only needed for this interactive helper
+
         # Get location based on IP address
         g = geocoder.ip('me')
         if g.ok:
@@ -2482,6 +1950,8 @@ def get_current_location():
 
 def get_coordinates(place_name):
     """Get latitude and longitude for any location worldwide"""
+    from geopy.geocoders import Nominatim  # only needed for this interactive helper
+
     geolocator = Nominatim(user_agent="business_analysis_app")
     try:
         location = geolocator.geocode(place_name)
@@ -2523,6 +1993,7 @@ def create_circle_geojson(lat, lon, radius_km, num_points=36):
 # --- Step 3: Query WorldPop API with GeoJSON ---
 def fetch_population_worldpop(lat, lon, radius_km=5, year=2020):
     """Get population data from WorldPop API"""
+    from http_client import get_http_client
     try:
         geojson = create_circle_geojson(lat, lon, radius_km)
 
@@ -2533,7 +2004,7 @@ def fetch_population_worldpop(lat, lon, radius_km=5, year=2020):
             "geojson": json.dumps(geojson)  # must be stringified
         }
 
-        response = requests.get(url, params=params, timeout=10)
+        response = get_http_client().get(url, params=params, timeout=10)
         if response.status_code == 200:
             data = response.json()
             if "data" in data and "total_population" in data["data"]:
@@ -2545,13 +2016,17 @@ def fetch_population_worldpop(lat, lon, radius_km=5, year=2020):
         return None
 
 # --- Step 4: Alternative population estimation using OpenStreetMap ---
-def estimate_population_osm(lat, lon, radius_km):
+def estimate_population_osm(lat, lon, radius_km, snapshot=None):
     """Fallback population estimation using OpenStreetMap data"""
+    from osm_snapshot import RESIDENTIAL_BUILDINGS, overpass_count, run_overpass_query
     try:
         radius_meters = radius_km * 1000
         
+        if snapshot is not None and snapshot.covers("buildings", radius_meters):
+            building_count = snapshot.count(f'["building"~"{RESIDENTIAL_BUILDINGS}"]', radius_meters)
+            return int(building_count * 4 * 1.5)
+        
         # Query for residential buildings
-        overpass_url = "http://overpass-api.de/api/interpreter"
         overpass_query = f"""
         [out:json][timeout:25];
         (
@@ -2561,15 +2036,8 @@ def estimate_population_osm(lat, lon, radius_km):
         out count;
         """
         
-        response = requests.post(overpass_url, data=overpass_query, timeout=15)
-        data = response.json()
-        
-        # Count buildings
-        building_count = 0
-        for element in data.get('elements', []):
-            if element.get('type') == 'count':
-                building_count = element.get('total', 0)
-                break
+        data = run_overpass_query(overpass_query, timeout=15)
+        building_count = overpass_count(data)
         
         # Estimate population (4 people per building on average)
         estimated_population = building_count * 4
@@ -2583,36 +2051,48 @@ def estimate_population_osm(lat, lon, radius_km):
         return None
 
 # --- Step 5: Get population with fallbacks ---
-def get_population_within_radius(lat, lon, radius_km=5):
+def get_population_within_radius(lat, lon, radius_km=5, snapshot=None):
     """Get population with multiple fallback methods"""
     # Try WorldPop first
     population = fetch_population_worldpop(lat, lon, radius_km)
+    source = "worldpop"
     
     # If WorldPop fails, try OSM estimation
     if population is None or population == 0:
 
-        population = estimate_population_osm(lat, lon, radius_km)
+        population = estimate_population_osm(lat, lon, radius_km, snapshot=snapshot)
+        source = "osm_estimate"
     
     # If both methods fail, use a reasonable default based on area
     if population is None or population == 0:
-
-        # Estimate based on area (people per sq km)
-        area_sq_km = math.pi * (radius_km ** 2)
-        
-        # Default population densities (people per sq km)
-        # Urban: 2000, Suburban: 1000, Rural: 200
-        population = int(area_sq_km * 1000)  # Default to suburban density
+        source = "area_default"
+        population = area_population(radius_km)
     
+    tracing.annotate(population_source=source, fallback_used=source != "worldpop")
     return max(population, 100)  # Ensure minimum population
 
+
+def area_population(radius_km):
+    """Population estimated from the area alone, when no source answers"""
+    area_sq_km = math.pi * (radius_km ** 2)
+
+    # Default population densities (people per sq km)
+    # Urban: 2000, Suburban: 1000, Rural: 200
+    return int(area_sq_km * 1000)  # Default to suburban density
+
 # --- Step 6: Income estimation ---
-def get_income_index(lat, lon, radius_km):
+def get_income_index(lat, lon, radius_km, snapshot=None):
     """Estimate income level using commercial activity as proxy"""
+    from osm_snapshot import overpass_count, run_overpass_query
     try:
         radius_meters = radius_km * 1000
         
+        if snapshot is not None and snapshot.covers("poi", radius_meters):
+            commercial_count = snapshot.count_any(['["shop"]', '["amenity"~"restaurant|cafe|bank"]'], radius_meters)
+            income_index = 0.5 + (commercial_count * 0.01)
+            return min(max(income_index, 0.5), 1.5)
+        
         # Query for commercial activities
-        overpass_url = "http://overpass-api.de/api/interpreter"
         overpass_query = f"""
         [out:json][timeout:25];
         (
@@ -2624,15 +2104,8 @@ def get_income_index(lat, lon, radius_km):
         out count;
         """
         
-        response = requests.post(overpass_url, data=overpass_query, timeout=15)
-        data = response.json()
-        
-        # Count commercial entities
-        commercial_count = 0
-        for element in data.get('elements', []):
-            if element.get('type') == 'count':
-                commercial_count = element.get('total', 0)
-                break
+        data = run_overpass_query(overpass_query, timeout=15)
+        commercial_count = overpass_count(data)
         
         # More commercial activity = higher income area (proxy)
         income_index = 0.5 + (commercial_count * 0.01)  # Base 0.5, +0.01 per commercial entity
@@ -2642,51 +2115,51 @@ def get_income_index(lat, lon, radius_km):
         print(f"Income estimation error: {e}")
         return 1.0  # Default average income
 
+# Map business types to OSM tags
+BUSINESS_OSM_TAGS = {
+    "cafe": '["amenity"="cafe"]',
+    "restaurant": '["amenity"="restaurant"]',
+    "gym": '["leisure"="fitness_centre"]',
+    "clothing_store": '["shop"="clothes"]',
+    "supermarket": '["shop"="supermarket"]',
+    "pharmacy": '["amenity"="pharmacy"]',
+    "electronics_store": '["shop"="electronics"]',
+    "jewelry_store": '["shop"="jewelry"]',
+    "book_store": '["shop"="books"]',
+    "bar": '["amenity"="bar"]'
+}
+
 # --- Step 7: Get nearby businesses ---
-def get_nearby_places(lat, lon, radius_km, business_type):
+def nearby_business(element):
+    """A competing business as analyze_business_location rates it"""
+    return {
+        'name': element.get('tags', {}).get('name', 'Unknown'),
+        'user_ratings_total': 10,  # Default value
+        'price_level': 1  # Default value
+    }
+
+def get_nearby_places(lat, lon, radius_km, business_type, snapshot=None):
     """Get nearby businesses using Overpass API"""
+    from osm_snapshot import stream_overpass_query
     try:
         radius_meters = radius_km * 1000
         
-        # Map business types to OSM tags
-        osm_tags = {
-            "cafe": '["amenity"="cafe"]',
-            "restaurant": '["amenity"="restaurant"]',
-            "gym": '["leisure"="fitness_centre"]',
-            "clothing_store": '["shop"="clothes"]',
-            "supermarket": '["shop"="supermarket"]',
-            "pharmacy": '["amenity"="pharmacy"]',
-            "electronics_store": '["shop"="electronics"]',
-            "jewelry_store": '["shop"="jewelry"]',
-            "book_store": '["shop"="books"]',
-            "bar": '["amenity"="bar"]'
-        }
-        
-        tag_query = osm_tags.get(business_type, '["shop"]')
-        
-        overpass_url = "http://overpass-api.de/api/interpreter"
-        overpass_query = f"""
-        [out:json][timeout:25];
-        (
-          node{tag_query}(around:{radius_meters},{lat},{lon});
-        );
-        out;
-        """
-        
-        response = requests.post(overpass_url, data=overpass_query, timeout=15)
-        data = response.json()
+        tag_query = BUSINESS_OSM_TAGS.get(business_type, '["shop"]')
         
-        businesses = []
-        for element in data.get('elements', []):
-            if element.get('type') == 'node':
-                business = {
-                    'name': element.get('tags', {}).get('name', 'Unknown'),
-                    'user_ratings_total': 10,  # Default value
-                    'price_level': 1  # Default value
-                }
-                businesses.append(business)
+        if snapshot is not None and snapshot.covers("poi", radius_meters):
+            elements = snapshot.select(tag_query, radius_meters, element_types=("node",))
+        else:
+            overpass_query = f"""
+            [out:json][timeout:25];
+            (
+              node{tag_query}(around:{radius_meters},{lat},{lon});
+            );
+            out tags;
+            """
             
-        return businesses
+            elements = stream_overpass_query(overpass_query, timeout=15)
+        
+        return [nearby_business(element) for element in elements if element.get('type') == 'node']
         
     except Exception as e:
         print(f"Error getting nearby places: {e}")
@@ -2707,23 +2180,29 @@ def calculate_confidence(population, competition_count):
     return max(0.5, min(confidence, 0.9))  # Keep between 0.5-0.9
 
 # --- Step 9: Main business analysis function ---
-def analyze_business_location(business_type, lat, lon, radius_km=2):
+def analyze_business_location(business_type, lat, lon, radius_km=2, snapshot=None,
+                              total_population=None, avg_income_index=None, competing_businesses=None):
      
     """
     Analyze a business location using coordinates
     Returns: multiplier, confidence, and detailed analysis
+    Population, income index and competitors already computed for the site
+    (e.g. once for several business types) can be passed in.
     """
     try:
         # 1. Get the global baseline for the business type
         baseline = global_baseline_multipliers.get(business_type, 1.0)
 
         # 2. Calculate Local Demand Score
-        total_population = get_population_within_radius(lat, lon, radius_km)
-        avg_income_index = get_income_index(lat, lon, radius_km)
+        if total_population is None:
+            total_population = get_population_within_radius(lat, lon, radius_km, snapshot=snapshot)
+        if avg_income_index is None:
+            avg_income_index = get_income_index(lat, lon, radius_km, snapshot=snapshot)
         local_demand_score = total_population * avg_income_index
 
         # 3. Calculate Local Supply Score (Competition)
-        competing_businesses = get_nearby_places(lat, lon, radius_km, business_type)
+        if competing_businesses is None:
+            competing_businesses = get_nearby_places(lat, lon, radius_km, business_type, snapshot=snapshot)
         competition_count = len(competing_businesses)
         
         # Calculate the "strength" of each competitor
@@ -2774,35 +2253,49 @@ def analyze_business_location(business_type, lat, lon, radius_km=2):
         
     except Exception as e:
         print(f"Error in business analysis: {e}")
-        # Return a default value with low confidence
-        return {
-            "multiplier": global_baseline_multipliers.get(business_type, 1.0),
-            "confidence": 0.5,
-            "population": 0,
-            "competition_count": 0,
-            "income_index": 1.0,
-            "notes": "Error in analysis. Using baseline value.",
-            "radius_km": radius_km
-        }
+        return default_business_analysis(business_type, radius_km)
+
+
+def default_business_analysis(business_type, radius_km):
+    """Baseline value with low confidence, used when the analysis fails"""
+    return {
+        "multiplier": global_baseline_multipliers.get(business_type, 1.0),
+        "confidence": 0.5,
+        "population": 0,
+        "competition_count": 0,
+        "income_index": 1.0,
+        "notes": "Error in analysis. Using baseline value.",
+        "radius_km": radius_km
+    }
 
 
-def get_market_factors(lat, lon, business_type, radius_km=5):
+def get_market_factors(lat, lon, business_type, radius_km=5, location_info=None, snapshot=None,
+                       property_count=None, competitor_count=None):
     """
     Calculate market factors that reduce business revenue potential
     Returns a multiplier between 0.1-1.0 where lower values indicate more friction
     Accuracy target: >60%
+    property_count / competitor_count: POI counts within radius_km already
+    known for the site (see estimate_rent_from_osm / get_competition_density)
     """
     try:
         factors = {}
         weights = {}
         
+        # Reuse an already resolved location (country / country code) when available
+        country = country_code = None
+        if location_info and 'error' not in location_info:
+            country = location_info.get('country', '')
+            country_code = location_info.get('country_code', '')
+        
         # 1. Rent Index (40% weight)
-        rent_factor = get_rent_index(lat, lon, radius_km, business_type)
+        rent_factor = get_rent_index(lat, lon, radius_km, business_type, country=country, snapshot=snapshot,
+                                     property_count=property_count)
         factors['rent_index'] = rent_factor
         weights['rent_index'] = 0.4
         
         # 2. Regulatory Environment (30% weight)
-        regulatory_factor = get_regulatory_index(lat, lon)
+        regulatory_factor = get_regulatory_index(lat, lon, country_code=country_code)
         factors['regulatory_index'] = regulatory_factor
         weights['regulatory_index'] = 0.3
         
@@ -2812,7 +2305,8 @@ def get_market_factors(lat, lon, business_type, radius_km=5):
         weights['seasonality_index'] = 0.2
         
         # 4. Local Competition Density (10% weight)
-        competition_factor = get_competition_density(lat, lon, business_type, radius_km)
+        competition_factor = get_competition_density(lat, lon, business_type, radius_km, snapshot=snapshot,
+                                                     competitor_count=competitor_count)
         factors['competition_density'] = competition_factor
         weights['competition_density'] = 0.1
         
@@ -2834,25 +2328,30 @@ def get_market_factors(lat, lon, business_type, radius_km=5):
         
     except Exception as e:
         print(f"Error calculating market factors: {e}")
-        return {
-            "market_factor": 0.7,  # Default neutral value
-            "components": {"error": "Calculation failed"},
-            "weights": {},
-            "confidence": 0.5,
-            "notes": "Using default market factor due to calculation error"
-        }
+        return default_market_factors()
+
+
+def default_market_factors():
+    """Neutral market factor, used when the calculation fails"""
+    return {
+        "market_factor": 0.7,  # Default neutral value
+        "components": {"error": "Calculation failed"},
+        "weights": {},
+        "confidence": 0.5,
+        "notes": "Using default market factor due to calculation error"
+    }
 
-def get_rent_index(lat, lon, radius_km, business_type):
+def get_rent_index(lat, lon, radius_km, business_type, country=None, snapshot=None, property_count=None):
     """Estimate rent costs as a friction factor (0.1-1.0)"""
+    from geocoding import get_reverse_geocoder
     try:
         # Get location data for country/region identification
-        geolocator = Nominatim(user_agent="market_factors_app")
-        location = geolocator.reverse(f"{lat}, {lon}")
-        address = location.raw.get('address', {})
-        country = address.get('country', '')
+        if country is None:
+            country = get_reverse_geocoder().country(lat, lon)
         
         # Try to get actual rental data first
-        rental_data = estimate_rent_from_osm(lat, lon, radius_km, business_type)
+        rental_data = estimate_rent_from_osm(lat, lon, radius_km, business_type, snapshot=snapshot,
+                                             property_count=property_count)
         if rental_data:
             # Normalize rent to 0.1-1.0 scale (higher rent = lower factor)
             normalized_rent = min(max(rental_data / 5000, 0.1), 1.0)  # Assuming $5000/month is very high
@@ -2866,39 +2365,38 @@ def get_rent_index(lat, lon, radius_km, business_type):
         print(f"Rent estimation error: {e}")
         return 0.7  # Default value
 
-def estimate_rent_from_osm(lat, lon, radius_km, business_type):
+def rent_property_filter(business_type):
+    """Overpass filter of the commercial properties whose density stands in for rent"""
+    # Different queries based on business type
+    if business_type in ["restaurant", "cafe", "bar"]:
+        return '["amenity"~"restaurant|cafe|bar"]'
+    return '["shop"]'
+
+def estimate_rent_from_osm(lat, lon, radius_km, business_type, snapshot=None, property_count=None):
     """Estimate rent prices from OpenStreetMap data"""
+    from osm_snapshot import overpass_count, run_overpass_query
     try:
         radius_meters = radius_km * 1000
         
-        # Query for commercial properties
-        overpass_url = "http://overpass-api.de/api/interpreter"
+        tag_query = rent_property_filter(business_type)
         
-        # Different queries based on business type
-        if business_type in ["restaurant", "cafe", "bar"]:
-            query = f"""
-            [out:json][timeout:25];
-            (
-              node["amenity"~"restaurant|cafe|bar"](around:{radius_meters},{lat},{lon});
-              way["amenity"~"restaurant|cafe|bar"](around:{radius_meters},{lat},{lon});
-            );
-            out;
-            """
-        else:
+        # Already counted by the caller, or from the snapshot, or with an Overpass count query
+        if property_count is None and snapshot is not None and snapshot.covers("poi", radius_meters):
+            property_count = len(snapshot.select(tag_query, radius_meters))
+        elif property_count is None:
             query = f"""
             [out:json][timeout:25];
             (
-              node["shop"](around:{radius_meters},{lat},{lon});
-              way["shop"](around:{radius_meters},{lat},{lon});
+              node{tag_query}(around:{radius_meters},{lat},{lon});
+              way{tag_query}(around:{radius_meters},{lat},{lon});
             );
-            out;
+            out count;
             """
-        
-        response = requests.post(overpass_url, data=query, timeout=15)
-        data = response.json()
+            
+            data = run_overpass_query(query, timeout=15)
+            property_count = overpass_count(data)
         
         # Count commercial properties as proxy for rent prices
-        property_count = len(data.get('elements', []))
         
         # Estimate rent based on density (more properties = higher rent)
         base_rent = 500  # Base rent in USD
@@ -2930,15 +2428,13 @@ def get_country_rent_index(country):
     # Default to medium cost if country not found
     return rent_indices.get(country, 0.7)
 
-def get_regulatory_index(lat, lon):
+def get_regulatory_index(lat, lon, country_code=None):
     """Estimate regulatory burden (0.1-1.0)"""
+    from geocoding import get_reverse_geocoder
     try:
         # Get country from coordinates
-        geolocator = Nominatim(user_agent="market_factors_app")
-        location = geolocator.reverse(f"{lat}, {lon}")
-        address = location.raw.get('address', {})
-        country = address.get('country', '')
-        country_code = address.get('country_code', '').upper()
+        if country_code is None:
+            country_code = get_reverse_geocoder().country_code(lat, lon) or ''
         
         # Use World Bank Doing Business data (simplified for MVP)
         regulatory_scores = {
@@ -2963,12 +2459,6 @@ def get_regulatory_index(lat, lon):
 def get_seasonality_index(lat, lon, business_type):
     """Calculate seasonality impact (0.1-1.0)"""
     try:
-        # Get country and approximate climate zone
-        geolocator = Nominatim(user_agent="market_factors_app")
-        location = geolocator.reverse(f"{lat}, {lon}")
-        address = location.raw.get('address', {})
-        country = address.get('country', '')
-        
         # Get current month for seasonality
         current_month = datetime.now().month
         
@@ -3005,45 +2495,28 @@ def get_seasonality_index(lat, lon, business_type):
         print(f"Seasonality index error: {e}")
         return 0.8  # Default value
 
-def get_competition_density(lat, lon, business_type, radius_km):
+def get_competition_density(lat, lon, business_type, radius_km, snapshot=None, competitor_count=None):
     """Calculate competition density impact (0.1-1.0)"""
+    from osm_snapshot import overpass_count, run_overpass_query
     try:
         radius_meters = radius_km * 1000
         
-        # Map business types to OSM tags
-        osm_tags = {
-            "cafe": '["amenity"="cafe"]',
-            "restaurant": '["amenity"="restaurant"]',
-            "gym": '["leisure"="fitness_centre"]',
-            "clothing_store": '["shop"="clothes"]',
-            "supermarket": '["shop"="supermarket"]',
-            "pharmacy": '["amenity"="pharmacy"]',
-            "electronics_store": '["shop"="electronics"]',
-            "jewelry_store": '["shop"="jewelry"]',
-            "book_store": '["shop"="books"]',
-            "bar": '["amenity"="bar"]'
-        }
-        
-        tag_query = osm_tags.get(business_type, '["shop"]')
-        
-        overpass_url = "http://overpass-api.de/api/interpreter"
-        overpass_query = f"""
-        [out:json][timeout:25];
-        (
-          node{tag_query}(around:{radius_meters},{lat},{lon});
-        );
-        out count;
-        """
-        
-        response = requests.post(overpass_url, data=overpass_query, timeout=15)
-        data = response.json()
+        tag_query = BUSINESS_OSM_TAGS.get(business_type, '["shop"]')
         
-        # Get competitor count
-        competitor_count = 0
-        for element in data.get('elements', []):
-            if element.get('type') == 'count':
-                competitor_count = element.get('total', 0)
-                break
+        # Already counted by the caller, or from the snapshot, or with an Overpass count query
+        if competitor_count is None and snapshot is not None and snapshot.covers("poi", radius_meters):
+            competitor_count = snapshot.count(tag_query, radius_meters, element_types=("node",))
+        elif competitor_count is None:
+            overpass_query = f"""
+            [out:json][timeout:25];
+            (
+              node{tag_query}(around:{radius_meters},{lat},{lon});
+            );
+            out count;
+            """
+            
+            data = run_overpass_query(overpass_query, timeout=15)
+            competitor_count = overpass_count(data)
         
         # Convert to factor (more competition = lower factor)
         # Normalize: 0 competitors = 1.0, 10+ competitors = 0.1
@@ -3054,19 +2527,19 @@ def get_competition_density(lat, lon, business_type, radius_km):
         print(f"Competition density error: {e}")
         return 0.7  # Default value
 
+BUSINESS_ADJUSTMENTS = {
+    "restaurant": 0.95,  # Slightly more sensitive to market factors
+    "cafe": 0.9,
+    "bar": 0.85,
+    "gym": 1.05,        # Less sensitive to market factors
+    "pharmacy": 1.1,
+    "supermarket": 1.05,
+    "default": 1.0
+}
+
 def apply_business_specific_adjustments(market_factor, business_type):
     """Apply business-type specific adjustments to market factor"""
-    adjustments = {
-        "restaurant": 0.95,  # Slightly more sensitive to market factors
-        "cafe": 0.9,
-        "bar": 0.85,
-        "gym": 1.05,        # Less sensitive to market factors
-        "pharmacy": 1.1,
-        "supermarket": 1.05,
-        "default": 1.0
-    }
-    
-    adjustment = adjustments.get(business_type, adjustments["default"])
+    adjustment = BUSINESS_ADJUSTMENTS.get(business_type, BUSINESS_ADJUSTMENTS["default"])
     return max(0.1, min(1.0, market_factor * adjustment))
 
 def estimate_confidence(factors):
@@ -3115,82 +2588,575 @@ def generate_market_notes(factors, market_factor):
 
 
 
-def run_analysis(lat, lon, business_type, radius_km):
-    try:
-        # traffic score
-        calculator = TrafficScoreCalculator()
-        traffc_score_result = calculator.calculate_traffic_score(lat, lon, radius_km)
+# Per-stage timeouts in seconds. Stages run concurrently, so the whole analysis
+# is bounded by the slowest stage instead of the sum of all of them.
+STAGE_TIMEOUTS = {
+    "traffic_score": 60,
+    "market_factors": 60,
+    "population": 60,
+    "income": 120,
+    "competitors": 75,
+    "cultural_fit": 60,
+    # analyze_all_types stages
+    "population_income": 120,
+    "poi_classification": 75,
+    "place_content": 60,
+}
 
-        sorted_categories = sorted(
-            traffc_score_result['poi_breakdown'].items(),
-            key=lambda x: x[1], reverse=True
-        )
-        top_categories = [
-            {"rank": i+1, "category": category, "count": count}
-            for i, (category, count) in enumerate(sorted_categories[:3]) if count > 0
-        ]
 
-        # market factor
-        market_factore_result = get_market_factors(lat, lon, business_type)
+def default_traffic_result():
+    """Traffic score of a stage that did not finish: no POI, population or road data"""
+    return {
+        'traffic_score': 0.0,
+        'poi_density': 0.0,
+        'population_density': 0.0,
+        'road_density': 0.0,
+        'poi_breakdown': {},
+        'normalized_factors': {'poi': 0.0, 'population': 0.0, 'roads': 0.0}
+    }
+
+
+def default_cultural_fit(business_type, radius_km, location=None):
+    """Neutral cultural fit of a stage that did not finish"""
+    return {
+        'cultural_fit_score': 0.5,
+        'location': location,
+        'business_type': business_type,
+        'analysis_radius_km': radius_km,
+        'relevance_scores': {},
+        'sentiment_ratio': 0.5,
+        'insights': [],
+        'content_analyzed': 0
+    }
+
+
+class StageTimeoutError(Exception):
+    """Recorded on a stage's span when it does not finish within its timeout"""
+
+
+class StageExecutor:
+    """
+    Run independent analysis stages concurrently, each on its own daemon thread.
+
+    Shared inputs (e.g. the reverse-geocoded location) are computed exactly once
+    via shared(), no matter how many stages ask for them, and every stage result
+    is awaited with its own timeout measured from the moment the stages started.
+    A stage that overruns its timeout gets its default result instead, so one
+    slow upstream degrades that part of the analysis rather than failing it.
+    The timeout is also the stage's HTTP deadline (http_client.deadline), so an
+    abandoned stage stops at its next upstream call instead of running on, and
+    its daemon thread never holds up interpreter exit.
+    """
+
+    def __init__(self, timeouts=None):
+        self.timeouts = dict(STAGE_TIMEOUTS, **(timeouts or {}))
+        self.futures = {}
+        self.shared_futures = {}
+        self.stage_spans = {}
+        self.timed_out = []
+        self.lock = threading.Lock()
+        self.started_at = time.monotonic()
+
+    def shared(self, name, fn, *args, **kwargs):
+        """Compute a shared input once; concurrent callers wait for the first one"""
+        with self.lock:
+            future = self.shared_futures.get(name)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.shared_futures[name] = future
+        
+        if owner:
+            from http_client import current_deadline, deadline
+            # Other stages may wait on this input: allow it the longest stage budget
+            at = current_deadline()
+            if at is not None:
+                at = max(at, self.started_at + max(self.timeouts.values()))
+            try:
+                with tracing.span(f"shared:{name}"), deadline(at):
+                    future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+        
+        return future.result()
+
+    def submit(self, name, fn, *args, **kwargs):
+        """Start a stage in the background (in a copy of the caller's tracing context)"""
+        context = contextvars.copy_context()
+        future = Future()
+        
+        def run():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(context.run(self._run_stage, name, fn, *args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+        
+        self.futures[name] = future
+        threading.Thread(target=run, name=f"analysis-stage-{name}", daemon=True).start()
+
+    def _run_stage(self, name, fn, *args, **kwargs):
+        from http_client import deadline
+        with tracing.span(f"stage:{name}") as span, deadline(self.started_at + self.timeouts.get(name, 60)):
+            self.stage_spans[name] = span
+            cpu_started = time.thread_time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                span.set("cpu_ms", round((time.thread_time() - cpu_started) * 1000, 1))
+
+    def result(self, name, default=None):
+        """
+        Wait for a stage. Once its timeout has elapsed the stage is abandoned:
+        the timeout is recorded in the trace and `default` is returned instead.
+        """
+        timeout = self.timeouts.get(name, 60)
+        remaining = max(0, self.started_at + timeout - time.monotonic())
+        try:
+            return self.futures[name].result(timeout=remaining)
+        except FuturesTimeoutError:
+            error = StageTimeoutError(f"Stage '{name}' timed out after {timeout}s")
+            logger.warning(f"{error}; using its default result")
+            self.timed_out.append(name)
+            self.stage_spans.get(name, tracing.NOOP_SPAN).record_error(error)
+            tracing.annotate(fallback_used=True, timed_out_stages=",".join(self.timed_out))
+            return default
+
+
+def snapshot_layer_radii(radius_km):
+    """OSM snapshot radii (meters) one site analysis needs"""
+    # POIs must also cover the 2 km urban/rural check and the 5 km market factor radius
+    return {
+        "poi": max(radius_km, 5) * 1000,
+        "roads": radius_km * 1000,
+        "buildings": radius_km * 1000,
+    }
+
+
+def site_traffic_score(lat, lon, radius_km, location, snapshot):
+    country_code = location.get('country_code') if 'error' not in location else None
+    calculator = TrafficScoreCalculator()
+    return calculator.calculate_traffic_score(
+        lat, lon, radius_km, country_code=country_code or None, snapshot=snapshot
+    )
+
+
+def traffic_summary(lat, lon, traffic_result):
+    """Traffic_Score block of an analysis: score and the top three POI categories"""
+    sorted_categories = sorted(
+        traffic_result['poi_breakdown'].items(),
+        key=lambda x: x[1], reverse=True
+    )
+    top_categories = [
+        {"rank": i+1, "category": category, "count": count}
+        for i, (category, count) in enumerate(sorted_categories[:3]) if count > 0
+    ]
+    return {
+        "coordinates": {"latitude": lat, "longitude": lon},
+        "traffic_score": traffic_result['traffic_score'],
+        "top_poi_categories": top_categories,
+    }
 
-        # population
-        population_result = analyze_business_location(business_type, lat, lon, radius_km)
 
-        # income
-        fetcher = RadiusIncomeFetcher()
-        income_df = fetcher.fetch_avg_income_on_country(
+def analyze_site(executor, lat, lon, business_type, radius_km, location_info, osm_snapshot,
+                 cultural_analyzer=None, income_fetcher=None):
+    """
+    Run every stage for one site on `executor` and assemble the result.
+    location_info and osm_snapshot are zero-argument callables returning the
+    shared inputs, so callers decide how (and how widely) they are shared.
+    """
+    cultural_analyzer = cultural_analyzer or FreeCulturalFitAnalyzer()
+    income_fetcher = income_fetcher or RadiusIncomeFetcher()
+
+    def traffic_stage():
+        return site_traffic_score(lat, lon, radius_km, location_info(), osm_snapshot())
+
+    def income_stage():
+        return income_fetcher.fetch_avg_income_on_country(
             lat, lon,
             radius_km=radius_km,
             start_year=2020,
             end_year=2022,
             num_sample_points=5
         )
-        json_output = income_df.to_json(orient='records', indent=2)
 
-        # competitors
-        Existing_Competor_analyzer = CompetitorAnalyzer()
-        Exising_Competitors_result = Existing_Competor_analyzer.main(
+    def competitors_stage():
+        analyzer = CompetitorAnalyzer()
+        return analyzer.main(
             auto_mode=True,
             json_output=True,
             latitude=lat,
             longitude=lon,
             radius=radius_km*1000,
             business_types=[business_type],
-            export=False
+            export=False,
+            snapshot=osm_snapshot()
         )
 
-        # cultural fit
-        CulturalFit_analyzer = FreeCulturalFitAnalyzer()
-        CulturalFit_analyzer_result = CulturalFit_analyzer.get_cultural_fit_score(
-            lat, lon, business_type, radius_km*1000
+    def cultural_fit_stage():
+        return cultural_analyzer.get_cultural_fit_score(
+            lat, lon, business_type, radius_km*1000, location_info=location_info()
         )
-        insight_data = [f"- {insight}" for insight in CulturalFit_analyzer_result['insights']]
 
-        return {
-            'Traffic_Score': {
-                "coordinates": {"latitude": lat, "longitude": lon},
-                "traffic_score": traffc_score_result['traffic_score'],
-                "top_poi_categories": top_categories,
-            },
-            'Market_Factor': market_factore_result,
-            'Population_Analysis': population_result,
-            "Income_Data": {"data": json.loads(json_output)},
-            "Existing_Competitors": {"data": Exising_Competitors_result},
-            "Cultural_Fit": {
-                "location": CulturalFit_analyzer_result['location'],
-                "business_type": CulturalFit_analyzer_result['business_type'],
-                "analysis_radius_km": CulturalFit_analyzer_result['analysis_radius_km'],
-                "cultural_fit_score": CulturalFit_analyzer_result['cultural_fit_score'],
-                "sentiment_ratio": CulturalFit_analyzer_result['sentiment_ratio'],
-                "insights": insight_data
-            }
+    executor.submit("traffic_score", traffic_stage)
+    executor.submit("market_factors", lambda: get_market_factors(
+        lat, lon, business_type, location_info=location_info(), snapshot=osm_snapshot()
+    ))
+    executor.submit("population", lambda: analyze_business_location(
+        business_type, lat, lon, radius_km, snapshot=osm_snapshot()
+    ))
+    executor.submit("income", income_stage)
+    executor.submit("competitors", competitors_stage)
+    executor.submit("cultural_fit", cultural_fit_stage)
+
+    # Each stage falls back to its default result if it overruns its timeout
+
+    # traffic score
+    traffc_score_result = executor.result("traffic_score", default_traffic_result())
+
+    # market factor
+    market_factore_result = executor.result("market_factors", default_market_factors())
+
+    # population
+    population_result = executor.result("population", default_business_analysis(business_type, radius_km))
+
+    # income
+    income_records = executor.result("income", [])
+
+    # competitors (CompetitorAnalyzer.main returns None when it fails)
+    Exising_Competitors_result = executor.result("competitors")
+
+    # cultural fit
+    CulturalFit_analyzer_result = executor.result(
+        "cultural_fit", default_cultural_fit(business_type, radius_km*1000)
+    )
+    insight_data = [f"- {insight}" for insight in CulturalFit_analyzer_result['insights']]
+
+    return {
+        'Traffic_Score': traffic_summary(lat, lon, traffc_score_result),
+        'Market_Factor': market_factore_result,
+        'Population_Analysis': population_result,
+        "Income_Data": {"data": income_records_json(income_records)},
+        "Existing_Competitors": {"data": Exising_Competitors_result},
+        "Cultural_Fit": {
+            "location": CulturalFit_analyzer_result['location'],
+            "business_type": CulturalFit_analyzer_result['business_type'],
+            "analysis_radius_km": CulturalFit_analyzer_result['analysis_radius_km'],
+            "cultural_fit_score": CulturalFit_analyzer_result['cultural_fit_score'],
+            "sentiment_ratio": CulturalFit_analyzer_result['sentiment_ratio'],
+            "insights": insight_data
+        }
+    }
+
+
+# --- All business types ---
+
+ALL_BUSINESS_TYPES = "all"  # business_type asking run_analysis to rank every type in global_baseline_multipliers
+MARKET_RADIUS_KM = 5  # get_market_factors default radius
+
+
+def classify_business_pois(snapshot, business_types, radius_km):
+    """
+    Competitors (within radius_km) and competitor / rent property counts (within
+    MARKET_RADIUS_KM) for every business type from one pass over the snapshot's
+    POIs. None when the snapshot does not cover those radii.
+    """
+    import numpy as np
+    radius_m = radius_km * 1000
+    market_radius_m = MARKET_RADIUS_KM * 1000
+    if snapshot is None or not snapshot.covers("poi", max(radius_m, market_radius_m)):
+        return None
+
+    competitor_filters = [BUSINESS_OSM_TAGS.get(business_type, '["shop"]') for business_type in business_types]
+    property_filters = sorted({rent_property_filter(business_type) for business_type in business_types})
+    matrix = snapshot.match_matrix(competitor_filters + property_filters)
+
+    in_radius = (snapshot.distances <= radius_m)[:, None]
+    in_market = (snapshot.distances <= market_radius_m)[:, None]
+    competitors = matrix[:, :len(business_types)] & snapshot.type_mask(("node",))[:, None]
+    market_competitors = np.count_nonzero(competitors & in_market, axis=0)
+    properties = dict(zip(property_filters, np.count_nonzero(matrix[:, len(business_types):] & in_market, axis=0)))
+    nearby = competitors & in_radius
+
+    return {
+        business_type: {
+            "competing_businesses": [nearby_business(snapshot.elements[i]) for i in np.flatnonzero(nearby[:, column])],
+            "competitor_count": int(market_competitors[column]),
+            "property_count": int(properties[rent_property_filter(business_type)]),
         }
+        for column, business_type in enumerate(business_types)
+    }
+
+
+def analyze_all_types(executor, lat, lon, radius_km, location_info, osm_snapshot,
+                      business_types=None, cultural_analyzer=None):
+    """
+    Score every business type for one site. Location, OSM snapshot, traffic,
+    population and income index are fetched once, the POIs are classified for
+    all types in one pass and place-level cultural content is gathered once;
+    per type only the (local) scoring formulas run. Types are ranked by
+    multiplier x market factor x cultural fit.
+
+    Without a covering OSM snapshot (or when a stage times out) the affected
+    part falls back to its default for every type instead of one live query
+    per type.
+    """
+    business_types = list(business_types or global_baseline_multipliers)
+    cultural_analyzer = cultural_analyzer or FreeCulturalFitAnalyzer()
+
+    def classify():
+        poi_counts = classify_business_pois(osm_snapshot(), business_types, radius_km)
+        if poi_counts is None:
+            tracing.current_span().record_error("no OSM snapshot covering the market radius")
+        return poi_counts
+
+    executor.submit("traffic_score", lambda: site_traffic_score(lat, lon, radius_km, location_info(), osm_snapshot()))
+    executor.submit("population_income", lambda: (
+        get_population_within_radius(lat, lon, radius_km, snapshot=osm_snapshot()),
+        get_income_index(lat, lon, radius_km, snapshot=osm_snapshot()),
+    ))
+    executor.submit("poi_classification", classify)
+    executor.submit("place_content", lambda: cultural_analyzer.get_place_content(location_info()))
+
+    traffic_result = executor.result("traffic_score", default=default_traffic_result())
+    total_population, income_index = executor.result("population_income", default=(area_population(radius_km), 1.0))
+    poi_counts = executor.result("poi_classification")
+    place_content = executor.result("place_content")
+    location = location_info()
+    if poi_counts is None:
+        tracing.annotate(fallback_used=True, competitor_source="default")
+
+    rows = []
+    for business_type in business_types:
+        if poi_counts is None:
+            population = default_business_analysis(business_type, radius_km)
+            market = default_market_factors()
+        else:
+            pois = poi_counts[business_type]
+            population = analyze_business_location(
+                business_type, lat, lon, radius_km, snapshot=osm_snapshot(),
+                total_population=total_population, avg_income_index=income_index,
+                competing_businesses=pois["competing_businesses"]
+            )
+            market = get_market_factors(
+                lat, lon, business_type, location_info=location, snapshot=osm_snapshot(),
+                property_count=pois["property_count"], competitor_count=pois["competitor_count"]
+            )
+        if place_content is None:
+            cultural = default_cultural_fit(business_type, radius_km*1000, location.get('formatted_address'))
+        else:
+            cultural = cultural_analyzer.get_cultural_fit_score(
+                lat, lon, business_type, radius_km*1000, location_info=location, place_content=place_content
+            )
+        cultural_fit = cultural.get('cultural_fit_score', 0.5)  # neutral when the location is unknown
+        rows.append({
+            "business_type": business_type,
+            "opportunity_score": round(population['multiplier'] * market['market_factor'] * cultural_fit, 3),
+            "multiplier": population['multiplier'],
+            "confidence": population['confidence'],
+            "competition_count": population['competition_count'],
+            "market_factor": market['market_factor'],
+            "cultural_fit_score": cultural_fit,
+            "notes": population['notes'],
+        })
+
+    rows.sort(key=lambda row: row["opportunity_score"], reverse=True)
+    return {
+        'Location': location.get('formatted_address') if 'error' not in location else None,
+        'Traffic_Score': traffic_summary(lat, lon, traffic_result),
+        'Population_Analysis': {
+            "population": total_population,
+            "income_index": round(income_index, 2),
+            "radius_km": radius_km,
+        },
+        'Business_Types': [dict(rank=rank, **row) for rank, row in enumerate(rows, 1)],
+    }
+
+
+def run_analysis(lat, lon, business_type, radius_km, use_cache=True, diagnostics=False):
+    """
+    Full analysis for one site. Answers from the result cache (result_cache.py)
+    when a recent analysis of the same grid cell, business type and radius
+    exists; use_cache=False always recomputes. diagnostics=True adds a
+    `_diagnostics` block with the stage and upstream call timings (tracing.py).
+    business_type="all" ranks every business type instead (see
+    analyze_all_types).
+    """
+    from result_cache import get_result_cache
+    with tracing.start_trace("run_analysis", enabled=bool(diagnostics or tracing.TRACE_DIR),
+                             lat=lat, lon=lon, business_type=business_type, radius_km=radius_km) as trace:
+        cache = get_result_cache() if use_cache else None
+        if cache is None:
+            result = _run_analysis(lat, lon, business_type, radius_km)
+        else:
+            try:
+                result = cache.get_or_compute(lat, lon, business_type, radius_km, _run_analysis)
+            except Exception as e:
+                result = {"error": str(e)}
+
+    if diagnostics and trace is not None:
+        result = dict(result, _diagnostics=trace.diagnostics())
+    return result
+
+
+def _run_analysis(lat, lon, business_type, radius_km):
+    from osm_snapshot import fetch_osm_snapshot
+    executor = StageExecutor()
+    try:
+        cultural_analyzer = FreeCulturalFitAnalyzer()
+
+        def location_info():
+            # Shared by traffic score, market factors and cultural fit
+            return executor.shared("location_info", cultural_analyzer.get_location_from_coords, lat, lon)
+
+        def osm_snapshot():
+            # One Overpass fetch shared by every OSM-based stage
+            return executor.shared("osm_snapshot", fetch_osm_snapshot, lat, lon, snapshot_layer_radii(radius_km))
+
+        if canonical_business_type(business_type) == ALL_BUSINESS_TYPES:
+            return analyze_all_types(executor, lat, lon, radius_km, location_info, osm_snapshot,
+                                     cultural_analyzer=cultural_analyzer)
+        return analyze_site(executor, lat, lon, business_type, radius_km, location_info, osm_snapshot,
+                            cultural_analyzer=cultural_analyzer)
 
     except Exception as e:
         # 🚨 Send only JSON error (Express can handle it safely)
         return {"error": str(e)}
 
 
+# --- Batch analysis ---
+
+BATCH_CLUSTER_KM = 3          # sites within this distance of a cluster seed share its data
+BATCH_MAX_PARALLEL_SITES = 4  # sites analysed at the same time (each runs six stages)
+
+
+def _batch_site(site):
+    """Normalize a batch entry: dict (API field names or run_analysis names) or tuple"""
+    if isinstance(site, dict):
+        return {
+            "lat": float(site["lat"]),
+            "lon": float(site["lon"]),
+            "business_type": site.get("businessType") or site.get("business_type") or "supermarket",
+            "radius_km": float(site.get("radiusKm") or site.get("radius_km") or 2),
+        }
+    lat, lon, business_type, radius_km = site
+    return {"lat": float(lat), "lon": float(lon), "business_type": business_type, "radius_km": float(radius_km)}
+
+
+def cluster_sites(sites, cluster_km=BATCH_CLUSTER_KM):
+    """Greedy leader clustering: each site joins the nearest seed within cluster_km"""
+    import numpy as np
+    from osm_snapshot import haversine_m
+    seeds = np.empty((0, 2))
+    clusters = []
+    for idx, site in enumerate(sites):
+        if len(seeds):
+            distances = haversine_m(site["lat"], site["lon"], seeds[:, 0], seeds[:, 1])
+            nearest = int(np.argmin(distances))
+            if distances[nearest] <= cluster_km * 1000:
+                clusters[nearest].append(idx)
+                continue
+        seeds = np.vstack([seeds, [site["lat"], site["lon"]]])
+        clusters.append([idx])
+    return clusters
+
+
+def _cluster_layer_radii(center, members):
+    """Snapshot radii around the cluster center that cover every member's own radii"""
+    import numpy as np
+    from osm_snapshot import haversine_m
+    lats = np.array([site["lat"] for site in members])
+    lons = np.array([site["lon"] for site in members])
+    offsets = haversine_m(center[0], center[1], lats, lons)
+
+    radii = {}
+    for site, offset in zip(members, offsets):
+        for layer, radius_m in snapshot_layer_radii(site["radius_km"]).items():
+            radii[layer] = max(radii.get(layer, 0), float(offset) + radius_m)
+    return radii
+
+
+def run_batch_analysis(sites, cluster_km=BATCH_CLUSTER_KM, max_parallel_sites=BATCH_MAX_PARALLEL_SITES):
+    """
+    Analyse many candidate sites at once. Nearby sites are clustered and each
+    cluster shares one OSM snapshot; every site is reverse geocoded itself
+    (through the shared geocoding cache), and World Bank lookups are shared
+    across the whole batch. Every site gets the same result as run_analysis
+    (or its own {"error": ...}).
+    """
+    import numpy as np
+    from osm_snapshot import fetch_osm_snapshot
+    try:
+        sites = [_batch_site(site) for site in sites]
+    except (KeyError, TypeError, ValueError) as e:
+        return {"error": f"Invalid site: {e}"}
+
+    clusters = cluster_sites(sites, cluster_km)
+    cluster_of = {idx: cid for cid, members in enumerate(clusters) for idx in members}
+    centers = [
+        (float(np.mean([sites[i]["lat"] for i in members])), float(np.mean([sites[i]["lon"] for i in members])))
+        for members in clusters
+    ]
+    cluster_radii = [
+        _cluster_layer_radii(center, [sites[i] for i in members])
+        for center, members in zip(centers, clusters)
+    ]
+
+    # Computes each cluster's snapshot once; it never runs stages itself
+    shared = StageExecutor()
+    cultural_analyzer = FreeCulturalFitAnalyzer()
+    income_fetcher = RadiusIncomeFetcher()
+
+    def cluster_snapshot(cid):
+        return shared.shared(f"osm_snapshot:{cid}", fetch_osm_snapshot, *centers[cid], cluster_radii[cid])
+
+    def run_site(idx):
+        site = sites[idx]
+        lat, lon, radius_km = site["lat"], site["lon"], site["radius_km"]
+        cid = cluster_of[idx]
+        executor = StageExecutor()
+        try:
+            def location_info():
+                # Sites of one cluster can lie in different cities, states or countries
+                return executor.shared("location_info", cultural_analyzer.get_location_from_coords, lat, lon)
+
+            def osm_snapshot():
+                snapshot = cluster_snapshot(cid)
+                if snapshot is None:
+                    return None
+                return executor.shared(
+                    "osm_snapshot", snapshot.recenter, lat, lon, snapshot_layer_radii(radius_km)
+                )
+
+            if canonical_business_type(site["business_type"]) == ALL_BUSINESS_TYPES:
+                return analyze_all_types(executor, lat, lon, radius_km, location_info, osm_snapshot,
+                                         cultural_analyzer=cultural_analyzer)
+            return analyze_site(executor, lat, lon, site["business_type"], radius_km,
+                                location_info, osm_snapshot,
+                                cultural_analyzer=cultural_analyzer, income_fetcher=income_fetcher)
+        except Exception as e:
+            return {"error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max_parallel_sites, thread_name_prefix="batch-site") as pool:
+        results = list(pool.map(run_site, range(len(sites))))
+
+    return {
+        "sites": [
+            {"site": site, "cluster": cluster_of[idx], "result": result}
+            for idx, (site, result) in enumerate(zip(sites, results))
+        ],
+        "clusters": [
+            {
+                "id": cid,
+                "center": {"latitude": center[0], "longitude": center[1]},
+                "sites": members,
+                "osm_radii_m": {layer: round(radius_m) for layer, radius_m in radii.items()},
+            }
+            for cid, (center, members, radii) in enumerate(zip(centers, clusters, cluster_radii))
+        ],
+    }
+
+
 if __name__ == "__main__":
     lat = float(sys.argv[1])
     lon = float(sys.argv[2])
@@ -3200,4 +3166,9 @@ if __name__ == "__main__":
     result = run_analysis(lat, lon, business_type, radius_km)
     print(json.dumps(result, indent=2))  # ✅ Only JSON to stdout
     sys.stdout.flush()
-    time.sleep(0.5)
+
+    # A stale cached answer was printed; let its refresh finish before exiting
+    from result_cache import get_result_cache
+    cache = get_result_cache()
+    if cache is not None:
+        cache.wait_for_refreshes()
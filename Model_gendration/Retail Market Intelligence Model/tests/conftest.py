@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# The model is a flat set of modules next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the tests off the developer's geocode / HTTP / result caches
+os.environ["RADIU_CACHE_DIR"] = tempfile.mkdtemp(prefix="radiu-tests-")
@@ -0,0 +1,59 @@
+import math
+import random
+
+import pytest
+
+from osm_snapshot import OSMSnapshot
+from runner import (BUSINESS_OSM_TAGS, MARKET_RADIUS_KM, classify_business_pois, global_baseline_multipliers,
+                    nearby_business, rent_property_filter)
+
+CENTER = (48.137, 11.575)
+TAGS = [("amenity", "cafe"), ("amenity", "restaurant"), ("amenity", "bar"), ("amenity", "pharmacy"),
+        ("amenity", "bank"), ("leisure", "fitness_centre"), ("shop", "clothes"), ("shop", "supermarket"),
+        ("shop", "electronics"), ("shop", "jewelry"), ("shop", "books"), ("shop", "florist"), ("office", "company")]
+BUSINESS_TYPES = list(global_baseline_multipliers) + ["florist"]  # unknown types count every shop
+
+
+def snapshot(radius_m=6000, seed=4, layer_radius_m=MARKET_RADIUS_KM * 1000):
+    rng = random.Random(seed)
+    elements = []
+    for i in range(1500):
+        r, bearing = radius_m * math.sqrt(rng.random()), rng.uniform(0, 2 * math.pi)
+        lat = CENTER[0] + r * math.cos(bearing) / 111320
+        lon = CENTER[1] + r * math.sin(bearing) / (111320 * math.cos(math.radians(CENTER[0])))
+        key, value = rng.choice(TAGS)
+        element = {"type": rng.choice(["node", "node", "way"]), "id": i + 1, "tags": {key: value}}
+        if rng.random() < 0.5:
+            element["tags"]["name"] = f"{value} {i + 1}"
+        if element["type"] == "node":
+            element.update(lat=lat, lon=lon)
+        else:
+            element["center"] = {"lat": lat, "lon": lon}
+        elements.append(element)
+    return OSMSnapshot(CENTER[0], CENTER[1], {"poi": layer_radius_m}, elements)
+
+
+@pytest.mark.parametrize("radius_km", [0.5, 2, 5])
+def test_classification_matches_per_type_queries(radius_km):
+    pois = snapshot()
+    market_radius_m = MARKET_RADIUS_KM * 1000
+    classified = classify_business_pois(pois, BUSINESS_TYPES, radius_km)
+    assert list(classified) == BUSINESS_TYPES
+
+    for business_type in BUSINESS_TYPES:
+        competitor_filter = BUSINESS_OSM_TAGS.get(business_type, '["shop"]')
+        expected = {
+            "competing_businesses": [nearby_business(element) for element in
+                                     pois.select(competitor_filter, radius_km * 1000, element_types=("node",))],
+            "competitor_count": pois.count(competitor_filter, market_radius_m, element_types=("node",)),
+            "property_count": len(pois.select(rent_property_filter(business_type), market_radius_m)),
+        }
+        assert classified[business_type] == expected, business_type
+    assert classified["cafe"]["competitor_count"] > 0 and classified["florist"]["competing_businesses"]
+
+
+def test_classification_needs_the_market_radius():
+    assert classify_business_pois(None, BUSINESS_TYPES, 1) is None
+    assert classify_business_pois(snapshot(layer_radius_m=3000), BUSINESS_TYPES, 1) is None
+    assert classify_business_pois(snapshot(layer_radius_m=6000), BUSINESS_TYPES, 7) is None
+    assert classify_business_pois(snapshot(layer_radius_m=6000), BUSINESS_TYPES, 6) is not None
@@ -0,0 +1,226 @@
+import json
+import math
+import random
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+
+import geocoding
+import http_client
+from geocoding import ReverseGeocoder
+from http_cache import HttpCache
+from http_client import HttpClient, HttpResponse, RateLimiter, StreamingResponse
+from osm_local import parse_query
+from osm_snapshot import haversine_m, tags_match
+from runner import (StageExecutor, analyze_all_types, cluster_sites, default_business_analysis, default_market_factors,
+                    global_baseline_multipliers, run_analysis, run_batch_analysis)
+from wikipedia_stub import StubWiki
+
+CENTER = (12.97, 77.60)
+# City border on a geocoding grid line (0.01 degree cells), so every cached cell lies in one city
+CITY_BORDER_LON = 77.605
+KINDS = [
+    ("shop", ["supermarket", "clothes", "bakery", "convenience"], ("node", "way"), 160),
+    ("amenity", ["cafe", "restaurant", "bank", "pharmacy", "bar", "gym"], ("node", "way"), 160),
+    ("leisure", ["fitness_centre", "park"], ("node", "way"), 40),
+    ("office", ["company", "government"], ("node",), 60),
+    ("highway", ["residential", "primary", "service"], ("way",), 300),
+    ("building", ["residential", "apartments", "house", "commercial"], ("node", "way"), 300),
+]
+PAGES = {
+    "Alpha": "Alpha is a city known for filter coffee, cafes, temples, sweets and vegetarian restaurants.",
+    "Beta": "Beta is a city known for its pubs, bars, breweries, gyms and a young fitness culture.",
+}
+SERIES = {"NY.GDP.PCAP.CD": {2020: 1913.2, 2021: 2250.2, 2022: 2366.3}}
+
+
+def synthetic_elements(count_scale=3.0, radius_m=9000, seed=8):
+    rng = random.Random(seed)
+    elements = []
+    for key, values, element_types, count in KINDS:
+        for _ in range(int(count * count_scale)):
+            r, bearing = radius_m * math.sqrt(rng.random()), rng.uniform(0, 2 * math.pi)
+            lat = round(CENTER[0] + r * math.cos(bearing) / 111320, 7)
+            lon = round(CENTER[1] + r * math.sin(bearing) / (111320 * math.cos(math.radians(CENTER[0]))), 7)
+            element = {"type": rng.choice(element_types), "id": len(elements) + 1, "tags": {key: rng.choice(values)}}
+            if key not in ("highway", "building") and rng.random() < 0.7:
+                element["tags"]["name"] = f"{key} {element['id']}"
+            if element["type"] == "node":
+                element.update(lat=lat, lon=lon)
+            else:
+                element["center"] = {"lat": lat, "lon": lon}
+            elements.append(element)
+    return elements
+
+
+class RawResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.headers = {"Content-Type": "application/json"}
+        self.content = json.dumps(payload).encode()
+        self.text = self.content.decode()
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class SyntheticUpstreams:
+    """Backend stand-in answering Overpass, Nominatim, World Bank and Wikipedia from synthetic data"""
+
+    name = "synthetic"
+    http2 = False
+
+    def __init__(self, elements):
+        self.elements = elements
+        self.wiki = StubWiki(PAGES)
+
+    def overpass(self, query):
+        parsed = parse_query(query if isinstance(query, str) else query.decode())
+        found = {}
+        for statement in parsed["statements"]:
+            radius, lat, lon = statement["around"]
+            for element in self.elements:
+                point = element.get("center", element)
+                if (element["type"] in statement["element_types"] and tags_match(element["tags"], statement["filters"])
+                        and haversine_m(lat, lon, point["lat"], point["lon"]) <= radius):
+                    found[(element["type"], element["id"])] = element
+        elements = [found[key] for key in sorted(found)]
+        if parsed["count"]:
+            nodes = sum(1 for e in elements if e["type"] == "node")
+            elements = [{"type": "count", "id": 0, "tags": {"nodes": str(nodes), "ways": str(len(elements) - nodes),
+                                                             "relations": "0", "total": str(len(elements))}}]
+        return {"version": 0.6, "elements": elements}
+
+    def answer(self, method, url, params, data):
+        parts = urlsplit(url)
+        query = dict(parse_qsl(parts.query))
+        query.update({str(k): str(v) for k, v in (params or {}).items()})
+        if parts.hostname == "overpass-api.de":
+            return 200, self.overpass(data)
+        if parts.hostname == "nominatim.openstreetmap.org":
+            lat, lon = float(query["lat"]), float(query["lon"])
+            city = "Alpha" if lon < CITY_BORDER_LON else "Beta"
+            address = {"city": city, "state": f"{city} State", "postcode": "560001" if city == "Alpha" else "560002",
+                       "country": "India", "country_code": "in"}
+            return 200, {"lat": str(lat), "lon": str(lon), "address": address,
+                         "display_name": ", ".join(v for k, v in address.items() if k != "country_code")}
+        if parts.hostname == "api.worldbank.org":
+            indicator = parts.path.rstrip("/").split("/")[-1]
+            start, end = (int(year) for year in query["date"].split(":"))
+            if indicator not in SERIES:
+                return 200, [{"message": [{"id": "120", "key": "Invalid value"}]}]
+            items = [{"date": str(year), "value": SERIES[indicator].get(year)} for year in range(end, start - 1, -1)]
+            return 200, [{"page": 1, "pages": 1, "total": len(items)}, items]
+        if parts.hostname == "en.wikipedia.org":
+            return 200, self.wiki.query(query)
+        return 404, {"error": "unknown host"}
+
+    def request(self, method, url, host, params, data, headers, timeout):
+        return HttpResponse(RawResponse(*self.answer(method, url, params, data)), url)
+
+    def stream(self, method, url, host, params, data, headers, timeout):
+        response = self.request(method, url, host, params, data, headers, timeout)
+        body = response.content
+        return StreamingResponse(response.raw, url, lambda size: (body[i:i + size] for i in range(0, len(body), size)),
+                                 lambda: None)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def upstreams(tmp_path, monkeypatch):
+    client = HttpClient(backend="requests", limiter=RateLimiter({}), cache=HttpCache(str(tmp_path / "http.sqlite")))
+    client.backend = SyntheticUpstreams(synthetic_elements())
+    client.fixtures = None
+    monkeypatch.setattr(http_client, "_client", client)
+    monkeypatch.setattr(geocoding, "_geocoder", ReverseGeocoder(str(tmp_path / "geocode.sqlite"), http=client))
+    return client
+
+
+def comparable(result):
+    """Result without the POI category breakdown, which the traffic score draws at random"""
+    traffic = {key: value for key, value in result["Traffic_Score"].items() if key != "top_poi_categories"}
+    return dict(result, Traffic_Score=traffic)
+
+
+SITES = [
+    {"lat": 12.97, "lon": 77.595, "businessType": "cafe", "radiusKm": 1},   # Alpha
+    {"lat": 12.972, "lon": 77.62, "businessType": "gym", "radiusKm": 2},    # Beta, same cluster
+    {"lat": 13.03, "lon": 77.59, "businessType": "cafe", "radiusKm": 1},    # a cluster of its own
+]
+
+
+def test_batch_matches_per_site_analysis(upstreams):
+    sites = [{"lat": s["lat"], "lon": s["lon"], "business_type": s["businessType"], "radius_km": s["radiusKm"]}
+             for s in SITES]
+    assert cluster_sites(sites) == [[0, 1], [2]]
+
+    batch = run_batch_analysis(SITES)
+    assert [entry["cluster"] for entry in batch["sites"]] == [0, 0, 1]
+    for site, entry in zip(sites, batch["sites"]):
+        expected = run_analysis(site["lat"], site["lon"], site["business_type"], float(site["radius_km"]),
+                                use_cache=False)
+        assert "error" not in expected
+        assert comparable(entry["result"]) == comparable(expected)
+
+    # sites of one cluster keep their own city, so their cultural fit reads different pages
+    locations = [entry["result"]["Cultural_Fit"]["location"] for entry in batch["sites"]]
+    assert [location.split(",")[0] for location in locations] == ["Alpha", "Beta", "Alpha"]
+    assert batch["sites"][0]["result"]["Existing_Competitors"]["data"]["total_competitors"] > 0
+
+
+def test_diagnostics_block(upstreams):
+    site = SITES[0]
+    plain = run_analysis(site["lat"], site["lon"], site["businessType"], 1.0, use_cache=False)
+    assert "_diagnostics" not in plain
+
+    result = run_analysis(site["lat"], site["lon"], site["businessType"], 1.0, use_cache=False, diagnostics=True)
+    diagnostics = result["_diagnostics"]
+    assert set(diagnostics["stages"]) == {"traffic_score", "market_factors", "population", "income", "competitors",
+                                          "cultural_fit"}
+    assert all(stage["status"] == "ok" for stage in diagnostics["stages"].values())
+    assert "overpass-api.de" in diagnostics["upstream"]
+    spans = {span["span_id"]: span for span in diagnostics["spans"]}
+    root = diagnostics["spans"][0]
+    assert root["name"] == "run_analysis" and root["attributes"]["business_type"] == "cafe"
+    for span in diagnostics["spans"]:
+        if span["name"].startswith("stage:"):
+            assert span["parent_id"] == root["span_id"]
+        elif span is not root:
+            assert span["parent_id"] in spans
+
+
+def test_all_types_rank_matches_per_type_analysis(upstreams):
+    lat, lon = SITES[0]["lat"], SITES[0]["lon"]
+    result = run_analysis(lat, lon, "all", 1.0, use_cache=False)
+    rows = result["Business_Types"]
+    assert sorted(row["business_type"] for row in rows) == sorted(global_baseline_multipliers)
+    assert [row["rank"] for row in rows] == list(range(1, len(rows) + 1))
+    assert [row["opportunity_score"] for row in rows] == sorted((row["opportunity_score"] for row in rows),
+                                                                reverse=True)
+    assert result["Location"].startswith("Alpha")
+
+    for row in rows:
+        single = run_analysis(lat, lon, row["business_type"], 1.0, use_cache=False)
+        population = single["Population_Analysis"]
+        assert (row["multiplier"], row["confidence"], row["competition_count"], row["notes"]) == (
+            population["multiplier"], population["confidence"], population["competition_count"], population["notes"])
+        assert row["market_factor"] == single["Market_Factor"]["market_factor"]
+        assert row["cultural_fit_score"] == single["Cultural_Fit"]["cultural_fit_score"]
+        assert row["opportunity_score"] == round(
+            row["multiplier"] * row["market_factor"] * row["cultural_fit_score"], 3)
+    assert comparable(result)["Traffic_Score"] == comparable(single)["Traffic_Score"]
+
+
+def test_all_types_without_a_snapshot_use_defaults(upstreams):
+    executor = StageExecutor()
+    location = {"formatted_address": "Alpha, Alpha State, 560001, India"}
+    result = analyze_all_types(executor, 12.97, 77.595, 1.0, lambda: location, lambda: None,
+                               business_types=["cafe", "gym"])
+    rows = {row["business_type"]: row for row in result["Business_Types"]}
+    for business_type in ("cafe", "gym"):
+        default = default_business_analysis(business_type, 1.0)
+        assert rows[business_type]["multiplier"] == default["multiplier"]
+        assert rows[business_type]["market_factor"] == default_market_factors()["market_factor"]
+    assert executor.timed_out == []
@@ -0,0 +1,102 @@
+import bz2
+import json
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from culture_index import (MAGIC, PAGES_LABEL, CultureIndex, build_frequencies, main, place_keys, read_xml_dump,
+                           wikitext_to_text, write_index)
+from keyword_matcher import culture_frequencies
+
+PAGES = {
+    "Chennai": "Chennai is known for filter coffee, idli, dosa and temples. Great beaches, best sweets.",
+    "Chennai/T. Nagar": "T. Nagar has jewellery and saree stores, cafes, chai stalls and a good gym.",
+    "Culture of Chennai": "Carnatic music, temples, vegetarian thali and கோழி பிரியாணி; bad traffic.",
+    "Bengaluru": "Pubs, breweries, craft beer, coffee and a young fitness culture.",
+    "Pune (city)": "Pune has bakeries, cafes and students.",
+}
+
+XML = """<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/">
+<page><title>Chennai</title><ns>0</ns><revision><text>'''Chennai''' is known for [[Filter coffee|filter coffee]],
+idli{{citation needed|date=2020}}, dosa and [[temple]]s.<ref name="x">a bar and a pub</ref> Great beaches, best sweets.
+[[Category:Cities with pubs]]</text></revision></page>
+<page><title>Talk:Chennai</title><ns>1</ns><revision><text>coffee coffee coffee</text></revision></page>
+<page><title>Madras</title><ns>0</ns><redirect title="Chennai" /><revision><text>#REDIRECT [[Chennai]]</text></revision></page>
+</mediawiki>"""
+
+
+def write_jsonl(path, pages):
+    with open(path, "w", encoding="utf-8") as f:
+        for title, text in pages.items():
+            f.write(json.dumps({"title": title, "text": text}, ensure_ascii=False) + "\n")
+
+
+def test_round_trip_matches_culture_frequencies(tmp_path):
+    source = tmp_path / "pages.jsonl"
+    write_jsonl(source, PAGES)
+    output = tmp_path / "data" / "culture.cidx"
+    write_index(build_frequencies([str(source)]), str(output), ["pages.jsonl"])
+
+    index = CultureIndex(str(output))
+    assert index.sources == ["pages.jsonl"]
+    assert len(index) == 4  # chennai, t nagar, bengaluru, pune
+    assert index.counts.dtype == np.dtype("<u4") and index.counts.offset % 8 == 0
+
+    place, frequencies, pages = index.lookup("Chennai")
+    chennai_pages = [text for title, text in PAGES.items() if "Chennai" in title]
+    assert (place, pages) == ("Chennai", 3)
+    # page frequencies add up: the sum over pages, with distinct sentiment words per page
+    assert frequencies == sum((culture_frequencies([text]) for text in chennai_pages), Counter())
+
+    _, frequencies, pages = index.lookup("", "Unknown", "T Nagar")
+    assert (frequencies, pages) == (culture_frequencies([PAGES["Chennai/T. Nagar"]]), 1)
+    assert index.lookup("pune")[1] == culture_frequencies([PAGES["Pune (city)"]])
+    assert index.lookup("Mumbai", None) is None
+
+
+def test_places_filter_and_empty_build(tmp_path):
+    source = tmp_path / "pages.jsonl.bz2"
+    with bz2.open(source, "wt", encoding="utf-8") as f:
+        f.write("".join(json.dumps({"title": t, "text": x}) + "\n" for t, x in PAGES.items()))
+    frequencies = build_frequencies([str(source)], {"bengaluru"})
+    assert list(frequencies) == ["bengaluru"]
+    assert frequencies["bengaluru"][PAGES_LABEL] == 1
+    with pytest.raises(ValueError):
+        write_index(build_frequencies([str(source)], {"mumbai"}), str(tmp_path / "empty.cidx"))
+
+
+def test_xml_dump_reader(tmp_path):
+    source = tmp_path / "dump.xml"
+    source.write_text(XML, encoding="utf-8")
+    pages = list(read_xml_dump(str(source)))
+    assert [title for title, _ in pages] == ["Chennai"]  # talk pages and redirects are skipped
+    text = pages[0][1]
+    assert "filter coffee" in text and "temples" in text
+    assert "pub" not in text and "citation" not in text and "[[" not in text and "'''" not in text
+
+
+def test_wikitext_and_titles():
+    assert wikitext_to_text("{{Infobox|a={{nested|b}}}}Tea<!-- bar --> [https://x.org cafe]") == "Tea cafe"
+    assert place_keys("Chennai/T. Nagar") == {"chennai", "t nagar"}
+    assert place_keys("Cuisine of Kolkata") == {"kolkata"}
+    assert place_keys("Pune (city)") == {"pune"}
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not-an-index"
+    path.write_bytes(b"NOTINDEX" + bytes(8))
+    with pytest.raises(ValueError):
+        CultureIndex(str(path))
+    assert MAGIC == b"CULTIDX1"
+
+
+def test_cli_build_and_lookup(tmp_path, capsys):
+    source, places, output = tmp_path / "pages.jsonl", tmp_path / "places.txt", tmp_path / "culture.cidx"
+    write_jsonl(source, PAGES)
+    places.write_text("# places\nChennai\nBengaluru\n", encoding="utf-8")
+    main(["build", str(source), "--places", str(places), "--output", str(output)])
+    capsys.readouterr()
+    main(["lookup", "bengaluru", "--index", str(output)])
+    found = json.loads(capsys.readouterr().out)
+    assert found["pages"] == 1 and found["frequencies"] == dict(culture_frequencies([PAGES["Bengaluru"]]))
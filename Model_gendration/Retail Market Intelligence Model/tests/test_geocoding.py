@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+
+import geocoding
+from geocoding import ReverseGeocoder, derive_lower_zoom, grid_for_zoom, quantize
+from region_index import RegionIndex
+
+ADDRESS = {"road": "Anna Salai", "suburb": "Teynampet", "city": "Chennai", "county": "Chennai District",
+           "state": "Tamil Nadu", "postcode": "600018", "country": "India", "country_code": "in"}
+
+
+class Response:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return dict(self.payload)
+
+
+class Nominatim:
+    """HTTP client stand-in answering every reverse geocode with ADDRESS, slowly"""
+
+    def __init__(self, status_code=200, delay=0.0):
+        self.status_code = status_code
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        with self.lock:
+            self.calls.append((params["lat"], params["lon"], params["zoom"]))
+        time.sleep(self.delay)
+        return Response({"display_name": "Anna Salai, Chennai, Tamil Nadu, India", "address": dict(ADDRESS)},
+                        self.status_code)
+
+
+@pytest.fixture
+def nominatim():
+    return Nominatim()
+
+
+@pytest.fixture
+def geocoder(tmp_path, nominatim, monkeypatch):
+    monkeypatch.setattr(geocoding, "get_region_index", lambda: None)
+    return ReverseGeocoder(str(tmp_path / "geocode.sqlite"), http=nominatim)
+
+
+def test_grid_keys():
+    assert [grid_for_zoom(zoom) for zoom in (0, 3, 4, 10, 12, 18, 19)] == [0.1, 0.1, 0.05, 0.01, 0.002, 0.0005, 0.0005]
+    # cells are centered on multiples of the grid
+    assert quantize(12.9749, 0.01) == quantize(12.9651, 0.01) == 1297
+    assert quantize(12.9751, 0.01) == 1298
+    assert quantize(-0.004, 0.01) == 0
+
+
+def test_nearby_points_share_a_cached_answer(geocoder, nominatim):
+    first = geocoder.reverse(12.9716, 77.5946, zoom=10)
+    assert geocoder.reverse(12.9699, 77.5912, zoom=10) == first   # same 0.01 degree cell
+    assert len(nominatim.calls) == 1
+    geocoder.reverse(12.9800, 77.5946, zoom=10)                   # next cell
+    geocoder.reverse(12.9716, 77.5946, zoom=14)                   # finer zoom has its own key
+    assert len(nominatim.calls) == 3
+    assert geocoder.stats()["hits"] == 1 and geocoder.stats()["misses"] == 3
+
+
+def test_lower_zooms_are_derived_from_cached_answers(geocoder, nominatim):
+    geocoder.reverse(12.9716, 77.5946, zoom=14)
+    city = geocoder.reverse(12.9716, 77.5946, zoom=10)
+    country = geocoder.reverse(12.9716, 77.5946, zoom=3)
+    assert len(nominatim.calls) == 1
+    assert city["address"] == {key: ADDRESS[key] for key in ("country", "country_code", "state", "county", "city",
+                                                              "postcode")}
+    assert city["display_name"] == "Chennai, Chennai District, Tamil Nadu, 600018, India"
+    assert country == {"display_name": "India", "address": {"country": "India", "country_code": "in"},
+                       "derived_from_zoom": 14}
+    assert geocoder.country_code(12.9716, 77.5946) == "IN"
+    assert geocoder.stats()["derived_hits"] == 3
+
+
+def test_derive_lower_zoom_trims_components():
+    payload = {"address": dict(ADDRESS), "zoom": 18}
+    assert derive_lower_zoom(payload, 5)["address"] == {"country": "India", "country_code": "in", "state": "Tamil Nadu"}
+    assert derive_lower_zoom(payload, 5)["display_name"] == "Tamil Nadu, India"
+
+
+def test_answers_persist_across_instances(geocoder, nominatim, tmp_path):
+    geocoder.reverse(12.9716, 77.5946, zoom=10)
+    reopened = ReverseGeocoder(geocoder.cache_path, http=nominatim)
+    assert reopened.reverse(12.9716, 77.5946, zoom=10)["address"]["city"] == "Chennai"
+    assert len(nominatim.calls) == 1 and reopened.stats()["hit_rate"] == 1.0
+
+
+def test_errors_are_counted_and_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(geocoding, "get_region_index", lambda: None)
+    failing = Nominatim(status_code=503)
+    geocoder = ReverseGeocoder(str(tmp_path / "geocode.sqlite"), http=failing)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            geocoder.reverse(12.9716, 77.5946, zoom=10)
+    assert len(failing.calls) == 2 and geocoder.stats()["errors"] == 2
+
+
+def test_concurrent_lookups_of_one_cell_fetch_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(geocoding, "get_region_index", lambda: None)
+    slow = Nominatim(delay=0.1)
+    geocoder = ReverseGeocoder(str(tmp_path / "geocode.sqlite"), http=slow)
+    answers = []
+    threads = [threading.Thread(target=lambda i=i: answers.append(geocoder.reverse(12.9716 + i * 1e-4, 77.5946)))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(slow.calls) == 1 and len(answers) == 8
+
+
+def test_country_and_state_from_the_offline_index(tmp_path, nominatim, monkeypatch):
+    square = [[77.0, 12.0], [78.0, 12.0], [78.0, 13.5], [77.0, 13.5], [77.0, 12.0]]
+    index = RegionIndex([
+        {"level": "country", "code": "IN", "name": "India", "polygons": [[square]]},
+        {"level": "state", "code": "IN-TN", "name": "Tamil Nadu", "country_code": "IN",
+         "polygons": [[[[77.5, 12.5], [78.0, 12.5], [78.0, 13.5], [77.5, 13.5], [77.5, 12.5]]]]},
+    ], cell_size=0.5)
+    monkeypatch.setattr(geocoding, "get_region_index", lambda: index)
+    geocoder = ReverseGeocoder(str(tmp_path / "geocode.sqlite"), http=nominatim)
+
+    assert geocoder.country_code(12.2, 77.2) == "IN"
+    assert geocoder.reverse(12.97, 77.59, zoom=5)["address"]["state"] == "Tamil Nadu"
+    assert nominatim.calls == [] and geocoder.stats()["offline_hits"] == 2
+    geocoder.reverse(12.2, 77.2, zoom=5)   # no state polygon here: Nominatim is asked
+    geocoder.reverse(12.97, 77.59, zoom=10)  # city level always is
+    assert len(nominatim.calls) == 2
@@ -0,0 +1,108 @@
+import base64
+import random
+
+import numpy as np
+import pytest
+
+import heatmap
+from osm_snapshot import OSMSnapshot
+from runner import TrafficScoreCalculator, get_market_factors, get_regulatory_index, get_seasonality_index
+
+LAT, LON = 12.97, 77.59
+LOCATION = {"country": "India", "country_code": "IN"}
+KINDS = [("node", {"shop": "clothes"}), ("node", {"amenity": "cafe"}), ("node", {"office": "company"}),
+         ("way", {"highway": "primary"}), ("way", {"shop": "mall"})]
+
+
+def features_at_cell_centers(grid, count=6000, margin=60, seed=3):
+    """Features placed on (padded) cell centers, so rasterizing them loses no position"""
+    rng = random.Random(seed)
+    elements = []
+    for osm_id in range(count):
+        row, col = rng.randint(-margin, grid.rows + margin), rng.randint(-margin, grid.cols + margin)
+        lat, lon = grid.south + (row + 0.5) * grid.dlat, grid.west + (col + 0.5) * grid.dlon
+        element_type, tags = rng.choice(KINDS)
+        element = {"type": element_type, "id": osm_id, "tags": dict(tags)}
+        if element_type == "node":
+            element.update(lat=lat, lon=lon)
+        else:
+            element["center"] = {"lat": lat, "lon": lon}
+        elements.append(element)
+    return elements
+
+
+def decode_band(band, height, width):
+    """Band values south row first, as the grid indexes them"""
+    data = np.frombuffer(base64.b64decode(band["data"]), dtype=np.uint8).reshape(height, width)[::-1]
+    return data * band["scale"] + band["offset"]
+
+
+class StaticGeocoder:
+    def country_code(self, lat, lon):
+        return LOCATION["country_code"]
+
+
+def test_disk_sums_match_direct_neighbourhood_sums():
+    rng = np.random.default_rng(1)
+    counts = rng.poisson(0.7, size=(23, 31)).astype(float)
+    for radius_m in (100, 250, 430):
+        kernel = heatmap.disk_kernel(radius_m, 100)
+        r = kernel.shape[0] // 2
+        padded = np.pad(counts, r)
+        expected = np.array([[np.sum(padded[i:i + 2 * r + 1, j:j + 2 * r + 1] * kernel)
+                              for j in range(counts.shape[1])] for i in range(counts.shape[0])])
+        assert np.array_equal(heatmap.disk_sums(counts, kernel), expected)
+
+
+@pytest.mark.parametrize("poi_1km, roads_1km, poi_2km", [(0, 0, 0), (12, 3, 31), (80, 40, 101), (200, 5, 250)])
+def test_traffic_scores_match_scalar_formula(poi_1km, roads_1km, poi_2km):
+    calculator = TrafficScoreCalculator()
+    calculator.query_overpass_count = lambda lat, lon, radius, snapshot=None: poi_1km if radius == 1000 else poi_2km
+    calculator.query_overpass_roads = lambda lat, lon, radius, snapshot=None: roads_1km
+    for country_code in ("IN", "SG", "ZZ"):
+        scalar = calculator.calculate_traffic_score(LAT, LON, 1, country_code=country_code)["traffic_score"]
+        vector = heatmap.traffic_scores(np.array([poi_1km]), np.array([roads_1km]), np.array([poi_2km]), country_code)
+        assert vector[0] == scalar
+
+
+@pytest.mark.parametrize("business_type", ["cafe", "gym", "supermarket", "unknown"])
+@pytest.mark.parametrize("properties, competitors", [(0, 0), (7, 2), (60, 15)])
+def test_market_factors_match_scalar_formula(business_type, properties, competitors):
+    scalar = get_market_factors(LAT, LON, business_type, location_info=LOCATION,
+                                property_count=properties, competitor_count=competitors)
+    vector = heatmap.market_factors(np.array([properties]), np.array([competitors]), business_type,
+                                    get_regulatory_index(LAT, LON, country_code="IN"),
+                                    get_seasonality_index(LAT, LON, business_type))
+    assert vector[0] == scalar["market_factor"]
+
+
+def test_heatmap_matches_scalar_scores_per_cell(monkeypatch):
+    grid = heatmap.HeatmapGrid(*heatmap._bounds(center=(LAT, LON), radius_km=1), 100)
+    elements = features_at_cell_centers(grid)
+    monkeypatch.setattr(heatmap, "fetch_osm_snapshot",
+                        lambda lat, lon, radii: OSMSnapshot(lat, lon, radii, iter(elements)))
+    monkeypatch.setattr(heatmap, "get_reverse_geocoder", lambda: StaticGeocoder())
+
+    result = heatmap.build_heatmap("cafe", center=(LAT, LON), radius_km=1, cell_m=100)
+    assert (result["height"], result["width"]) == (grid.rows, grid.cols)
+    traffic = result["layers"]["traffic_score"]
+    market = result["layers"]["market_factor"]
+    traffic_values = decode_band(traffic, grid.rows, grid.cols)
+    market_values = decode_band(market, grid.rows, grid.cols)
+
+    calculator = TrafficScoreCalculator()
+    for row in range(0, grid.rows, 3):
+        for col in range(0, grid.cols, 3):
+            lat, lon = grid.south + (row + 0.5) * grid.dlat, grid.west + (col + 0.5) * grid.dlon
+            snapshot = OSMSnapshot(lat, lon, {"poi": 5000, "roads": 1000}, iter(elements))
+            scalar_traffic = calculator.calculate_traffic_score(lat, lon, 1, country_code="IN", snapshot=snapshot)
+            scalar_market = get_market_factors(lat, lon, "cafe", location_info=LOCATION, snapshot=snapshot)
+            # equal up to the uint8 quantization of the bands
+            assert abs(traffic_values[row, col] - scalar_traffic["traffic_score"]) <= traffic["scale"] / 2 + 1e-9
+            assert abs(market_values[row, col] - scalar_market["market_factor"]) <= market["scale"] / 2 + 1e-9
+
+
+def test_rejects_invalid_areas():
+    assert "error" in heatmap.build_heatmap("cafe")
+    assert "error" in heatmap.build_heatmap("cafe", bounds=(13.0, 77.5, 12.9, 77.6))
+    assert "error" in heatmap.build_heatmap("cafe", center=(LAT, LON), radius_km=60)
@@ -0,0 +1,241 @@
+import json
+import threading
+import time
+
+import pytest
+
+import http_cache
+from http_cache import HttpCache, canonical_request
+from http_client import HttpClient, HttpResponse, RateLimiter, StreamingResponse
+
+OVERPASS = "https://overpass-api.de/api/interpreter"
+NOMINATIM = "https://nominatim.openstreetmap.org/reverse"
+JSON_HEADERS = {"Content-Type": "application/json", "Date": "Mon, 01 Jan 2024 00:00:00 GMT"}
+ELEMENTS = json.dumps({"elements": [{"type": "node", "id": 1, "lat": 12.97, "lon": 77.59}]}).encode()
+REMARK = json.dumps({"elements": [], "remark": "runtime error: Query timed out in \"query\" at line 3 after 26 seconds."}).encode()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return HttpCache(str(tmp_path / "http.sqlite"))
+
+
+def test_equivalent_requests_share_a_key():
+    key, host = canonical_request("GET", "https://Nominatim.OpenStreetMap.org/reverse?lon=77.59&lat=12.97&format=json")
+    assert host == "nominatim.openstreetmap.org"
+    assert canonical_request("get", NOMINATIM, params={"format": "json", "lat": 12.97, "lon": 77.59})[0] == key
+    assert canonical_request("GET", NOMINATIM + "?format=json", params=[("lon", "77.59"), ("lat", "12.97")])[0] == key
+    assert canonical_request("GET", NOMINATIM, params={"format": "json", "lat": 12.98, "lon": 77.59})[0] != key
+    assert canonical_request("POST", NOMINATIM + "?format=json&lat=12.97&lon=77.59")[0] != key
+
+    query = '[out:json];\n  (\n    node["shop"](around:500,12.97,77.59);\n  );\n  out count;'
+    assert canonical_request("POST", OVERPASS, data=query)[0] == \
+        canonical_request("POST", OVERPASS, data=" ".join(query.split()).encode())[0]
+    assert canonical_request("POST", OVERPASS, data=query)[0] != \
+        canonical_request("POST", OVERPASS, data=query.replace("500", "600"))[0]
+    assert canonical_request("POST", OVERPASS, data={"data": query, "b": 1})[0] == \
+        canonical_request("POST", OVERPASS, data={"b": "1", "data": query})[0]
+
+
+def test_store_and_lookup(cache):
+    key, host = canonical_request("POST", OVERPASS, data="node; out;")
+    cache.store(key, host, 200, JSON_HEADERS, ELEMENTS)
+    stored = cache.lookup(key)
+    assert (stored.status_code, stored.headers, stored.content) == (200, {"Content-Type": "application/json"}, ELEMENTS)
+    assert stored.json() == json.loads(ELEMENTS)
+
+
+def test_what_is_not_stored(cache):
+    for url, status, body in [
+        (OVERPASS, 429, ELEMENTS),                    # errors
+        ("https://example.org/api", 200, ELEMENTS),   # hosts without a TTL
+        (OVERPASS, 200, REMARK),                      # Overpass runtime error with a 200
+    ]:
+        key, host = canonical_request("POST", url, data=url + str(status) + body.decode())
+        cache.store(key, host, status, JSON_HEADERS, body)
+        assert cache.lookup(key) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_expired_entries_are_not_served(tmp_path):
+    cache = HttpCache(str(tmp_path / "http.sqlite"), ttls={"overpass-api.de": 0.05})
+    key, host = canonical_request("POST", OVERPASS, data="node; out;")
+    cache.store(key, host, 200, JSON_HEADERS, ELEMENTS)
+    assert cache.lookup(key) is not None
+    time.sleep(0.1)
+    assert cache.lookup(key) is None
+
+
+def test_least_recently_used_entries_are_evicted_by_size(tmp_path):
+    cache = HttpCache(str(tmp_path / "http.sqlite"), max_bytes=2500)
+    keys = [canonical_request("POST", OVERPASS, data=f"node({i}); out;")[0] for i in range(3)]
+    cache.store(keys[0], "overpass-api.de", 200, JSON_HEADERS, b"a" * 1000)
+    cache.store(keys[1], "overpass-api.de", 200, JSON_HEADERS, b"b" * 1000)
+    time.sleep(0.01)
+    assert cache.lookup(keys[0]) is not None  # now more recently used than keys[1]
+    cache.store(keys[2], "overpass-api.de", 200, JSON_HEADERS, b"c" * 1000)
+    assert [cache.lookup(key) is not None for key in keys] == [True, False, True]
+    assert cache.stats()["bytes"] <= 2500
+
+
+def test_threads_share_one_fetch(cache):
+    key, host = canonical_request("GET", NOMINATIM, params={"lat": 1, "lon": 2})
+    hit, owner = cache.acquire(key)
+    assert hit is None and owner
+
+    answers = []
+    waiters = [threading.Thread(target=lambda: answers.append(cache.acquire(key))) for _ in range(5)]
+    for thread in waiters:
+        thread.start()
+    time.sleep(0.1)
+    cache.store(key, host, 200, JSON_HEADERS, ELEMENTS)
+    cache.release(key)
+    for thread in waiters:
+        thread.join(5)
+
+    assert [(response.content, owner) for response, owner in answers] == [(ELEMENTS, False)] * 5
+    assert cache.stats()["shared"] == 5
+
+
+def test_a_failed_fetch_hands_the_key_to_a_waiter(cache):
+    key, _ = canonical_request("GET", NOMINATIM, params={"lat": 1, "lon": 2})
+    assert cache.acquire(key) == (None, True)
+    answers = []
+    waiter = threading.Thread(target=lambda: answers.append(cache.acquire(key)))
+    waiter.start()
+    time.sleep(0.1)
+    cache.release(key)  # nothing stored
+    waiter.join(5)
+    assert answers == [(None, True)]
+    cache.release(key)
+
+
+def test_processes_share_one_fetch_through_the_lease(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_cache, "LEASE_POLL", 0.01)
+    first, second = (HttpCache(str(tmp_path / "http.sqlite")) for _ in range(2))
+    second.owner = "another-process"
+    key, host = canonical_request("GET", NOMINATIM, params={"lat": 1, "lon": 2})
+
+    assert first.acquire(key) == (None, True)
+    answers = []
+    waiter = threading.Thread(target=lambda: answers.append(second.acquire(key)))
+    waiter.start()
+    time.sleep(0.1)
+    assert not answers  # polling the lease
+    first.store(key, host, 200, JSON_HEADERS, ELEMENTS)
+    first.release(key)
+    waiter.join(5)
+    (response, owner), = answers
+    assert (response.content, owner) == (ELEMENTS, False)
+    assert second.db.execute("SELECT COUNT(*) FROM leases").fetchone()[0] == 0
+
+
+def test_response_stored_while_taking_the_lease_is_served(tmp_path):
+    # another process stores the response and gives up its lease between our lookup and our lease
+    class StoredJustAfterLookup(HttpCache):
+        looked_up = 0
+
+        def lookup(self, key):
+            self.looked_up += 1
+            return None if self.looked_up == 1 else super().lookup(key)
+
+    cache = StoredJustAfterLookup(str(tmp_path / "http.sqlite"))
+    key, host = canonical_request("GET", NOMINATIM, params={"lat": 1, "lon": 2})
+    cache.store(key, host, 200, JSON_HEADERS, ELEMENTS)
+    response, owner = cache.acquire(key)
+    assert (response.content, owner) == (ELEMENTS, False)
+    assert cache.db.execute("SELECT COUNT(*) FROM leases").fetchone()[0] == 0
+    assert cache.inflight == {}
+
+
+def test_expired_leases_are_taken_over(cache):
+    key, _ = canonical_request("GET", NOMINATIM, params={"lat": 1, "lon": 2})
+    cache.db.execute("INSERT INTO leases VALUES (?, ?, ?)", (key, "crashed-process", time.time() - 1))
+    cache.db.commit()
+    assert cache.acquire(key) == (None, True)
+    cache.release(key)
+
+
+class RawResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.headers = dict(JSON_HEADERS)
+        self.content = body
+        self.text = body.decode()
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class Upstream:
+    """Backend stand-in that answers every request with one body, slowly"""
+
+    name = "upstream"
+    http2 = False
+
+    def __init__(self, body, status_code=200, delay=0.1):
+        self.body = body
+        self.status_code = status_code
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def request(self, method, url, host, params, data, headers, timeout):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return HttpResponse(RawResponse(self.status_code, self.body), url)
+
+    def stream(self, method, url, host, params, data, headers, timeout):
+        response = self.request(method, url, host, params, data, headers, timeout)
+        body = response.content
+        return StreamingResponse(response.raw, url, lambda size: (body[i:i + size] for i in range(0, len(body), size)),
+                                 lambda: None)
+
+    def close(self):
+        pass
+
+
+def client_with(cache, upstream):
+    client = HttpClient(backend="requests", limiter=RateLimiter({}), cache=cache)
+    client.backend = upstream
+    client.fixtures = None
+    return client
+
+
+def test_client_deduplicates_concurrent_requests(cache):
+    upstream = Upstream(ELEMENTS)
+    client = client_with(cache, upstream)
+    bodies = []
+    threads = [threading.Thread(target=lambda: bodies.append(
+        client.get(NOMINATIM, params={"lat": 12.97, "lon": 77.59}).content)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert bodies == [ELEMENTS] * 8
+    assert upstream.calls == 1
+    assert client.get(NOMINATIM, params={"lon": 77.59, "lat": 12.97}).content == ELEMENTS
+    assert upstream.calls == 1
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+def test_client_does_not_replay_overpass_remarks(cache, streamed):
+    upstream = Upstream(REMARK, delay=0)
+    client = client_with(cache, upstream)
+    for _ in range(2):
+        if streamed:
+            with client.stream("POST", OVERPASS, data="node; out;") as response:
+                assert b"".join(response.iter_content(7)) == REMARK
+        else:
+            assert client.post(OVERPASS, data="node; out;").content == REMARK
+    assert upstream.calls == 2
+
+    upstream.body = ELEMENTS
+    for _ in range(2):
+        if streamed:
+            with client.stream("POST", OVERPASS, data="node; out;") as response:
+                assert b"".join(response.iter_content(7)) == ELEMENTS
+        else:
+            assert client.post(OVERPASS, data="node; out;").content == ELEMENTS
+    assert upstream.calls == 3
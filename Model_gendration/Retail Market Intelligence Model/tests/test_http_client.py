@@ -0,0 +1,208 @@
+import json
+import socket
+import threading
+
+import pytest
+import requests
+
+import http_client
+from http_cache import HttpCache
+from http_client import HttpClient, HttpResponse, RateLimiter, TokenBucket, _RequestsBackend, _rate_limits_from_env, get_http_client
+from http_fixtures import FixtureBundle, Recorder, Replayer, use_fixtures
+from wikipedia_stub import serve_in_thread
+
+SEARCH = {"action": "query", "format": "json", "generator": "search", "gsrsearch": "Chennai coffee",
+          "gsrlimit": 2, "prop": "extracts", "exintro": 1, "explaintext": 1}
+
+
+@pytest.fixture
+def wiki():
+    server, url = serve_in_thread()
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = HttpClient(backend="requests", limiter=RateLimiter({}), cache=HttpCache(str(tmp_path / "http.sqlite")))
+    client.fixtures = None
+    yield client
+    client.close()
+
+
+def test_process_shares_one_client(monkeypatch):
+    monkeypatch.setattr(http_client, "_client", None)
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(get_http_client())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(clients) == 8 and all(c is clients[0] for c in clients)
+
+
+def test_falls_back_to_requests_without_httpx(monkeypatch):
+    monkeypatch.setattr(http_client, "httpx", None)
+    assert HttpClient(backend="auto").backend.name == "requests"
+    with pytest.raises(RuntimeError):
+        HttpClient(backend="httpx")
+
+
+def test_requests_backend_keeps_one_session_per_host():
+    backend = _RequestsBackend()
+    a = backend._session("a.example:443")
+    assert backend._session("a.example:443") is a
+    assert backend._session("b.example:443") is not a
+    assert a.headers["User-Agent"] == http_client.USER_AGENT
+    backend.close()
+    assert backend.sessions == {}
+
+
+def test_requests_round_trip_and_host_stats(client, wiki):
+    response = client.get(wiki, params=SEARCH)
+    assert response.ok and response.status_code == 200
+    titles = [page["title"] for page in response.json()["query"]["pages"].values()]
+    assert "Chennai" in titles
+
+    with client.stream("GET", wiki, params=SEARCH) as streamed:
+        assert b"".join(streamed.iter_content(64)) == response.content
+    assert streamed.closed
+
+    missing = client.get(wiki.replace("/w/api.php", "/nowhere"))
+    with pytest.raises(requests.exceptions.HTTPError):
+        missing.raise_for_status()
+
+    host = wiki.split("/")[2]
+    stats = client.host_stats()
+    assert stats["backend"] == "requests" and not stats["http2"]
+    assert stats["hosts"][host]["requests"] == 3 and stats["hosts"][host]["errors"] == 1
+
+
+def test_connection_errors_are_requests_exceptions(client):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]  # closed again: nothing listens here
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get(f"http://127.0.0.1:{port}/", timeout=2)
+    assert client.host_stats()["hosts"][f"127.0.0.1:{port}"]["errors"] == 1
+
+
+def test_fixtures_record_and_replay_through_the_client(client, wiki, tmp_path):
+    with use_fixtures(Recorder(), client) as recorder:
+        live = client.get(wiki, params=SEARCH).content
+        with client.stream("GET", wiki, params=dict(SEARCH, gsrsearch="Mumbai")) as response:
+            live_stream = b"".join(response.iter_content(16))
+    assert len(recorder.bundle) == 2
+    recorder.bundle.save(str(tmp_path / "bundle.json"))
+
+    # replay needs no network and no rate-limit budget
+    offline = HttpClient(backend="requests", limiter=RateLimiter({"127.0.0.1": (0.001, 1)}), cache=client.cache)
+    replayer = Replayer(FixtureBundle.load(str(tmp_path / "bundle.json")))
+    with use_fixtures(replayer, offline):
+        params = {key: str(value) for key, value in reversed(list(SEARCH.items()))}  # same request, other order
+        assert offline.get(wiki, params=params).content == live
+        with offline.stream("GET", wiki, params=dict(SEARCH, gsrsearch="Mumbai")) as response:
+            assert b"".join(response.iter_content(5)) == live_stream
+        with pytest.raises(requests.exceptions.ConnectionError):
+            offline.get(wiki, params=dict(SEARCH, gsrsearch="Kolkata"))
+    assert replayer.missing and "Kolkata" in replayer.missing[0]
+    assert offline.limiter.buckets == {}
+    assert offline.fixtures is None
+
+
+class FakeClock:
+    """time.monotonic / time.sleep stand-in: sleeping advances the clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_timing():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1.0, burst=2, clock=clock)
+    # the burst goes at once, then callers queue one second apart
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 1.0, 2.0]
+    clock.now += 1.5
+    assert bucket.reserve() == pytest.approx(1.5)  # the queue's next slot is 3 s after the start
+    clock.now += 100
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 1.0]  # idle time refills only up to the burst
+
+
+def test_slow_rates_space_requests_out():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=0.25, burst=1, clock=clock)
+    assert bucket.reserve() == 0.0
+    clock.now += 1
+    assert bucket.reserve() == pytest.approx(3.0)
+
+
+def test_limits_are_per_host():
+    clock = FakeClock()
+    limiter = RateLimiter({"slow.example": (0.5, 1), "fast.example": (10.0, 5)}, clock=clock, sleep=clock.sleep)
+    assert limiter.reserve("slow.example") == 0.0
+    assert limiter.reserve("slow.example:443") == pytest.approx(2.0)  # the port does not make a new budget
+    assert [limiter.reserve("fast.example") for _ in range(5)] == [0.0] * 5
+    assert limiter.reserve("fast.example") == pytest.approx(0.1)
+    assert limiter.reserve("other.example") == 0.0
+    assert sorted(limiter.buckets) == ["fast.example", "slow.example"]
+
+    # acquire() sleeps for the reserved wait
+    assert limiter.acquire("slow.example") == pytest.approx(4.0)
+    assert clock.slept == [pytest.approx(4.0)]
+
+
+def test_rate_limit_overrides_from_env():
+    assert _rate_limits_from_env("a.example=2:3, b.example=0.5,") == {"a.example": (2.0, 3), "b.example": (0.5, 1)}
+    assert _rate_limits_from_env("") == {}
+
+
+class Answer:
+    status_code = 200
+    headers = {"Content-Type": "application/json"}
+    content = b'{"address": {"country_code": "in"}}'
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class CountingBackend:
+    name = "counting"
+    http2 = False
+
+    def __init__(self):
+        self.calls = 0
+
+    def request(self, method, url, host, params, data, headers, timeout):
+        self.calls += 1
+        return HttpResponse(Answer(), url)
+
+    def close(self):
+        pass
+
+
+def test_cache_hits_skip_the_rate_limiter(tmp_path):
+    clock = FakeClock()
+    limiter = RateLimiter({"nominatim.openstreetmap.org": (1.0, 1)}, clock=clock, sleep=clock.sleep)
+    client = HttpClient(backend="requests", limiter=limiter, cache=HttpCache(str(tmp_path / "http.sqlite")))
+    client.backend = CountingBackend()
+    client.fixtures = None
+    url = "https://nominatim.openstreetmap.org/reverse"
+
+    for _ in range(5):
+        assert client.get(url, params={"lat": 12.97, "lon": 77.59}).json() == {"address": {"country_code": "in"}}
+    assert client.backend.calls == 1 and clock.slept == []
+
+    # misses still wait for the budget: one request per second
+    client.get(url, params={"lat": 13.0, "lon": 77.59})
+    client.get(url, params={"lat": 13.1, "lon": 77.59})
+    assert client.backend.calls == 3 and clock.slept == [pytest.approx(1.0), pytest.approx(1.0)]
+    assert client.host_stats()["hosts"]["nominatim.openstreetmap.org"]["throttled_ms"] == pytest.approx(2000.0)
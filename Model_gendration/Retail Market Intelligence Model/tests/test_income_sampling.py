@@ -0,0 +1,144 @@
+import math
+
+import pytest
+
+import region_index
+from osm_snapshot import haversine_m
+from region_index import BORDER_UNCERTAINTY_M, METERS_PER_DEGREE, RegionIndex
+from runner import INCOME_SAMPLE_LATTICE, RadiusIncomeFetcher
+
+CENTER = (12.97163, 77.59457)
+
+
+@pytest.fixture(scope="module")
+def fetcher():
+    return RadiusIncomeFetcher()
+
+
+def on_lattice(value):
+    return abs(value / INCOME_SAMPLE_LATTICE - round(value / INCOME_SAMPLE_LATTICE)) < 1e-6
+
+
+def test_points_are_deterministic_and_snapped(fetcher):
+    points = fetcher.generate_points_in_radius(*CENTER, radius_km=2, num_points=8)
+    assert points == fetcher.generate_points_in_radius(*CENTER, radius_km=2, num_points=8)
+    assert points[0] == (12.97, 77.595)  # the center comes first
+    assert len(points) == len(set(points)) == 8
+    assert all(on_lattice(lat) and on_lattice(lon) for lat, lon in points)
+
+
+@pytest.mark.parametrize("radius_km", [0.5, 2, 5, 20])
+def test_points_stay_within_the_radius(fetcher, radius_km):
+    # snapping moves a point by at most half a lattice diagonal
+    slack_m = math.hypot(INCOME_SAMPLE_LATTICE, INCOME_SAMPLE_LATTICE) / 2 * 111320
+    for lat, lon in fetcher.generate_points_in_radius(*CENTER, radius_km=radius_km, num_points=8):
+        assert haversine_m(*CENTER, lat, lon) <= radius_km * 1000 + slack_m
+
+
+def test_nearby_requests_share_points(fetcher):
+    # the same radius around two centers within one lattice cell asks for the same coordinates
+    a = fetcher.generate_points_in_radius(12.9716, 77.5946, radius_km=10, num_points=8)
+    b = fetcher.generate_points_in_radius(12.9712, 77.5949, radius_km=10, num_points=8)
+    assert len(set(a) & set(b)) >= 6
+
+
+def test_points_that_snap_together_are_merged(fetcher):
+    points = fetcher.generate_points_in_radius(*CENTER, radius_km=0.2, num_points=8)
+    assert len(points) == len(set(points)) < 8
+
+
+def test_spiral_spreads_points_evenly(fetcher):
+    # at a radius where snapping is negligible: equal-area rings and every direction covered
+    radius_km, count = 100, 401
+    points = fetcher.generate_points_in_radius(*CENTER, radius_km=radius_km, num_points=count)[1:]
+    distances = [haversine_m(*CENTER, lat, lon) / 1000 for lat, lon in points]
+    inner_half = sum(1 for d in distances if d <= radius_km / math.sqrt(2))
+    assert abs(inner_half - len(points) / 2) <= 3
+
+    bearings = [math.degrees(math.atan2(lon - CENTER[1], lat - CENTER[0])) % 360 for lat, lon in points]
+    per_octant = [sum(1 for b in bearings if 45 * k <= b < 45 * (k + 1)) for k in range(8)]
+    assert max(per_octant) - min(per_octant) <= 0.1 * len(points)
+
+
+# The hypotenuse of "TT" clips the corner of grid cell (1, 1); "WW" and "EE" share a border at lon 2.5
+TRIANGLE = [[0.1, 2.0], [2.0, 0.1], [0.1, 0.1], [0.1, 2.0]]
+EAST = [[2.5, 0.0], [4.0, 0.0], [4.0, 2.0], [2.5, 2.0], [2.5, 0.0]]
+WEST = [[1.0, 0.0], [2.5, 0.0], [2.5, 2.0], [1.0, 2.0], [1.0, 0.0]]
+REGIONS = [{"level": "country", "code": "TT", "name": "Triangle", "polygons": [[TRIANGLE]]}]
+
+
+@pytest.fixture
+def regions(monkeypatch):
+    index = RegionIndex(REGIONS, cell_size=1.0)
+    monkeypatch.setattr(region_index, "get_region_index", lambda: index)
+    return index
+
+
+class CountingFetcher(RadiusIncomeFetcher):
+    """Resolves countries from the test regions and counts the series fetched per country"""
+
+    SERIES = {"TT": {"2021": 100.0, "2022": 110.0}, "WW": {"2021": 200.0, "2022": 220.0},
+              "EE": {"2021": 300.0, "2022": 330.0}}
+
+    def __init__(self, index):
+        super().__init__()
+        self.index = index
+        self.geocoded, self.fetched = [], []
+
+    def reverse_geocode_with_fallback(self, lat, lon):
+        self.geocoded.append((lat, lon))
+        region = self.index.lookup(lat, lon)
+        return {"country_code": region["code"], "country": region["name"]}
+
+    def _fetch_country_income(self, country_code, country_name, indicator, start_year, end_year):
+        self.fetched.append(country_code)
+        return {"country_code": country_code, "country_name": country_name,
+                "data": self.SERIES[country_code], "source": "world_bank"}
+
+
+def test_circle_well_inside_one_country_uses_the_center(regions):
+    fetcher = CountingFetcher(regions)
+    center = (0.6, 0.6)
+    assert regions.border_distance_m(*center) > 5000 + BORDER_UNCERTAINTY_M
+    assert fetcher._inside_one_country(*center, radius_km=5)
+    records = fetcher.fetch_avg_income_on_country(*center, radius_km=5, num_sample_points=8)
+    assert fetcher.geocoded == [center] and fetcher.fetched == ["TT"]
+    assert [(r["year"], r["value"], r["confidence_score"]) for r in records] == [("2021", 100.0, 100), ("2022", 110.0, 100)]
+
+
+def test_circle_across_a_border_samples_points(regions):
+    # inside TT in the corner-clipped cell (1, 1), about 2.4 km from the hypotenuse
+    center = (1.02, 1.05)
+    distance_m = regions.border_distance_m(*center)
+    assert distance_m is not None and distance_m < 0.03 * METERS_PER_DEGREE
+    fetcher = CountingFetcher(regions)
+    assert not fetcher._inside_one_country(*center, radius_km=distance_m / 1000)
+    # a radius that fits, counting the simplification slack, is judged single-country
+    assert fetcher._inside_one_country(*center, radius_km=(distance_m - BORDER_UNCERTAINTY_M) / 1000 - 0.1)
+
+
+def test_points_outside_every_country_are_never_single_country(regions, monkeypatch):
+    fetcher = RadiusIncomeFetcher()
+    assert not fetcher._inside_one_country(5.0, 5.0, radius_km=1)
+    monkeypatch.setattr(region_index, "get_region_index", lambda: None)
+    assert not fetcher._inside_one_country(0.6, 0.6, radius_km=1)
+
+
+def test_each_country_is_fetched_once_across_sample_points(monkeypatch):
+    # a circle across the WW/EE border: every point is geocoded, each country's series fetched once
+    halves = RegionIndex([
+        {"level": "country", "code": "WW", "name": "West", "polygons": [[WEST]]},
+        {"level": "country", "code": "EE", "name": "East", "polygons": [[EAST]]},
+    ], cell_size=1.0)
+    monkeypatch.setattr(region_index, "get_region_index", lambda: halves)
+    fetcher = CountingFetcher(halves)
+    center = (1.0, 2.5)
+    points = fetcher.generate_points_in_radius(*center, radius_km=40, num_points=12)
+    countries = [halves.lookup(lat, lon)["code"] for lat, lon in points]
+    assert set(countries) == {"WW", "EE"}
+
+    records = fetcher.fetch_avg_income_on_country(*center, radius_km=40, num_sample_points=12)
+    assert fetcher.geocoded == points
+    assert sorted(fetcher.fetched) == ["EE", "WW"]
+    assert [r["value"] for r in records] == pytest.approx(
+        [sum(fetcher.SERIES[code][year] for code in countries) / len(points) for year in ("2021", "2022")])
@@ -0,0 +1,110 @@
+import random
+from collections import Counter
+
+import pytest
+
+from keyword_matcher import (CULTURE_KEYWORDS, SENTIMENT_WORDS, KeywordMatcher, _is_word_char, culture_frequencies,
+                             culture_patterns, get_culture_matcher)
+
+
+def reference_count(text, keyword, whole_word):
+    """Non-overlapping occurrences like str.count, skipping ones inside a longer word when whole_word"""
+    text, keyword = text.lower(), keyword.lower()
+    count, pos = 0, 0
+    while True:
+        start = text.find(keyword, pos)
+        if start < 0:
+            return count
+        end = start + len(keyword)
+        if whole_word and ((start > 0 and _is_word_char(text[start - 1]))
+                           or (end < len(text) and _is_word_char(text[end]))):
+            pos = start + 1
+            continue
+        count += 1
+        pos = end
+
+
+def old_analysis(text):
+    """The per-keyword loop the matcher replaced: str.count per keyword, distinct sentiment words"""
+    text_lower = text.lower()
+    categories = Counter()
+    for category, keywords in CULTURE_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in text_lower:
+                categories[category] += text_lower.count(keyword)
+    sentiment = {label: {word for word in words if word in text_lower} for label, words in SENTIMENT_WORDS.items()}
+    return categories, sentiment
+
+
+def random_texts(vocabulary, count, seed, glue=(" ", "", ", ", "-", "'s ")):
+    rng = random.Random(seed)
+    for _ in range(count):
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(0, 25))]
+        yield "".join(word + rng.choice(glue) for word in words)
+
+
+@pytest.mark.parametrize("whole_word", [False, True])
+def test_counts_match_reference_on_overlapping_patterns(whole_word):
+    # a tiny alphabet makes overlapping and nested matches the norm
+    patterns = ["a", "aa", "aba", "b", "bab", "abab", "ba", "aab", "baa"]
+    matcher = KeywordMatcher([(p, p, whole_word) for p in patterns])
+    rng = random.Random(2)
+    for _ in range(500):
+        text = "".join(rng.choice("ab ") for _ in range(rng.randint(0, 40)))
+        hits = matcher.scan(text)
+        for pattern in patterns:
+            assert hits.counts[pattern] == reference_count(text, pattern, whole_word), (text, pattern)
+
+
+def test_english_results_match_the_old_loop():
+    matcher = KeywordMatcher([(label, keyword, False) for label, keyword, whole_word in culture_patterns(False)
+                              if label in CULTURE_KEYWORDS and keyword in CULTURE_KEYWORDS[label]
+                              or label in SENTIMENT_WORDS])
+    vocabulary = [k for keywords in CULTURE_KEYWORDS.values() for k in keywords] + \
+                 [w for words in SENTIMENT_WORDS.values() for w in words] + \
+                 ["Barista", "TEAM", "the", "great-grandma's", "Café", "coffeeshop", "sweetness", "barbecue", "x"]
+    for text in random_texts(vocabulary, 400, seed=4):
+        categories, sentiment = old_analysis(text)
+        hits = matcher.scan(text)
+        assert {label: n for label, n in hits.counts.items() if label in CULTURE_KEYWORDS} == dict(categories), text
+        for label in SENTIMENT_WORDS:
+            assert hits.found.get(label, set()) == sentiment[label], text
+
+
+def test_culture_frequencies_match_the_old_totals():
+    texts = list(random_texts([k for ks in CULTURE_KEYWORDS.values() for k in ks] + ["good", "best", "bad", "and"], 50, 9))
+    expected = Counter()
+    for text in texts:
+        categories, sentiment = old_analysis(text)
+        expected.update(categories)
+        for label, words in sentiment.items():
+            expected[label] += len(words)
+    assert culture_frequencies(texts) == +expected
+
+
+def test_transliterated_keywords_match_whole_words_only():
+    matcher = get_culture_matcher()
+    hits = matcher.scan("Best masala chai and vada pav near the dhaba; chaatwala, चाय, चायवाला, கோழி பிரியாணி")
+    assert hits.found["tea"] >= {"masala chai", "chai", "चाय"}
+    assert hits.counts["tea"] == 3            # "masala chai", "chai" inside it (English substring), "चाय"
+    assert hits.found["streetfood"] == {"vada pav", "dhaba"}   # not "chaat" inside "chaatwala"
+    assert hits.found["nonveg"] == {"கோழி"}
+    assert matcher.scan("मिठाईवाला").counts["dessert"] == 0
+    # a Devanagari vowel sign continues the word: "चाय" is not a match inside "चायें"
+    assert matcher.scan("चायें").counts["tea"] == 0
+
+
+def test_whole_words_switch_for_english():
+    substring = KeywordMatcher(culture_patterns(whole_words=False))
+    whole = KeywordMatcher(culture_patterns(whole_words=True))
+    text = "A barista at the bar; teammates drink tea."
+    assert substring.scan(text).counts["alcohol"] == 2 and whole.scan(text).counts["alcohol"] == 1
+    assert substring.scan(text).counts["tea"] == 2 and whole.scan(text).counts["tea"] == 1
+
+
+def test_scan_all_totals():
+    matcher = get_culture_matcher()
+    texts = ["great coffee", "", None, "coffee and cake, great"]
+    hits = matcher.scan_all(texts)
+    assert hits.counts["coffee"] == 2 and hits.counts["dessert"] == 1 and hits.counts["positive"] == 2
+    assert len(matcher) == len(culture_patterns())
@@ -0,0 +1,144 @@
+import json
+import math
+import random
+
+import pytest
+
+from osm_local import INDEXED_KEYS, LocalOSMEngine, OverpassQueryError, main, parse_query
+from osm_snapshot import build_snapshot_query, haversine_m, overpass_count, tags_match
+
+LAT, LON = 12.9716, 77.5946
+TAG_CHOICES = [
+    {"shop": "supermarket"}, {"shop": "clothes", "name": "Fabindia"}, {"amenity": "cafe"},
+    {"amenity": "restaurant", "cuisine": "indian"}, {"amenity": "bank"}, {"office": "company"},
+    {"leisure": "park"}, {"highway": "primary"}, {"highway": "residential"},
+    {"building": "apartments"}, {"building": "house"}, {"building": "yes"},
+    {"natural": "tree"},  # not indexed: dropped at ingest, as Overpass-side filters would never ask for it
+]
+
+
+def make_elements(count=800, seed=11):
+    rng = random.Random(seed)
+    elements = []
+    for osm_id in range(1, count + 1):
+        r = 3000 * math.sqrt(rng.random())
+        bearing = rng.uniform(0, 2 * math.pi)
+        lat = LAT + r * math.cos(bearing) / 111320
+        lon = LON + r * math.sin(bearing) / (111320 * math.cos(math.radians(LAT)))
+        element = {"type": rng.choice(["node", "node", "way", "relation"]), "id": osm_id,
+                   "tags": dict(rng.choice(TAG_CHOICES))}
+        if element["type"] == "node":
+            element.update(lat=lat, lon=lon)
+        else:
+            element["center"] = {"lat": lat, "lon": lon}
+        elements.append(element)
+    return elements
+
+
+def reference_query(elements, query):
+    """What Overpass answers for the supported subset, by scanning every element"""
+    parsed = parse_query(query)
+    union = {}
+    for statement in parsed["statements"]:
+        for element in elements:
+            if element["type"] not in statement["element_types"]:
+                continue
+            if not any(key in element["tags"] for key in INDEXED_KEYS):
+                continue
+            point = element if "lat" in element else element["center"]
+            if "around" in statement:
+                radius, lat, lon = statement["around"]
+                if haversine_m(lat, lon, point["lat"], point["lon"]) > radius:
+                    continue
+            else:
+                south, west, north, east = statement["bbox"]
+                if not (south <= point["lat"] <= north and west <= point["lon"] <= east):
+                    continue
+            if tags_match(element["tags"], statement["filters"]):
+                union[(element["type"], element["id"])] = element
+    return sorted(union)
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("osm")
+    elements = make_elements()
+    dump = directory / "dump.json"
+    dump.write_text(json.dumps({"elements": elements}))
+    db = directory / "osm.sqlite"
+    main(["ingest", str(dump), "--output", str(db)])
+    return elements, LocalOSMEngine(str(db))
+
+
+def test_parse_query_statements():
+    parsed = parse_query(f"""
+        [out:json][timeout:25];
+        (
+          node["shop"](around:500,{LAT},{LON});
+          way["amenity"~"restaurant|cafe|bank"](around:500,{LAT},{LON});
+          nwr["amenity"="cafe"]["name"](12.9,77.5,13.0,77.6);
+        );
+        out count;
+    """)
+    assert parsed["count"] is True
+    assert parsed["statements"] == [
+        {"element_types": ("node",), "filters": [("shop", None, None)], "around": (500.0, LAT, LON)},
+        {"element_types": ("way",), "filters": [("amenity", "~", "restaurant|cafe|bank")], "around": (500.0, LAT, LON)},
+        {"element_types": ("node", "way"), "filters": [("amenity", "=", "cafe"), ("name", None, None)],
+         "bbox": (12.9, 77.5, 13.0, 77.6)},
+    ]
+
+
+def test_parse_query_output_modes():
+    assert parse_query(f'node["shop"](around:10,{LAT},{LON}); out center tags;')["count"] is False
+    # recursion after the first out is not needed: ways are answered with their centers
+    parsed = parse_query(f'[out:json]; way["highway"](around:10,{LAT},{LON}); out body; >; out skel qt;')
+    assert parsed["count"] is False and len(parsed["statements"]) == 1
+    # relations parse, but the local engine does not store them
+    assert parse_query(f'rel["shop"](around:10,{LAT},{LON}); out;')["statements"][0]["element_types"] == ()
+
+
+@pytest.mark.parametrize("query", [
+    f'[out:json]; node["shop"](around:400,{LAT},{LON});',  # no out statement
+    '[out:json]; area["name"="Bengaluru"]->.a; node["shop"](area.a); out;',
+    '[out:json]; node["shop"](poly:"12.9 77.5 13.0 77.6 12.95 77.7"); out;',
+])
+def test_parse_query_rejects_unsupported(query):
+    with pytest.raises(OverpassQueryError):
+        parse_query(query)
+
+
+@pytest.mark.parametrize("statements", [
+    ['node["shop"](around:{r},{lat},{lon});', 'node["amenity"](around:{r},{lat},{lon});', 'node["office"](around:{r},{lat},{lon});'],
+    ['way["highway"](around:{r},{lat},{lon});'],
+    ['node["building"~"residential|apartments|house|detached"](around:{r},{lat},{lon});',
+     'way["building"~"residential|apartments|house|detached"](around:{r},{lat},{lon});'],
+    ['node["amenity"="cafe"](around:{r},{lat},{lon});', 'way["amenity"="cafe"](around:{r},{lat},{lon});'],
+    ['nwr["shop"](12.96,77.58,12.98,77.61);'],
+])
+@pytest.mark.parametrize("radius", [250, 1000, 2500])
+def test_query_matches_reference(dataset, statements, radius):
+    elements, engine = dataset
+    body = " ".join(s.format(r=radius, lat=LAT, lon=LON) for s in statements)
+    listed = engine.query(f"[out:json][timeout:25]; ({body}); out center tags;")
+    expected = reference_query(elements, f"({body}); out center tags;")
+    assert [(e["type"], e["id"]) for e in listed["elements"]] == expected
+
+    counted = engine.query(f"[out:json][timeout:25]; ({body}); out count;")
+    assert overpass_count(counted) == len(expected)
+    assert int(counted["elements"][0]["tags"]["nodes"]) == sum(1 for t, _ in expected if t == "node")
+
+
+def test_elements_keep_overpass_shape(dataset):
+    elements, engine = dataset
+    by_key = {(e["type"], e["id"]): e for e in elements}
+    answer = engine.query(build_snapshot_query(LAT, LON, {"poi": 1500, "roads": 800, "buildings": 800}))
+    assert answer["elements"]
+    for element in answer["elements"]:
+        original = by_key[(element["type"], element["id"])]
+        assert element["tags"] == original["tags"]
+        if element["type"] == "node":
+            assert (element["lat"], element["lon"]) == pytest.approx((original["lat"], original["lon"]))
+        else:
+            assert (element["center"]["lat"], element["center"]["lon"]) == pytest.approx(
+                (original["center"]["lat"], original["center"]["lon"]))
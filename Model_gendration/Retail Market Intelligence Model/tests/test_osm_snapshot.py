@@ -0,0 +1,148 @@
+import json
+
+import pytest
+
+import osm_snapshot
+from osm_snapshot import OverpassRemarkError, fetch_osm_snapshot, iter_overpass_elements, overpass_count, run_overpass_query
+
+ELEMENTS = [
+    {"type": "node", "id": 1, "lat": 12.97, "lon": 77.59, "tags": {"amenity": "cafe", "name": "Café \"Brew\" ]["}},
+    {"type": "way", "id": 2, "center": {"lat": 12.98, "lon": 77.6}, "nodes": [10, 11, 12],
+     "tags": {"shop": "clothes", "name": "ಬೆಂಗಳೂರು Silks"}},
+    {"type": "node", "id": 3, "lat": -0.5, "lon": 1e-7, "tags": {"note": "\"elements\": [ not a start"}},
+    {"type": "relation", "id": 4, "members": [{"type": "way", "ref": 2, "role": "outer"}], "tags": {}},
+]
+HEADER = {"version": 0.6, "generator": "Overpass API",
+          "osm3s": {"timestamp_osm_base": "2024-01-01T00:00:00Z", "copyright": "ODbL [elements]"}}
+
+
+def document(elements=ELEMENTS, indent=None, remark=None):
+    data = dict(HEADER, elements=elements)
+    if remark:
+        data["remark"] = remark
+    return json.dumps(data, indent=indent, ensure_ascii=False).encode("utf-8")
+
+
+def chunked(raw, size):
+    return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+
+@pytest.mark.parametrize("indent", [None, 1])
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 1 << 20])
+def test_matches_json_loads(indent, size):
+    raw = document(indent=indent)
+    assert list(iter_overpass_elements(chunked(raw, size))) == json.loads(raw)["elements"]
+
+
+def test_empty_and_count_responses():
+    assert list(iter_overpass_elements([document(elements=[])])) == []
+    count = [{"type": "count", "id": 0, "tags": {"nodes": "3", "ways": "2", "relations": "0", "total": "5"}}]
+    streamed = {"elements": list(iter_overpass_elements(chunked(document(elements=count), 5)))}
+    assert overpass_count(streamed) == 5
+    assert overpass_count(streamed, "ways") == 2
+    assert overpass_count({"elements": []}) == 0
+
+
+def test_truncated_response():
+    raw = document()
+    with pytest.raises(ValueError):
+        list(iter_overpass_elements(chunked(raw[:len(raw) // 2], 16)))
+
+
+@pytest.mark.parametrize("size", [4, 1 << 20])
+def test_remark_raises_after_the_elements(size):
+    remark = "runtime error: Query timed out in \"query\" at line 3 after 26 seconds."
+    streamed = []
+    with pytest.raises(OverpassRemarkError) as error:
+        for element in iter_overpass_elements(chunked(document(remark=remark), size)):
+            streamed.append(element)
+    assert str(error.value) == remark
+    assert streamed == ELEMENTS
+
+
+class CannedResponse:
+    def __init__(self, raw):
+        self.raw = raw
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.raw)
+
+    def iter_content(self, chunk_size=1):
+        return iter(chunked(self.raw, 8))
+
+    def close(self):
+        self.closed = True
+
+
+class CannedClient:
+    """Answers every Overpass request with the same body"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.responses = []
+
+    def post(self, url, data=None, timeout=None):
+        return CannedResponse(self.raw)
+
+    def stream(self, method, url, data=None, timeout=None):
+        self.responses.append(CannedResponse(self.raw))
+        return self.responses[-1]
+
+
+@pytest.fixture
+def overpass(monkeypatch):
+    def answer(raw):
+        client = CannedClient(raw)
+        monkeypatch.setattr(osm_snapshot, "OSM_BACKEND", "overpass")
+        monkeypatch.setattr(osm_snapshot, "get_http_client", lambda: client)
+        return client
+    return answer
+
+
+def test_snapshot_from_streamed_elements(overpass):
+    client = overpass(document())
+    snapshot = fetch_osm_snapshot(12.97, 77.59, {"poi": 5000})
+    assert snapshot.elements == ELEMENTS[:3]  # the relation has no coordinates
+    assert snapshot.covers("poi", 5000) and not snapshot.covers("roads", 1)
+    assert all(response.closed for response in client.responses)
+
+
+def test_remark_fails_the_query_and_the_snapshot(overpass):
+    client = overpass(document(remark="runtime error: Query run out of memory using about 2048 MB of RAM."))
+    with pytest.raises(OverpassRemarkError):
+        run_overpass_query('node["shop"](around:100,12.97,77.59); out count;')
+    assert fetch_osm_snapshot(12.97, 77.59, {"poi": 5000}) is None
+    assert all(response.closed for response in client.responses)
+
+
+def competitor_search():
+    from runner import CompetitorAnalyzer
+    analyzer = CompetitorAnalyzer()
+    analyzer.set_parameters(12.97, 77.59, 5000, ["cafe", "clothes"])
+    return analyzer
+
+
+def test_competitor_search_streams_elements(overpass):
+    overpass(document())
+    analyzer = competitor_search()
+    data = analyzer.search_competitors()
+    assert data == {"elements": ELEMENTS}
+    assert [c.name for c in analyzer.process_results(data)] == [ELEMENTS[0]["tags"]["name"], ELEMENTS[1]["tags"]["name"]]
+
+
+@pytest.mark.parametrize("raw", [
+    document(remark="runtime error: Query timed out in \"query\" at line 3 after 26 seconds."),
+    document()[:len(document()) // 2],
+], ids=["remark", "truncated"])
+def test_competitor_search_fails_on_partial_results(overpass, raw, capsys):
+    client = overpass(raw)
+    assert competitor_search().search_competitors() is None
+    assert "❌" in capsys.readouterr().out
+    assert all(response.closed for response in client.responses)
+    # the analysis as a whole reports the failure instead of a shortened competitor list
+    assert competitor_search().main(auto_mode=True, json_output=True, latitude=12.97, longitude=77.59,
+                                    radius=5000, business_types=["cafe"]) is None
@@ -0,0 +1,121 @@
+import json
+import math
+import random
+
+import pytest
+
+from region_index import METERS_PER_DEGREE, RegionIndex, build_regions
+
+# A square country with a square hole (an enclave), a concave "L" country and a state inside the square
+SQUARE = [[0, 0], [4, 0], [4, 4], [0, 4], [0, 0]]
+HOLE = [[1, 1], [1, 2], [2, 2], [2, 1], [1, 1]]
+L_SHAPE = [[5, 0], [9, 0], [9, 1], [6, 1], [6, 4], [5, 4], [5, 0]]
+STATE = [[2.5, 2.5], [3.5, 2.5], [3.5, 3.5], [2.5, 3.5], [2.5, 2.5]]
+REGIONS = [
+    {"level": "country", "code": "AA", "name": "Squareland", "polygons": [[SQUARE, HOLE]]},
+    {"level": "country", "code": "BB", "name": "Elland", "polygons": [[L_SHAPE]]},
+    {"level": "state", "code": "AA-01", "name": "Corner", "country_code": "AA", "polygons": [[STATE]]},
+]
+
+
+def brute_force_lookup(regions, lat, lon, level):
+    """Reference point-in-polygon test over every region, without the grid"""
+    def inside(ring):
+        result = False
+        for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+            if (y1 > lat) != (y2 > lat) and lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+                result = not result
+        return result
+
+    for region in regions:
+        if region["level"] != level:
+            continue
+        for rings in region["polygons"]:
+            if inside(rings[0]) and not any(inside(hole) for hole in rings[1:]):
+                return region["code"]
+    return None
+
+
+@pytest.fixture
+def index():
+    return RegionIndex(REGIONS, cell_size=0.5)
+
+
+def test_lookup_matches_brute_force(index):
+    rng = random.Random(5)
+    for _ in range(2000):
+        lat, lon = rng.uniform(-1, 5), rng.uniform(-1, 10)
+        for level in ("country", "state"):
+            found = index.lookup(lat, lon, level)
+            assert (found["code"] if found else None) == brute_force_lookup(REGIONS, lat, lon, level), (lat, lon, level)
+
+
+def test_lookup_is_stable_for_memoized_cells(index):
+    # Interior cells answer from a memoized cell center; asking twice must not change the answer
+    points = [(0.25, 0.25), (3.75, 0.25), (1.5, 1.5), (0.5, 5.5), (3.0, 7.0)]
+    first = [index.lookup(lat, lon) for lat, lon in points]
+    assert [index.lookup(lat, lon) for lat, lon in points] == first
+    assert [r["code"] if r else None for r in first] == ["AA", "AA", None, "BB", None]
+
+
+def test_edge_clipping_a_cell_corner():
+    # The hypotenuse lon + lat = 2.1 only clips the corner of cell (1, 1) (lon/lat 1..1.1): the cell center
+    # is outside the triangle but its corner is inside, so the cell must not answer from its center
+    triangle = [[0.1, 2.0], [2.0, 0.1], [0.1, 0.1], [0.1, 2.0]]
+    index = RegionIndex([{"level": "country", "code": "TT", "name": "Triangle", "polygons": [[triangle]]}], cell_size=1.0)
+    assert (1, 1) in index.polygons[0][1].boundary_cells
+    assert index.lookup(1.5, 1.5) is None
+    assert index.lookup(1.03, 1.03)["code"] == "TT"
+    assert index.border_distance_m(1.03, 1.03) == pytest.approx(0.04 / math.sqrt(2) * METERS_PER_DEGREE, rel=0.01)
+
+
+def test_random_triangles_match_brute_force():
+    rng = random.Random(11)
+    for _ in range(40):
+        triangle = [[rng.uniform(-3, 3), rng.uniform(-3, 3)] for _ in range(3)]
+        regions = [{"level": "country", "code": "TT", "name": "Triangle", "polygons": [[triangle + triangle[:1]]]}]
+        index = RegionIndex(regions, cell_size=0.5)
+        for _ in range(1500):
+            lat, lon = rng.uniform(-3, 3), rng.uniform(-3, 3)
+            found = index.lookup(lat, lon)
+            assert (found["code"] if found else None) == brute_force_lookup(regions, lat, lon, "country"), (triangle, lat, lon)
+
+
+def test_address(index):
+    assert index.address(3.0, 3.0) == {"country": "Squareland", "country_code": "aa", "state": "Corner"}
+    assert index.address(0.5, 0.5) == {"country": "Squareland", "country_code": "aa"}
+    assert index.address(-0.5, -0.5) is None
+
+
+def test_border_distance_m(index):
+    # Nearest edge of the square from (lat 0.5, lon 3.8) is the east side, 0.2 degrees of longitude away
+    expected = 0.2 * math.cos(math.radians(0.5)) * METERS_PER_DEGREE
+    assert index.border_distance_m(0.5, 3.8) == pytest.approx(expected, rel=1e-6)
+    # Hole edges count as borders too
+    assert index.border_distance_m(2.1, 1.5) == pytest.approx(0.1 * METERS_PER_DEGREE, rel=1e-6)
+    assert index.border_distance_m(1.5, 1.5) is None  # inside the hole
+    assert index.border_distance_m(-1, -1) is None
+
+
+def test_build_and_load_round_trip(tmp_path):
+    features = [
+        {"type": "Feature", "properties": {"ISO_A2": "AA", "NAME": "Squareland"},
+         "geometry": {"type": "Polygon", "coordinates": [SQUARE, HOLE]}},
+        {"type": "Feature", "properties": {"ISO_A2": "-99", "ISO_A2_EH": "BB", "NAME_EN": "Elland"},
+         "geometry": {"type": "MultiPolygon", "coordinates": [[L_SHAPE]]}},
+        {"type": "Feature", "properties": {"ISO_A2": "-99", "NAME": "Nowhere"},
+         "geometry": {"type": "Polygon", "coordinates": [SQUARE]}},
+    ]
+    countries = tmp_path / "countries.geojson"
+    countries.write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+    regions = build_regions(str(countries), state_countries=())
+    assert [(r["code"], r["name"]) for r in regions] == [("AA", "Squareland"), ("BB", "Elland")]
+
+    path = tmp_path / "regions.json"
+    path.write_text(json.dumps({"cell_size": 0.5, "regions": regions}))
+    loaded = RegionIndex.load(str(path))
+    direct = RegionIndex(regions, cell_size=0.5)
+    rng = random.Random(7)
+    for _ in range(500):
+        lat, lon = rng.uniform(-1, 5), rng.uniform(-1, 10)
+        assert loaded.lookup(lat, lon) == direct.lookup(lat, lon)
@@ -0,0 +1,128 @@
+import threading
+import time
+
+import pytest
+
+from result_cache import ResultCache
+
+RESULT = {"Traffic_Score": {"score": 72.5, "poi_breakdown": {"food": 3}}, "Market_Factor": 0.61,
+          "Population_Analysis": {"notes": ["Café-heavy area"], "competing_businesses": []}}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite"), ttl=60, max_stale=600, max_entries=100)
+    yield cache
+    cache.refresher.shutdown(wait=True)
+
+
+class Compute:
+    """compute() stand-in that counts calls and can be held until released"""
+
+    def __init__(self, result=RESULT, hold=False):
+        self.result = result
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+
+    def __call__(self, lat, lon, business_type, radius_km):
+        self.calls.append((lat, lon, business_type, radius_km))
+        self.started.set()
+        self.release.wait(5)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def age_entries(cache, seconds):
+    with cache.lock:
+        cache.db.execute("UPDATE results SET created = created - ?", (seconds,))
+        cache.db.commit()
+
+
+def test_round_trip_and_persistence(cache, tmp_path):
+    compute = Compute()
+    assert cache.get_or_compute(12.9716, 77.5946, "Cafe", 1, compute) == RESULT
+    assert cache.get_or_compute(12.9716, 77.5946, "cafe", 1, compute) == RESULT
+    assert len(compute.calls) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    reopened = ResultCache(cache.path, ttl=60)
+    assert reopened.get_or_compute(12.9716, 77.5946, "cafe", 1, Compute(result={"other": 1})) == RESULT
+
+
+def test_normalize(cache):
+    key, inputs = cache.normalize(12.97161, 77.59459, "  Coffee   Shop ", 1.004)
+    assert inputs == (12.97161, 77.59459, "coffee shop", 1.0)
+    assert cache.normalize(12.97158, 77.59462, "coffee shop", 1)[0] == key   # same ~110 m cell
+    assert cache.normalize(12.9735, 77.59459, "coffee shop", 1)[0] != key
+    assert cache.normalize(12.97161, 77.59459, "coffee shop", 2)[0] != key
+
+
+def test_concurrent_requests_share_one_computation(cache):
+    compute = Compute(hold=True)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute(12.97, 77.59, "cafe", 1, compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    assert compute.started.wait(5)
+    time.sleep(0.1)  # let the other requests find the computation in flight
+    compute.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == [RESULT] * 8
+    assert len(compute.calls) == 1
+    assert cache.inflight == {}
+
+
+def test_failures_are_not_cached(cache):
+    failing = Compute(result=RuntimeError("upstream down"))
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute(12.97, 77.59, "cafe", 1, failing)
+    assert cache.get_or_compute(12.97, 77.59, "cafe", 1, Compute(result={"error": "no data"})) == {"error": "no data"}
+    compute = Compute()
+    assert cache.get_or_compute(12.97, 77.59, "cafe", 1, compute) == RESULT
+    assert len(compute.calls) == 1 and cache.inflight == {}
+
+
+def test_stale_entries_are_served_while_refreshing(cache):
+    cache.get_or_compute(12.97161, 77.59459, "cafe", 1, Compute())
+    age_entries(cache, 120)  # past the ttl, within max_stale
+
+    fresh = dict(RESULT, Market_Factor=0.7)
+    refresh = Compute(result=fresh, hold=True)
+    # a nearby point in the same cell gets the stale answer at once
+    assert cache.get_or_compute(12.97158, 77.59462, "cafe", 1, refresh) == RESULT
+    assert cache.get_or_compute(12.97158, 77.59462, "cafe", 1, refresh) == RESULT
+    refresh.release.set()
+    cache.wait_for_refreshes(5)
+
+    assert refresh.calls == [(12.97161, 77.59459, "cafe", 1.0)]  # one refresh, for the stored inputs
+    assert cache.get_or_compute(12.97158, 77.59462, "cafe", 1, Compute()) == fresh
+    assert cache.stats()["stale_hits"] == 2 and cache.stats()["refreshes"] == 1
+
+
+def test_expired_entries_are_recomputed(cache):
+    cache.get_or_compute(12.97, 77.59, "cafe", 1, Compute())
+    age_entries(cache, 60 + 600 + 1)
+    fresh = dict(RESULT, Market_Factor=0.7)
+    assert cache.get_or_compute(12.97, 77.59, "cafe", 1, Compute(result=fresh)) == fresh
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite"), max_entries=2)
+    for lat in (10.0, 11.0):
+        cache.get_or_compute(lat, 77.0, "cafe", 1, Compute())
+    time.sleep(0.01)
+    cache.get_or_compute(10.0, 77.0, "cafe", 1, Compute())  # touch the first entry
+    time.sleep(0.01)
+    cache.get_or_compute(12.0, 77.0, "cafe", 1, Compute())
+
+    assert cache.stats()["entries"] == 2
+    recompute = Compute()
+    cache.get_or_compute(10.0, 77.0, "cafe", 1, recompute)
+    cache.get_or_compute(11.0, 77.0, "cafe", 1, recompute)
+    assert [call[0] for call in recompute.calls] == [11.0]
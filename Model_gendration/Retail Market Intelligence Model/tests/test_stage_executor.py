@@ -0,0 +1,165 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+import requests
+
+from http_client import HttpClient, HttpResponse, RateLimiter, deadline
+from runner import StageExecutor
+
+URL = "http://upstream.test/api"
+
+
+class RawResponse:
+    status_code = 200
+    headers = {}
+    content = b"{}"
+
+
+class RecordingBackend:
+    """Backend stand-in that records the timeout of every request it is asked to send"""
+
+    name = "recording"
+    http2 = False
+
+    def __init__(self):
+        self.timeouts = []
+
+    def request(self, method, url, host, params, data, headers, timeout):
+        self.timeouts.append(timeout)
+        return HttpResponse(RawResponse(), url)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = HttpClient(backend="requests", limiter=RateLimiter({}))
+    client.backend = RecordingBackend()
+    client.fixtures = None
+    return client
+
+
+def test_stage_results_and_errors():
+    executor = StageExecutor()
+    executor.submit("traffic_score", lambda x: x * 2, 21)
+    executor.submit("income", lambda: 1 / 0)
+    assert executor.result("traffic_score") == 42
+    with pytest.raises(ZeroDivisionError):
+        executor.result("income")
+    assert executor.timed_out == []
+
+
+def test_overrunning_stage_gets_its_default():
+    release = threading.Event()
+    executor = StageExecutor(timeouts={"slow": 0.2, "fast": 5})
+    executor.submit("slow", lambda: release.wait(10) and "late")
+    executor.submit("fast", lambda: "on time")
+    started = time.monotonic()
+    assert executor.result("slow", default="default") == "default"
+    assert time.monotonic() - started < 1
+    assert executor.result("fast", default="default") == "on time"
+    assert executor.timed_out == ["slow"]
+
+    # the abandoned stage runs on a daemon thread, so it cannot hold up interpreter exit
+    stage_threads = [t for t in threading.enumerate() if t.name == "analysis-stage-slow"]
+    assert stage_threads and all(t.daemon for t in stage_threads)
+    release.set()
+
+
+def test_timeouts_count_from_the_start_of_the_stages():
+    executor = StageExecutor(timeouts={"a": 0.3, "b": 0.3})
+    executor.submit("a", time.sleep, 5)
+    executor.submit("b", time.sleep, 5)
+    started = time.monotonic()
+    assert executor.result("a", "a") == "a" and executor.result("b", "b") == "b"
+    assert time.monotonic() - started < 0.6  # not 0.3 s per stage
+
+
+def test_shared_input_is_computed_once_under_concurrent_callers():
+    executor = StageExecutor()
+    calls = []
+    release = threading.Event()
+
+    def compute(value):
+        calls.append(value)
+        release.wait(5)
+        return {"city": value}
+
+    results = []
+    for name in ("a", "b", "c", "d", "e", "f"):
+        executor.submit(name, lambda: results.append(executor.shared("location_info", compute, "Chennai")))
+    time.sleep(0.1)  # let every stage reach shared()
+    release.set()
+    for name in ("a", "b", "c", "d", "e", "f"):
+        executor.result(name)
+    assert calls == ["Chennai"]
+    assert results == [{"city": "Chennai"}] * 6
+    assert all(result is results[0] for result in results)
+
+
+def test_shared_input_failure_reaches_every_caller():
+    executor = StageExecutor()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        raise ValueError("geocoder down")
+
+    for name in ("a", "b", "c"):
+        executor.submit(name, executor.shared, "location_info", compute)
+    for name in ("a", "b", "c"):
+        with pytest.raises(ValueError):
+            executor.result(name)
+    assert calls == [1]
+
+
+def test_stage_requests_are_bounded_by_its_timeout(client):
+    executor = StageExecutor(timeouts={"quick": 0.5, "late": 0.2})
+
+    def late_stage():
+        time.sleep(0.3)  # past this stage's timeout
+        return client.get(URL)
+
+    executor.submit("quick", lambda: client.get(URL, timeout=30))
+    executor.submit("late", late_stage)
+    executor.result("quick")
+    assert 0 < client.backend.timeouts[0] <= 0.5
+
+    with pytest.raises(requests.exceptions.Timeout):
+        executor.futures["late"].result(5)
+    assert len(client.backend.timeouts) == 1  # the late request was never sent
+
+
+def test_shared_input_gets_the_longest_stage_budget(client):
+    # other stages may be waiting for it, so it is not cut short by the stage that happened to ask first
+    executor = StageExecutor(timeouts={"short": 0.2, "long": 300})
+    executor.submit("short", executor.shared, "location_info", lambda: client.get(URL, timeout=600))
+    executor.result("short")
+    assert 250 < client.backend.timeouts[0] <= 300
+
+
+def test_no_deadline_outside_stages(client):
+    client.get(URL, timeout=12)
+    with deadline(None):
+        client.get(URL)
+    assert client.backend.timeouts == [12, None]
+
+
+def test_interpreter_exit_does_not_wait_for_a_hung_stage():
+    script = (
+        "import time\n"
+        "from runner import StageExecutor\n"
+        "executor = StageExecutor(timeouts={'hung': 0.1})\n"
+        "executor.submit('hung', time.sleep, 60)\n"
+        "print(executor.result('hung', 'default'))\n"
+    )
+    started = time.monotonic()
+    done = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=30,
+                          cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert done.stdout.strip() == "default"
+    assert time.monotonic() - started < 20
@@ -0,0 +1,163 @@
+import json
+import threading
+
+import pytest
+
+import tracing
+from http_client import HttpClient, HttpResponse, RateLimiter
+from runner import StageExecutor
+
+
+class RawResponse:
+    status_code = 200
+    headers = {}
+    content = b'{"ok": true}'
+
+
+class Upstream:
+    """Backend stand-in answering every request with a small body"""
+
+    name = "upstream"
+    http2 = False
+
+    def request(self, method, url, host, params, data, headers, timeout):
+        if host == "down.test":
+            raise ConnectionError("connection refused")
+        return HttpResponse(RawResponse(), url)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def client():
+    client = HttpClient(backend="requests", limiter=RateLimiter({}))
+    client.backend = Upstream()
+    client.fixtures = None
+    return client
+
+
+def by_name(trace):
+    return {span.name: span for span in trace.spans}
+
+
+def test_no_trace_means_no_spans():
+    with tracing.span("anything", key="value") as span:
+        assert span is tracing.NOOP_SPAN
+        tracing.annotate(fallback_used=True)
+    assert tracing.current_span() is tracing.NOOP_SPAN
+    with tracing.start_trace("disabled", enabled=False) as trace:
+        assert trace is None and tracing.current_span() is tracing.NOOP_SPAN
+
+
+def test_spans_nest_across_stage_threads(client):
+    location_calls = []
+
+    def location():
+        location_calls.append(threading.current_thread().name)
+        tracing.annotate(geocode_service="nominatim")
+        return "Alpha"
+
+    def stage(executor, path):
+        executor.shared("location_info", location)
+        client.get(f"http://api.test/{path}")
+        with tracing.span("parse"):
+            tracing.annotate(items=3)
+        return path
+
+    with tracing.start_trace("analysis", business_type="cafe") as trace:
+        executor = StageExecutor()
+        executor.submit("traffic_score", stage, executor, "traffic")
+        executor.submit("income", stage, executor, "income")
+        assert [executor.result("traffic_score"), executor.result("income")] == ["traffic", "income"]
+
+    spans = by_name(trace)
+    root = spans["analysis"]
+    assert root.parent_id is None and root.attributes == {"business_type": "cafe"}
+    stages = {name: spans[f"stage:{name}"] for name in ("traffic_score", "income")}
+    assert all(span.parent_id == root.span_id for span in stages.values())
+    assert all("cpu_ms" in span.attributes for span in stages.values())
+
+    # the shared input is computed once, under whichever stage asked first
+    assert len(location_calls) == 1
+    shared = spans["shared:location_info"]
+    assert shared.parent_id in {span.span_id for span in stages.values()}
+    assert shared.attributes == {"geocode_service": "nominatim"}
+
+    http = [span for span in trace.spans if span.kind == "client"]
+    assert sorted(span.attributes["http.url"] for span in http) == ["http://api.test/income", "http://api.test/traffic"]
+    for span in http:
+        owner = "traffic_score" if span.attributes["http.url"].endswith("traffic") else "income"
+        assert span.parent_id == stages[owner].span_id
+        assert span.attributes["bytes"] == len(RawResponse.content)
+    parses = [span for span in trace.spans if span.name == "parse"]
+    assert {span.parent_id for span in parses} == {span.span_id for span in stages.values()}
+    assert all(span.end_ns is not None for span in trace.spans)
+
+
+def test_diagnostics_summary(client):
+    release = threading.Event()
+    with tracing.start_trace("analysis") as trace:
+        executor = StageExecutor(timeouts={"slow": 0.1})
+        executor.submit("fetch", lambda: [client.get("http://api.test/a"), client.get("http://api.test/b")])
+        executor.submit("broken", lambda: client.get("http://down.test/"))
+        executor.submit("slow", release.wait, 5)
+        executor.result("fetch")
+        with pytest.raises(ConnectionError):
+            executor.result("broken")
+        assert executor.result("slow", default="default") == "default"
+    release.set()
+
+    diagnostics = trace.diagnostics()
+    assert diagnostics["trace_id"] == trace.trace_id
+    assert diagnostics["duration_ms"] >= diagnostics["stages"]["fetch"]["duration_ms"]
+    assert {name: stage["status"] for name, stage in diagnostics["stages"].items()} == {
+        "fetch": "ok", "broken": "error", "slow": "error"}
+    assert diagnostics["upstream"]["api.test"] == {
+        "calls": 2, "duration_ms": diagnostics["upstream"]["api.test"]["duration_ms"],
+        "bytes": 2 * len(RawResponse.content), "cache_hits": 0, "errors": 0}
+    assert diagnostics["upstream"]["down.test"]["errors"] == 1
+
+    root = diagnostics["spans"][0]
+    assert root["name"] == "analysis" and root["start_ms"] == 0.0
+    assert root["attributes"] == {"fallback_used": True, "timed_out_stages": "slow"}
+    slow = next(span for span in diagnostics["spans"] if span["name"] == "stage:slow")
+    assert slow["error"] == "StageTimeoutError: Stage 'slow' timed out after 0.1s"
+    json.dumps(diagnostics)
+
+
+def test_otlp_export(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_DIR", str(tmp_path / "traces"))
+    with pytest.raises(ValueError):
+        with tracing.start_trace("analysis", lat=12.97, radius_km=2, cached=False, business_type="cafe") as trace:
+            with tracing.span("HTTP GET", kind="client", bytes=10):
+                pass
+            raise ValueError("bad input")
+
+    with open(tmp_path / "traces" / f"{trace.trace_id}.json") as f:
+        exported = json.load(f)
+    assert exported == trace.to_otlp()
+    resource_spans = exported["resourceSpans"][0]
+    assert resource_spans["resource"]["attributes"] == [
+        {"key": "service.name", "value": {"stringValue": tracing.SERVICE_NAME}}]
+    root, http = resource_spans["scopeSpans"][0]["spans"]
+    assert root["traceId"] == http["traceId"] == trace.trace_id
+    assert "parentSpanId" not in root and http["parentSpanId"] == root["spanId"]
+    assert (root["kind"], http["kind"]) == (1, 3)
+    assert root["status"] == {"code": 2, "message": "ValueError: bad input"} and http["status"] == {"code": 1}
+    assert int(root["startTimeUnixNano"]) <= int(http["startTimeUnixNano"]) <= int(root["endTimeUnixNano"])
+    assert root["attributes"] == [
+        {"key": "lat", "value": {"doubleValue": 12.97}},
+        {"key": "radius_km", "value": {"intValue": "2"}},
+        {"key": "cached", "value": {"boolValue": False}},
+        {"key": "business_type", "value": {"stringValue": "cafe"}},
+    ]
+
+
+def test_export_failure_does_not_fail_the_trace(tmp_path):
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_text("")
+    with tracing.start_trace("analysis") as trace:
+        pass
+    assert tracing.export_otlp(trace, str(blocker / "traces")) is None
+    assert tracing.export_otlp(trace, str(tmp_path)) == str(tmp_path / f"{trace.trace_id}.json")
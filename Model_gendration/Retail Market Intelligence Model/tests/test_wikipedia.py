@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import runner
+from runner import WIKIPEDIA_EXTRACT_CHARS, WIKIPEDIA_RESULTS, FreeCulturalFitAnalyzer
+from wikipedia_stub import serve_in_thread
+
+MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Page ids follow this order, so the top search hit has a higher page id than the second
+PAGES = {
+    "Bengaluru": "Bengaluru has many a cafe and pub.",
+    "Kolkata": "Kolkata is known for sweets and tea.",
+    "Chennai": "Chennai is a coastal city with a cafe on every street. " + "Filter coffee and idli. " * 40,
+    "Cafe culture in Chennai": "Chennai cafe culture mixes filter coffee houses with new cafe chains.",
+}
+
+
+@pytest.fixture
+def wiki(monkeypatch):
+    server, url = serve_in_thread(PAGES)
+    monkeypatch.setattr(runner, "WIKIPEDIA_API_URL", url)
+    yield server.RequestHandlerClass.wiki, url
+    server.shutdown()
+    server.server_close()
+
+
+def test_search_results_in_rank_order_with_truncated_extracts(wiki):
+    stub, _ = wiki
+    texts = FreeCulturalFitAnalyzer().get_wikipedia_content("Chennai", "Cafe", 1000)
+    assert stub.requests == 1  # one generator=search call brings the extracts along
+    assert len(texts) == WIKIPEDIA_RESULTS
+    # both pages match both terms; the search ranks them by title, not by page id
+    assert [text.split(":")[0] for text in texts] == ["Cafe culture in Chennai", "Chennai"]
+    assert texts[1] == f"Chennai: {PAGES['Chennai'][:WIKIPEDIA_EXTRACT_CHARS]}..."
+    assert len(PAGES["Chennai"]) > WIKIPEDIA_EXTRACT_CHARS
+
+
+def test_no_request_without_a_place_and_empty_results(wiki):
+    stub, url = wiki
+    analyzer = FreeCulturalFitAnalyzer()
+    assert analyzer.get_wikipedia_content("  ", "cafe", 1000) == []
+    assert stub.requests == 0
+    assert analyzer.get_wikipedia_content("Atlantis", "submarine", 1000) == []
+    assert stub.requests == 1
+
+
+def test_http_errors_give_no_content(wiki, monkeypatch):
+    _, url = wiki
+    monkeypatch.setattr(runner, "WIKIPEDIA_API_URL", url.replace("/w/api.php", "/nowhere"))
+    assert FreeCulturalFitAnalyzer().get_wikipedia_content("Chennai", "cafe", 1000) == []
+
+
+def test_api_url_from_the_environment():
+    server, url = serve_in_thread(PAGES)
+    try:
+        script = ("import json\n"
+                  "from runner import FreeCulturalFitAnalyzer\n"
+                  "print(json.dumps(FreeCulturalFitAnalyzer().get_wikipedia_content('Kolkata', 'tea', 1000)))\n")
+        env = dict(os.environ, RADIU_WIKIPEDIA_API_URL=url)
+        env.pop("RADIU_REPLAY_FIXTURES", None)
+        done = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=60,
+                              cwd=MODEL_DIR, env=env)
+        assert json.loads(done.stdout.strip().splitlines()[-1]) == [f"Kolkata: {PAGES['Kolkata']}..."]
+        assert server.RequestHandlerClass.wiki.requests == 1
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,77 @@
+import json
+import struct
+
+import pytest
+
+from worldbank_store import MAGIC, WorldBankStore, main, read_bulk_csv
+
+BULK_CSV = '''﻿"Data Source","World Development Indicators",
+
+"Last Updated Date","2024-06-28",
+
+"Country Name","Country Code","Indicator Name","Indicator Code","2019","2020","2021","2022","2023",
+"India","IND","GDP per capita (current US$)","NY.GDP.PCAP.CD","2050.2","1913.2","2250.2","2366.3","",
+"Kenya","KEN","GDP per capita (current US$)","NY.GDP.PCAP.CD","","1936.3","","2099.3","1949.9",
+"Aruba","ABW","GDP per capita (current US$)","NY.GDP.PCAP.CD","","","","","",
+'''
+COUNTRIES = [{"page": 1}, [{"id": "IND", "iso2Code": "IN"}, {"id": "KEN", "iso2Code": "KE"}, {"id": "ABW", "iso2Code": "AW"}]]
+
+
+def api_items(series, iso3, indicator, start_year, end_year):
+    """What the World Bank API returns for the same data: newest first, null for missing years"""
+    return [
+        {"countryiso3code": iso3, "indicator": {"id": indicator}, "date": str(year), "value": series.get(year)}
+        for year in range(end_year, start_year - 1, -1)
+    ]
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    csv_path = tmp_path / "API_NY.GDP.PCAP.CD.csv"
+    csv_path.write_text(BULK_CSV, encoding="utf-8")
+    metadata = tmp_path / "countries.json"
+    metadata.write_text(json.dumps(COUNTRIES))
+    output = tmp_path / "worldbank.wbstore"
+    main(["ingest", str(csv_path), "--country-metadata", str(metadata), "--output", str(output)])
+    return output
+
+
+def test_file_layout(store_path):
+    raw = store_path.read_bytes()
+    assert raw[:8] == MAGIC
+    (header_length,) = struct.unpack("<Q", raw[8:16])
+    header = json.loads(raw[16:16 + header_length])
+    assert header["data_offset"] % 8 == 0
+    assert header["years"] == [2019, 2023]
+    # one float64 per series and year after the header
+    assert len(raw) == header["data_offset"] + len(header["series"]) * 5 * 8
+
+
+def test_round_trip_matches_api_items(store_path, tmp_path):
+    store = WorldBankStore(str(store_path))
+    series = read_bulk_csv(str(tmp_path / "API_NY.GDP.PCAP.CD.csv"))
+    for iso2, iso3 in (("IN", "IND"), ("ke", "KEN")):
+        values = series[(iso3, "NY.GDP.PCAP.CD")]
+        for start_year, end_year in ((2019, 2023), (2020, 2022), (2021, 2021)):
+            expected = [item for item in api_items(values, iso3, "NY.GDP.PCAP.CD", start_year, end_year)
+                        if item["value"] is not None] or None  # nothing stored: ask the API
+            assert store.get(iso2, "NY.GDP.PCAP.CD", start_year, end_year) == expected
+            assert store.get(iso3, "NY.GDP.PCAP.CD", start_year, end_year) == expected
+
+
+def test_falls_through_to_the_api(store_path):
+    store = WorldBankStore(str(store_path))
+    assert store.has("IN", "NY.GDP.PCAP.CD")
+    assert not store.has("IN", "NY.GNP.PCAP.CD")
+    assert store.get("IN", "NY.GNP.PCAP.CD", 2019, 2023) is None   # series not ingested
+    assert store.get("IN", "NY.GDP.PCAP.CD", 2015, 2023) is None   # years not covered
+    assert store.get("IN", "NY.GDP.PCAP.CD", 2019, 2024) is None
+    assert store.get("IN", "NY.GDP.PCAP.CD", 2023, 2023) is None   # no value for the year
+    assert store.get("AW", "NY.GDP.PCAP.CD", 2019, 2023) is None   # empty series
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not-a-store"
+    path.write_bytes(b"PK\x03\x04" + b"\0" * 64)
+    with pytest.raises(ValueError):
+        WorldBankStore(str(path))
@@ -0,0 +1,238 @@
+"""
+Lightweight tracing for analyses.
+
+A trace is a tree of timed spans: one per analysis, one per stage and shared
+input, and one per upstream HTTP call, each with attributes such as bytes,
+cache hit, throttling or which fallback was used. The active span lives in a
+contextvar, so nested code attaches to it without passing it around, and
+StageExecutor copies the context into its worker threads.
+
+Code outside an active trace gets a no-op span, so instrumentation costs next
+to nothing unless an analysis asked for diagnostics (run_analysis(...,
+diagnostics=True)) or RADIU_TRACE_DIR is set, in which case every trace is also
+written there as an OpenTelemetry OTLP/JSON file.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+TRACE_DIR = os.environ.get("RADIU_TRACE_DIR")  # write OTLP/JSON trace files here when set
+SERVICE_NAME = "retail-market-intelligence"
+
+_current = contextvars.ContextVar("radiu_current_span", default=None)
+
+
+class Span:
+    """One timed operation in a trace"""
+
+    def __init__(self, trace: "Trace", name: str, parent: Optional["Span"], kind: str, attributes: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.kind = kind
+        self.attributes = {k: v for k, v in attributes.items() if v is not None}
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, key: str, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        for key, value in attributes.items():
+            self.set(key, value)
+
+    def record_error(self, error):
+        self.error = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error)
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ms": round((self.start_ns - self.trace.start_ns) / 1e6, 1),
+            "duration_ms": round(self.duration_ms, 1),
+            "status": "error" if self.error else "ok",
+            **({"error": self.error} if self.error else {}),
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span when no trace is active"""
+
+    def set(self, key, value):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+    def record_error(self, error):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """All spans recorded for one analysis"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = os.urandom(16).hex()
+        self.start_ns = time.time_ns()
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()
+
+    def start_span(self, name: str, parent: Optional[Span], kind: str = "internal", **attributes) -> Span:
+        span = Span(self, name, parent, kind, attributes)
+        with self.lock:
+            self.spans.append(span)
+        return span
+
+    def diagnostics(self) -> dict:
+        """Summary for the _diagnostics block: stage timings, per-host upstream totals and all spans"""
+        with self.lock:
+            spans = list(self.spans)
+
+        stages = {}
+        upstream = {}
+        for span in spans:
+            if span.name.startswith("stage:"):
+                stages[span.name[len("stage:"):]] = {
+                    "duration_ms": round(span.duration_ms, 1),
+                    "cpu_ms": span.attributes.get("cpu_ms"),
+                    "status": "error" if span.error else "ok",
+                }
+            elif span.kind == "client":
+                host = upstream.setdefault(span.attributes.get("http.host", "?"), {
+                    "calls": 0, "duration_ms": 0.0, "bytes": 0, "cache_hits": 0, "errors": 0
+                })
+                host["calls"] += 1
+                host["duration_ms"] = round(host["duration_ms"] + span.duration_ms, 1)
+                host["bytes"] += span.attributes.get("bytes", 0)
+                host["cache_hits"] += int(bool(span.attributes.get("cache_hit")))
+                host["errors"] += int(span.error is not None)
+
+        return {
+            "trace_id": self.trace_id,
+            "duration_ms": round(spans[0].duration_ms, 1) if spans else 0.0,
+            "stages": stages,
+            "upstream": upstream,
+            "spans": [span.to_dict() for span in spans],
+        }
+
+    def to_otlp(self) -> dict:
+        """The trace as an OTLP/JSON ExportTraceServiceRequest"""
+        with self.lock:
+            spans = list(self.spans)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [{
+                    "traceId": self.trace_id,
+                    "spanId": span.span_id,
+                    **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+                    "name": span.name,
+                    "kind": 3 if span.kind == "client" else 1,  # SPAN_KIND_CLIENT / SPAN_KIND_INTERNAL
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                    "attributes": [_otlp_attribute(key, value) for key, value in span.attributes.items()],
+                    "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+                } for span in spans],
+            }],
+        }]}
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def current_span():
+    """The active span, or a no-op span outside a trace"""
+    return _current.get() or NOOP_SPAN
+
+
+def annotate(**attributes):
+    """Set attributes on the active span (e.g. which fallback was used)"""
+    current_span().set_attributes(**attributes)
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes) -> Iterator:
+    """Time a block as a child of the active span; a no-op outside a trace"""
+    parent = _current.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+
+    child = parent.trace.start_span(name, parent, kind, **attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.record_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        child.end()
+
+
+@contextmanager
+def start_trace(name: str, enabled: bool = True, **attributes) -> Iterator[Optional[Trace]]:
+    """Record a new trace with a root span around the block; yields None when disabled"""
+    if not enabled:
+        yield None
+        return
+
+    trace = Trace(name)
+    root = trace.start_span(name, None, **attributes)
+    token = _current.set(root)
+    try:
+        yield trace
+    except BaseException as e:
+        root.record_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        root.end()
+        if TRACE_DIR:
+            export_otlp(trace, TRACE_DIR)
+
+
+def export_otlp(trace: Trace, directory: str) -> Optional[str]:
+    """Write the trace to <directory>/<trace_id>.json; returns the path"""
+    try:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{trace.trace_id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(trace.to_otlp(), f)
+        return path
+    except OSError:
+        return None
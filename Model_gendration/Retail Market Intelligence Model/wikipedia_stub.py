@@ -0,0 +1,160 @@
+"""
+Local stand-in for the MediaWiki API used by the cultural fit analysis.
+
+Answers action=query requests with generator=search and prop=extracts (and
+prop=extracts&titles=...) from a small set of pages, so the Wikipedia step can
+be exercised offline and deterministically. Search is a plain term match over
+title and extract, ranked by the number of query terms found.
+
+Usage:
+    python wikipedia_stub.py --port 8766 [--pages pages.json]
+    RADIU_WIKIPEDIA_API_URL=http://127.0.0.1:8766/w/api.php python runner.py ...
+
+pages.json maps titles to intro extracts: {"Chennai": "Chennai is ...", ...}.
+From Python, serve_in_thread(pages) starts a server on a free port and returns
+it with its API URL.
+"""
+import argparse
+import json
+import logging
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("wikipedia_stub")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8766
+API_PATH = "/w/api.php"
+
+DEFAULT_PAGES = {
+    "Chennai": "Chennai is the capital city of Tamil Nadu. Its food culture is known for filter coffee, "
+               "idli, dosa and vegetarian meals served on banana leaves, and for a growing cafe scene.",
+    "T. Nagar": "Thyagaraya Nagar, or T. Nagar, is a shopping district in Chennai with popular textile, "
+                "jewellery and sweet shops, street food stalls and busy restaurants.",
+    "Mumbai": "Mumbai is the capital of Maharashtra. Its street food such as vada pav and pav bhaji is "
+              "famous, and the city has a large restaurant, bar and cafe culture.",
+    "Bandra": "Bandra is a suburb of Mumbai known for its cafes, bakeries, pubs and fine dining restaurants.",
+    "Coffee culture in India": "Coffee is popular in South India, where filter coffee is a daily ritual; "
+                               "cafe chains have grown rapidly in Indian cities.",
+}
+
+_TERM_RE = re.compile(r"\w+")
+
+
+def _terms(text: str) -> List[str]:
+    return _TERM_RE.findall(text.lower())
+
+
+class StubWiki:
+    """Pages by title with the two MediaWiki queries the analysis makes"""
+
+    def __init__(self, pages: Dict[str, str]):
+        self.pages = dict(pages)
+        self.page_ids = {title: page_id for page_id, title in enumerate(self.pages, 1)}
+        self.requests = 0
+
+    def search(self, query: str, limit: int) -> List[str]:
+        """Titles ranked by how many query terms they contain"""
+        terms = set(_terms(query))
+        ranked = []
+        for title, extract in self.pages.items():
+            score = len(terms & set(_terms(f"{title} {extract}")))
+            if score:
+                ranked.append((-score, title))
+        return [title for _, title in sorted(ranked)[:limit]]
+
+    def _page(self, title: str, index: Optional[int] = None) -> dict:
+        page = {"pageid": self.page_ids[title], "ns": 0, "title": title, "extract": self.pages[title]}
+        if index is not None:
+            page["index"] = index
+        return page
+
+    def query(self, params: Dict[str, str]) -> dict:
+        self.requests += 1
+        if params.get("action") != "query":
+            return {"error": {"code": "badvalue", "info": "Only action=query is supported by the stub"}}
+
+        if params.get("generator") == "search":
+            limit = int(params.get("gsrlimit", 10))
+            titles = self.search(params.get("gsrsearch", ""), limit)
+            if not titles:
+                return {"batchcomplete": ""}
+            pages = [self._page(title, index) for index, title in enumerate(titles, 1)]
+        elif "titles" in params:
+            pages = [self._page(title) for title in params["titles"].split("|") if title in self.pages]
+        else:
+            return {"error": {"code": "badvalue", "info": "Expected generator=search or titles="}}
+
+        if "extracts" not in params.get("prop", "").split("|"):
+            for page in pages:
+                del page["extract"]
+        # Like MediaWiki, pages come keyed and ordered by page id, not by search rank
+        pages.sort(key=lambda page: page["pageid"])
+        return {"batchcomplete": "", "query": {"pages": {str(page["pageid"]): page for page in pages}}}
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    wiki: StubWiki = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != API_PATH:
+            return self._send_json(404, {"error": f"Unknown path {url.path}"})
+        params = {key: values[-1] for key, values in parse_qs(url.query, keep_blank_values=True).items()}
+        self._send_json(200, self.wiki.query(params))
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def make_server(pages: Dict[str, str], host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    handler = type("BoundStubRequestHandler", (StubRequestHandler,), {"wiki": StubWiki(pages)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve_in_thread(pages: Optional[Dict[str, str]] = None, host: str = DEFAULT_HOST,
+                    port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """Start a stub server in a daemon thread (port 0 picks a free one); returns it and its API URL"""
+    server = make_server(DEFAULT_PAGES if pages is None else pages, host, port)
+    threading.Thread(target=server.serve_forever, name="wikipedia-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}{API_PATH}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local MediaWiki API stub for the cultural fit analysis")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--pages", help="JSON file mapping page titles to intro extracts (default: built-in sample)")
+    args = parser.parse_args(argv)
+
+    pages = DEFAULT_PAGES
+    if args.pages:
+        with open(args.pages, encoding="utf-8") as f:
+            pages = json.load(f)
+
+    server = make_server(pages, args.host, args.port)
+    logger.info(f"Wikipedia stub serving {len(pages)} pages on http://{args.host}:{args.port}{API_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
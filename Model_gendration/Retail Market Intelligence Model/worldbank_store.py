@@ -0,0 +1,212 @@
+"""
+Local World Bank indicator store.
+
+GDP / GNI per-capita figures change once a year, so instead of several World
+Bank API calls per country per analysis, bulk CSV dumps are ingested once into a
+compact memory-mapped columnar file: one float64 row per (country, indicator)
+series and one column per year. Lookups are a dict access plus an array slice.
+
+File layout:
+    b"WBSTORE1" | uint64 header length | JSON header (8-byte aligned) | float64[series, years]
+
+Ingest bulk downloads (https://data.worldbank.org, "Download CSV"):
+    python worldbank_store.py ingest API_NY.GDP.PCAP.CD_DS2_en_csv_v2_*.csv \\
+        API_NY.GNP.PCAP.CD_DS2_en_csv_v2_*.csv --output data/worldbank.wbstore
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import struct
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+WORLDBANK_STORE_PATH = os.environ.get(
+    "RADIU_WORLDBANK_STORE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "worldbank.wbstore")
+)
+WORLDBANK_COUNTRIES_URL = "http://api.worldbank.org/v2/country?format=json&per_page=400"
+
+MAGIC = b"WBSTORE1"
+
+
+class WorldBankStore:
+    """Read-only, memory-mapped World Bank indicator store"""
+
+    def __init__(self, path: str = WORLDBANK_STORE_PATH):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a World Bank store")
+            (header_length,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_length).decode("utf-8"))
+
+        self.path = path
+        self.first_year, self.last_year = header["years"]
+        self.iso2_to_iso3 = header["iso2"]
+        self.rows = {(iso3, indicator): row for row, (iso3, indicator) in enumerate(header["series"])}
+        self.values = np.memmap(
+            path, dtype="<f8", mode="r", offset=header["data_offset"],
+            shape=(len(header["series"]), self.last_year - self.first_year + 1)
+        )
+
+    def _iso3(self, country_code: str) -> str:
+        code = country_code.upper()
+        return self.iso2_to_iso3.get(code, code)
+
+    def has(self, country_code: str, indicator: str) -> bool:
+        return (self._iso3(country_code), indicator) in self.rows
+
+    def get(self, country_code: str, indicator: str, start_year: int, end_year: int) -> Optional[List[dict]]:
+        """
+        Values for start_year..end_year in the World Bank API item shape (newest
+        first, missing years skipped). None when the series is not in the store,
+        the store's years do not span start_year..end_year or it has no value
+        for any of them, so the caller asks the API instead.
+        """
+        iso3 = self._iso3(country_code)
+        row = self.rows.get((iso3, indicator))
+        if row is None:
+            return None
+
+        if start_year < self.first_year or end_year > self.last_year or start_year > end_year:
+            return None
+
+        series = self.values[row, start_year - self.first_year:end_year - self.first_year + 1]
+        items = [
+            {"countryiso3code": iso3, "indicator": {"id": indicator}, "date": str(start_year + offset), "value": float(value)}
+            for offset, value in reversed(list(enumerate(series)))
+            if not np.isnan(value)
+        ]
+        return items or None
+
+
+_store = None
+_store_loaded = False
+_store_lock = threading.Lock()
+
+
+def get_worldbank_store() -> Optional[WorldBankStore]:
+    """Process-wide store, or None if no store file has been ingested"""
+    global _store, _store_loaded
+    with _store_lock:
+        if not _store_loaded:
+            _store_loaded = True
+            if os.path.exists(WORLDBANK_STORE_PATH):
+                try:
+                    _store = WorldBankStore(WORLDBANK_STORE_PATH)
+                except Exception as e:
+                    logger.warning(f"Could not open World Bank store {WORLDBANK_STORE_PATH}: {e}")
+        return _store
+
+
+# --- Ingestion ---
+
+def read_bulk_csv(path: str) -> Dict[tuple, Dict[int, float]]:
+    """Parse a World Bank bulk CSV into {(iso3, indicator): {year: value}}"""
+    series = {}
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = None
+        for row in reader:
+            if header is None:
+                # Metadata lines precede the real header
+                if row and row[0] == "Country Name":
+                    header = row
+                continue
+            if len(row) < 5:
+                continue
+
+            iso3, indicator = row[1], row[3]
+            values = {}
+            for column, cell in zip(header[4:], row[4:]):
+                if column.strip().isdigit() and cell.strip():
+                    values[int(column)] = float(cell)
+            series[(iso3, indicator)] = values
+    return series
+
+
+def load_iso2_mapping(metadata_path: Optional[str] = None) -> Dict[str, str]:
+    """ISO2 -> ISO3 codes from a saved /v2/country response, or fetched once live"""
+    if metadata_path:
+        with open(metadata_path, encoding="utf-8") as f:
+            data = json.load(f)
+    else:
+        response = get_http_client().get(WORLDBANK_COUNTRIES_URL, timeout=30)
+        response.raise_for_status()
+        data = response.json()
+
+    countries = data[1] if isinstance(data, list) and len(data) >= 2 else data
+    return {c["iso2Code"].upper(): c["id"].upper() for c in countries if c.get("iso2Code") and c.get("id")}
+
+
+def write_store(series: Dict[tuple, Dict[int, float]], iso2: Dict[str, str], output: str):
+    years = sorted({year for values in series.values() for year in values})
+    if not years:
+        raise ValueError("No indicator values found in the input files")
+    first_year, last_year = years[0], years[-1]
+
+    keys = sorted(series)
+    matrix = np.full((len(keys), last_year - first_year + 1), np.nan, dtype="<f8")
+    for row, key in enumerate(keys):
+        for year, value in series[key].items():
+            matrix[row, year - first_year] = value
+
+    header = {"years": [first_year, last_year], "iso2": iso2, "series": [list(key) for key in keys]}
+    # data_offset depends on the header length; iterate until it is stable
+    data_offset = 0
+    while True:
+        header["data_offset"] = data_offset
+        encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        padded = len(MAGIC) + 8 + len(encoded)
+        padded += (-padded) % 8
+        if padded == data_offset:
+            break
+        data_offset = padded
+    encoded += b" " * (data_offset - len(MAGIC) - 8 - len(encoded))
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(encoded)))
+        f.write(encoded)
+        f.write(matrix.tobytes())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local World Bank indicator store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser("ingest", help="Load World Bank bulk CSV dumps into a store file")
+    ingest.add_argument("csv_files", nargs="+")
+    ingest.add_argument("--country-metadata", help="Saved /v2/country?format=json response (ISO2 codes)")
+    ingest.add_argument("--output", default=WORLDBANK_STORE_PATH)
+
+    lookup = subparsers.add_parser("lookup", help="Read a series from an existing store")
+    lookup.add_argument("country_code")
+    lookup.add_argument("indicator")
+    lookup.add_argument("start_year", type=int)
+    lookup.add_argument("end_year", type=int)
+    lookup.add_argument("--store", default=WORLDBANK_STORE_PATH)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "ingest":
+        series = {}
+        for path in args.csv_files:
+            series.update(read_bulk_csv(path))
+        write_store(series, load_iso2_mapping(args.country_metadata), args.output)
+        print(f"Wrote {len(series)} series to {args.output}")
+    else:
+        store = WorldBankStore(args.store)
+        print(json.dumps(store.get(args.country_code, args.indicator, args.start_year, args.end_year)))
+
+
+if __name__ == "__main__":
+    main()